@@ -4,6 +4,7 @@ from sqlalchemy import select
 from app.db.database import get_db
 from app.models.character import Character
 from app.schemas.character import CharacterCreate, CharacterUpdate, CharacterResponse, EmotionUpdateRequest
+from app.services.character_cache import character_cache
 from app.services.rag_service import rag_service
 from typing import List, Optional
 from datetime import datetime
@@ -83,6 +84,7 @@ async def update_character(
     if not character:
         raise HTTPException(status_code=404, detail="Character not found")
     
+    previous_name = character.name
     update_data = character_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(character, field, value)
@@ -90,6 +92,7 @@ async def update_character(
     character.updated_at = datetime.now().isoformat()
     await db.commit()
     await db.refresh(character)
+    character_cache.invalidate([previous_name, character.name])
     return character
 
 
@@ -105,6 +108,7 @@ async def delete_character(
     
     await db.delete(character)
     await db.commit()
+    character_cache.invalidate([character.name])
     return {"message": "Character deleted successfully", "character_id": character_id}
 
 
@@ -6,6 +6,7 @@ from app.models.novel import Novel
 from app.schemas.novel import NovelCreate, NovelResponse, NovelDecomposeRequest, NovelDecomposeResponse
 from app.services.novel_service import novel_service
 from typing import List
+import asyncio
 
 router = APIRouter(prefix="/api/novels", tags=["novels"])
 
@@ -102,14 +103,20 @@ async def decompose_novel(
 
         await db.commit()
 
+        pending_units = []
         for unit_data in result["units"]:
             stmt = select(StoryUnit).where(StoryUnit.original_text == unit_data["original_text"])
             result_stmt = await db.execute(stmt)
             db_unit = result_stmt.scalar_one_or_none()
             if db_unit and db_unit.embedding is None:
-                text = f"{db_unit.scene} {db_unit.core_conflict} {db_unit.original_text}"
-                embedding = embed_model.get_text_embedding(text)
-                db_unit.embedding = embedding
+                pending_units.append(db_unit)
+
+        embeddings = await asyncio.gather(*[
+            embed_model.aget_text_embedding(f"{db_unit.scene} {db_unit.core_conflict} {db_unit.original_text}")
+            for db_unit in pending_units
+        ])
+        for db_unit, embedding in zip(pending_units, embeddings):
+            db_unit.embedding = embedding
 
         await db.commit()
 
@@ -56,3 +56,135 @@ async def observability_info() -> Dict[str, Any]:
     except Exception as e:
         logger.error(f"Failed to get observability info: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/embedding-batcher")
+async def embedding_batcher_stats() -> Dict[str, Any]:
+    try:
+        from app.services.ollama_client import get_ollama_manager
+
+        stats = get_ollama_manager().embed_model.get_batcher_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get embedding batcher stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/embedding-store")
+async def embedding_store_stats() -> Dict[str, Any]:
+    try:
+        from app.services.ollama_client import get_ollama_manager
+
+        stats = get_ollama_manager().embed_model.get_store_stats()
+        if stats is None:
+            return {"enabled": False}
+        return {"enabled": True, **stats}
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get embedding store stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/llm-metrics")
+async def llm_call_metrics() -> Dict[str, Any]:
+    """按任务与模型聚合的 LLM 调用耗时：TTFT、排队、prompt 处理、生成耗时与 tokens/s 的 p50/p95"""
+    try:
+        from app.services.llm_metrics import llm_metrics
+
+        return {"groups": llm_metrics.get_summary()}
+    except Exception as e:
+        logger.error(f"Failed to get LLM metrics: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/model-router")
+async def model_router_stats() -> Dict[str, Any]:
+    """各后端的熔断状态、p50/p95 延迟、错误率，以及按任务统计的路由决策"""
+    try:
+        from app.services.model_router import model_router
+
+        return model_router.get_stats()
+    except Exception as e:
+        logger.error(f"Failed to get model router stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/hedging")
+async def hedging_stats() -> Dict[str, Any]:
+    """对冲请求统计：按任务的对冲率、对冲胜出次数与预算使用情况"""
+    try:
+        from app.services.hedging import request_hedger
+
+        return request_hedger.get_stats()
+    except Exception as e:
+        logger.error(f"Failed to get hedging stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/evaluation-store")
+async def evaluation_store_stats() -> Dict[str, Any]:
+    """已存储维度分数的剧本数与命中率"""
+    try:
+        from app.services.quality_evaluator import quality_evaluator
+
+        if quality_evaluator.store is None:
+            return {"enabled": False}
+        return {"enabled": True, **quality_evaluator.store.get_stats()}
+    except Exception as e:
+        logger.error(f"Failed to get evaluation store stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/evaluation-prescreen")
+async def evaluation_prescreen_stats() -> Dict[str, Any]:
+    """质量评估启发式预筛的命中率（跳过 LLM 评审的比例）、按检查项的淘汰次数与当前阈值"""
+    try:
+        from app.services.script_heuristics import heuristic_scorer
+
+        return heuristic_scorer.get_stats()
+    except Exception as e:
+        logger.error(f"Failed to get evaluation prescreen stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/character-cache")
+async def character_cache_stats() -> Dict[str, Any]:
+    """进程内人物缓存的命中率、版本校验次数与数据库查询次数"""
+    try:
+        from app.services.character_cache import character_cache
+
+        return character_cache.get_stats()
+    except Exception as e:
+        logger.error(f"Failed to get character cache stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/near-duplicates")
+async def near_duplicate_stats() -> Dict[str, Any]:
+    """批量生成 / 评估中近似重复检测的检查次数、重复率与当前阈值"""
+    try:
+        from app.services.near_duplicates import near_duplicate_filter
+
+        return near_duplicate_filter.get_stats()
+    except Exception as e:
+        logger.error(f"Failed to get near-duplicate stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/ollama-hosts")
+async def ollama_host_stats() -> Dict[str, Any]:
+    """多主机负载均衡池中各 Ollama 主机的健康状态、在途请求数与已加载模型，单主机部署时为 null"""
+    try:
+        from app.services.ollama_client import get_ollama_manager
+
+        return get_ollama_manager().get_pool_stats()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to get Ollama host stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -4,11 +4,16 @@ from app.schemas.quality_evaluation import (
     QualityEvaluationResponse,
     BatchEvaluationRequest,
     BatchEvaluationResponse,
+    RerankRequest,
+    RerankResponse,
+    ProxyTrainRequest,
     MetricsResponse,
     AutoEvaluationConfig
 )
 from app.services.quality_evaluator import quality_evaluator
+from app.services.llm_streaming import sse_response
 from typing import Dict, Any
+import asyncio
 
 router = APIRouter(prefix="/api/quality", tags=["quality_evaluation"])
 
@@ -27,6 +32,11 @@ async def evaluate_script_quality(request: QualityEvaluationRequest):
     - overall_coherence: 整体连贯性（权重15%）
 
     支持自定义评分权重，传入 custom_weights 参数覆盖默认权重
+
+    evaluation_mode=fast 时一次调用返回全部维度，调用次数约为 thorough 的 1/6
+
+    enable_prescreen=true 时，长度远离 target_length、缺少对白、缺少指定人物、大量重复或格式错误的剧本
+    在本地预筛阶段即返回低分（见 prescreen 字段），不调用 LLM
     """
     try:
         result = await quality_evaluator.evaluate_script(
@@ -34,24 +44,13 @@ async def evaluate_script_quality(request: QualityEvaluationRequest):
             plot_context=request.plot_context,
             characters=request.characters,
             custom_weights=request.custom_weights,
-            reference_script=request.reference_script
+            reference_script=request.reference_script,
+            evaluation_mode=request.evaluation_mode,
+            enable_prescreen=request.enable_prescreen,
+            target_length=request.target_length
         )
 
-        overall_score = result.get("overall_score", 5.0)
-        quality_level = _determine_quality_level(overall_score)
-
-        return QualityEvaluationResponse(
-            overall_score=overall_score,
-            conflict_intensity=result["conflict_intensity"],
-            emotion_rendering=result["emotion_rendering"],
-            character_consistency=result["character_consistency"],
-            dialogue_naturalness=result["dialogue_naturalness"],
-            dramatic_tension=result["dramatic_tension"],
-            overall_coherence=result["overall_coherence"],
-            weights_used=result.get("weights_used", {}),
-            comparison_with_reference=result.get("comparison_with_reference"),
-            quality_level=quality_level
-        )
+        return _convert_to_evaluation_response(result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"评估失败: {str(e)}")
 
@@ -61,12 +60,15 @@ async def evaluate_batch_scripts(request: BatchEvaluationRequest):
     """
     批量评估剧本质量
 
-    最多支持20个剧本同时评估，自动按综合评分排序返回
+    最多支持20个剧本同时评估，自动按综合评分排序返回；单个剧本评估失败时列入 failed，其余剧本照常返回
     """
     try:
         result = await quality_evaluator.evaluate_batch(
             scripts=[script.dict() for script in request.scripts],
-            custom_weights=request.custom_weights
+            custom_weights=request.custom_weights,
+            evaluation_mode=request.evaluation_mode,
+            proxy_top_k=request.proxy_top_k,
+            enable_prescreen=request.enable_prescreen
         )
 
         return BatchEvaluationResponse(
@@ -82,12 +84,84 @@ async def evaluate_batch_scripts(request: BatchEvaluationRequest):
             best_script={
                 "script_id": result["best_script"]["script_id"],
                 "evaluation": _convert_to_evaluation_response(result["best_script"]["evaluation"])
-            } if result["best_script"] else None
+            } if result["best_script"] else None,
+            failed=result["failed"]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量评估失败: {str(e)}")
 
 
+@router.post("/evaluate-batch/stream")
+async def evaluate_batch_scripts_stream(request: BatchEvaluationRequest):
+    """
+    批量评估剧本质量（SSE）
+
+    剧本并发评估，每完成一个立即推送，全部完成后推送排名；启用预筛时未通过的剧本最先推送。
+    事件：result（script_id、index、evaluation）、failed（单个剧本评估失败）、ranking（ranked_scripts、scores、best_script、prescreen_rejected、near_duplicates）、error、done
+    """
+    async def _events():
+        async for event, data in quality_evaluator.evaluate_batch_stream(
+            scripts=[script.dict() for script in request.scripts],
+            custom_weights=request.custom_weights,
+            evaluation_mode=request.evaluation_mode,
+            proxy_top_k=request.proxy_top_k,
+            enable_prescreen=request.enable_prescreen
+        ):
+            if event == "result":
+                data = {**data, "evaluation": _convert_to_evaluation_response(data["evaluation"]).model_dump()}
+            yield event, data
+
+    return sse_response(_events())
+
+
+@router.post("/rerank", response_model=RerankResponse)
+async def rerank_scripts(request: RerankRequest):
+    """
+    按新的评分权重重新排名已评估过的剧本
+
+    只读取评估时存储的各维度分数重新计算加权总分，不调用 LLM；
+    没有完整存储分数的剧本（评估模式不同、评审模型或 Prompt 版本已变化）列入 missing
+    """
+    try:
+        result = quality_evaluator.rerank(
+            items=[item.dict() for item in request.items],
+            custom_weights=request.custom_weights,
+            evaluation_mode=request.evaluation_mode
+        )
+        return RerankResponse(**result)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重新排名失败: {str(e)}")
+
+
+@router.post("/proxy/train")
+async def train_proxy_model(request: ProxyTrainRequest):
+    """
+    用已存储的 LLM 评审结果训练本地代理评分模型
+
+    返回留出集上各维度的 MAE / RMSE / 偏差 / 相关系数 / 排序一致率以及分桶校准表
+    """
+    try:
+        return await asyncio.to_thread(quality_evaluator.train_proxy, request.evaluation_mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"训练代理模型失败: {str(e)}")
+
+
+@router.get("/proxy/report")
+async def proxy_model_report():
+    """
+    代理评分模型的训练来源、与 LLM 评审的校准 / 一致性报告以及预测耗时
+    """
+    from app.services.proxy_scorer import proxy_scorer
+
+    return proxy_scorer.get_report()
+
+
 @router.get("/metrics", response_model=MetricsResponse)
 async def get_evaluation_metrics():
     """
@@ -140,5 +214,13 @@ def _convert_to_evaluation_response(evaluation: Dict[str, Any]) -> QualityEvalua
         overall_coherence=evaluation["overall_coherence"],
         weights_used=evaluation.get("weights_used", {}),
         comparison_with_reference=evaluation.get("comparison_with_reference"),
-        quality_level=quality_level
+        quality_level=quality_level,
+        partial=evaluation.get("partial", False),
+        failed_dimensions=evaluation.get("failed_dimensions", []),
+        evaluation_mode=evaluation.get("evaluation_mode", "thorough"),
+        prescreen=evaluation.get("prescreen"),
+        evaluation_key=evaluation.get("evaluation_key"),
+        cached_dimensions=evaluation.get("cached_dimensions", []),
+        duplicate_of=evaluation.get("duplicate_of"),
+        duplicate_similarity=evaluation.get("duplicate_similarity")
     )
@@ -1,4 +1,6 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from app.db.database import get_db
@@ -17,6 +19,7 @@ from app.schemas.quality_evaluation import (
 from app.services.rag_service import rag_service
 from app.services.script_service import script_service
 from app.services.quality_evaluator import quality_evaluator
+from app.services.llm_streaming import sse_response
 from typing import List, Optional, Tuple, Dict, Any
 from pydantic import BaseModel, Field
 
@@ -41,7 +44,7 @@ async def create_story_unit(
     ollama_manager = get_ollama_manager()
     embed_model = ollama_manager.embed_model
     text = f"{db_story_unit.scene} {db_story_unit.core_conflict} {db_story_unit.original_text}"
-    embedding = embed_model.get_text_embedding(text)
+    embedding = await embed_model.aget_text_embedding(text)
     db_story_unit.embedding = embedding
     await db.commit()
     await db.refresh(db_story_unit)
@@ -133,6 +136,28 @@ async def generate_script_deepseek(request: ScriptGenerationRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.post("/generate-script-deepseek/stream")
+async def generate_script_deepseek_stream(request: ScriptGenerationRequest):
+    """
+    使用 DeepSeek 流式生成剧本（SSE）
+
+    事件：delta（剧本文本增量）、metadata（参考单元、人物约束等）、error、done
+    """
+    return sse_response(script_service.generate_script_stream(
+        plot_context=request.plot_context,
+        required_conflict=request.required_conflict,
+        required_emotion=request.required_emotion,
+        characters=request.characters,
+        scene=request.scene,
+        constraints=request.constraints,
+        goal_driven=request.goal_driven,
+        style=request.style,
+        length=request.length,
+        innovation_degree=request.innovation_degree,
+        enable_quality_evaluation=request.enable_quality_evaluation,
+    ))
+
+
 @router.post("/evaluate-script-deepseek", response_model=ScriptEvaluationResponse)
 async def evaluate_script_deepseek(request: ScriptEvaluationRequest):
     """
@@ -152,6 +177,8 @@ async def evaluate_script_deepseek(request: ScriptEvaluationRequest):
 async def generate_script_batch(request: BatchScriptGenerationRequest):
     """
     批次生成剧本
+
+    stop_when 指定提前结束策略，满足后取消其余候选，响应中的 early_stop 报告节省的生成次数
     """
     try:
         result = await script_service.generate_script_batch(
@@ -168,8 +195,15 @@ async def generate_script_batch(request: BatchScriptGenerationRequest):
             batch_size=request.batch_size,
             return_best_only=request.return_best_only,
             enable_quality_evaluation=request.enable_quality_evaluation,
+            min_score_threshold=request.min_score_threshold,
+            stop_when=request.stop_when,
+            stop_k=request.stop_k,
+            stop_patience=request.stop_patience,
+            time_budget_seconds=request.time_budget_seconds,
         )
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
@@ -195,6 +229,24 @@ async def generate_script(request: ScriptGenerationRequest):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.post("/generate-script/stream")
+async def generate_script_stream(request: ScriptGenerationRequest):
+    """
+    流式生成剧本（SSE）
+
+    事件：delta（剧本文本增量）、metadata（参考单元、人物约束等）、error、done
+    """
+    return sse_response(rag_service.generate_script_stream(
+        plot_context=request.plot_context,
+        required_conflict=request.required_conflict,
+        required_emotion=request.required_emotion,
+        characters=request.characters,
+        scene=request.scene,
+        constraints=request.constraints,
+        goal_driven=request.goal_driven,
+    ))
+
+
 class TemporalSearchRequest(BaseModel):
     target_unit_id: Optional[str] = None
     chapter_range: Optional[Tuple[int, int]] = None
@@ -254,6 +306,24 @@ async def generate_script_with_temporal(request: ScriptGenerationWithTemporalReq
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+@router.post("/generate-script-with-temporal/stream")
+async def generate_script_with_temporal_stream(request: ScriptGenerationWithTemporalRequest):
+    """
+    结合时序上下文流式生成剧本（SSE）
+
+    事件：delta（剧本文本增量）、metadata（参考单元、时序上下文、人物约束等）、error、done
+    """
+    return sse_response(rag_service.generate_script_with_temporal_stream(
+        plot_context=request.plot_context,
+        required_conflict=request.required_conflict,
+        required_emotion=request.required_emotion,
+        characters=request.characters,
+        scene=request.scene,
+        constraints=request.constraints,
+        temporal_context=request.temporal_context,
+    ))
+
+
 @router.post("/evaluate-script", response_model=ScriptEvaluationResponse)
 async def evaluate_script(request: ScriptEvaluationRequest):
     try:
@@ -285,7 +355,8 @@ async def quality_evaluate_script(request: QualityEvaluationRequest):
             plot_context=request.plot_context,
             characters=request.characters,
             custom_weights=request.custom_weights,
-            reference_script=request.reference_script
+            reference_script=request.reference_script,
+            evaluation_mode=request.evaluation_mode
         )
         return result
     except RuntimeError as e:
@@ -321,6 +392,17 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@router.get("/ready")
+async def readiness_check():
+    """
+    就绪检查：模型预热完成前返回 503，供负载均衡在模型加载期间暂不转发流量
+    """
+    from app.services.ollama_client import get_ollama_manager
+
+    readiness = await asyncio.to_thread(get_ollama_manager().get_readiness)
+    return JSONResponse(status_code=200 if readiness["ready"] else 503, content=readiness)
+
+
 @router.post("/resolve-conflicts")
 async def resolve_character_conflicts(request: ConflictResolutionRequest):
     try:
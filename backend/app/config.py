@@ -8,6 +8,49 @@ class Settings(BaseSettings):
     EMBEDDING_MODEL: str = "bge-m3:latest"
     LLM_MODEL: str = "qwen3:30b"
     OLLAMA_BASE_URL: str = "http://192.168.131.158:11434"
+    OLLAMA_BASE_URLS: str = ""
+    OLLAMA_EMBED_BASE_URLS: str = ""
+    OLLAMA_HEALTH_CHECK_INTERVAL: float = 15.0
+    OLLAMA_HOST_FAILURE_THRESHOLD: int = 3
+    OLLAMA_HOST_DRAIN_SECONDS: float = 30.0
+    OLLAMA_AFFINITY_SLACK: int = 2
+    OLLAMA_PREFIX_AFFINITY_CHARS: int = 512
+    OLLAMA_KEEP_ALIVE: str = "30m"
+    ENABLE_MODEL_WARMUP: bool = True
+    MODEL_WARMUP_TIMEOUT: float = 300.0
+
+    ENABLE_EMBED_BATCHING: bool = True
+    EMBED_BATCH_SIZE: int = 10
+    EMBED_BATCH_MAX_WAIT_MS: float = 5.0
+    ENABLE_EMBEDDING_STORE: bool = True
+    EMBEDDING_STORE_PATH: str = "data/embedding_store.sqlite3"
+
+    GENERATION_PROMPT_TOKEN_BUDGET: int = 5000
+    SCRIPT_BATCH_CONCURRENCY: int = 3
+    SCRIPT_BATCH_STOP_CONCURRENCY: int = 2
+
+    EVALUATION_MAX_CONCURRENCY: int = 6
+    EVALUATION_DIMENSION_TIMEOUT: float = 120.0
+    EVALUATION_BATCH_CONCURRENCY: int = 4
+    ENABLE_EVALUATION_STORE: bool = True
+    EVALUATION_STORE_PATH: str = "data/evaluation_store.sqlite3"
+    PROXY_MODEL_PATH: str = "data/proxy_quality_model.json"
+    PROXY_RIDGE_ALPHA: float = 1.0
+    PROXY_MIN_TRAINING_SAMPLES: int = 50
+
+    ENABLE_EVALUATION_PRESCREEN: bool = False
+    ENABLE_GENERATION_PRESCREEN: bool = True
+    PRESCREEN_LENGTH_TOLERANCE: float = 0.5
+    PRESCREEN_MIN_DIALOGUE_RATIO: float = 0.1
+    PRESCREEN_MIN_CHARACTER_COVERAGE: float = 0.5
+    PRESCREEN_MAX_REPETITION: float = 0.3
+
+    CHARACTER_CACHE_TTL_SECONDS: float = 30.0
+
+    ENABLE_NEAR_DUPLICATE_FILTER: bool = True
+    NEAR_DUPLICATE_THRESHOLD: float = 0.85
+    NEAR_DUPLICATE_NUM_PERM: int = 64
+    NEAR_DUPLICATE_SHINGLE_SIZE: int = 5
     SECRET_KEY: str = "your-secret-key-here"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
@@ -17,6 +60,19 @@ class Settings(BaseSettings):
     DEEPSEEK_MODEL: str = "deepseek-chat"
     
     ENABLE_DEEPSEEK: bool = False
+
+    ENABLE_MODEL_ROUTER: bool = True
+    ROUTER_WINDOW: int = 100
+    ROUTER_FAILURE_THRESHOLD: int = 3
+    ROUTER_ERROR_RATE_THRESHOLD: float = 0.5
+    ROUTER_OPEN_SECONDS: float = 30.0
+
+    ENABLE_HEDGING: bool = False
+    HEDGE_PERCENTILE: float = 90.0
+    HEDGE_DEFAULT_DELAY_MS: float = 3000.0
+    HEDGE_MIN_DELAY_MS: float = 500.0
+    HEDGE_MAX_RATIO: float = 0.2
+    HEDGE_WINDOW: int = 50
     
     LANGFUSE_PUBLIC_KEY: str = ""
     LANGFUSE_SECRET_KEY: str = ""
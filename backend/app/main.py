@@ -9,6 +9,7 @@ from app.api.rag import router as rag_router
 from app.api.story_plan import router as story_plan_router
 from app.api.quality_evaluation import router as quality_evaluation_router
 from app.config import get_settings
+import asyncio
 import logging
 
 logging.basicConfig(
@@ -38,6 +39,9 @@ async def lifespan(app: FastAPI):
     
     initialize_observability()
     
+    if settings.ENABLE_MODEL_WARMUP:
+        app.state.warmup_task = asyncio.create_task(asyncio.to_thread(ollama_manager.warm_up))
+    
     yield
     
     ollama_manager.close()
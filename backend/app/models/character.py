@@ -1,9 +1,14 @@
 from sqlalchemy import Column, String, JSON, Text, Float, Integer
 from sqlalchemy.dialects.postgresql import UUID
 from .story_unit import Base
+from datetime import datetime
 import uuid
 
 
+def _now_iso() -> str:
+    return datetime.now().isoformat()
+
+
 class Character(Base):
     __tablename__ = "characters"
 
@@ -16,4 +21,5 @@ class Character(Base):
     goals = Column(JSON)
     relationships = Column(JSON)
     created_at = Column(String(50))
-    updated_at = Column(String(50))
+    # 人物缓存以 updated_at 作为版本：插入与任何 ORM 更新都会写入微秒精度的时间戳
+    updated_at = Column(String(50), default=_now_iso, onupdate=_now_iso)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_serializer
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from uuid import UUID
 
 
@@ -102,6 +102,14 @@ class BatchScriptGenerationRequest(BaseModel):
     batch_size: int = Field(3, ge=1, le=10, description="批次生成数量（1-10）")
     return_best_only: bool = Field(False, description="是否仅返回最佳剧本")
     enable_quality_evaluation: bool = Field(False, description="是否启用多维度质量评估")
+    min_score_threshold: float = Field(6.0, ge=0, le=10, description="最低合格分数，first_above_threshold 策略以此为结束条件")
+    stop_when: Literal["none", "first_above_threshold", "best_of_k", "time_budget"] = Field(
+        "none",
+        description="提前结束策略：none（生成全部）、first_above_threshold（首个达到阈值即结束）、best_of_k（至少 stop_k 个候选后最佳分数连续 stop_patience 个未提高即结束）、time_budget（超过 time_budget_seconds 即结束）"
+    )
+    stop_k: int = Field(2, ge=1, le=10, description="best_of_k 策略至少完成的候选数")
+    stop_patience: int = Field(1, ge=1, le=10, description="best_of_k 策略允许最佳分数未提高的候选数")
+    time_budget_seconds: Optional[float] = Field(None, gt=0, description="time_budget 策略的时间预算（秒）")
 
 
 class BatchScriptGenerationResponse(BaseModel):
@@ -109,3 +117,5 @@ class BatchScriptGenerationResponse(BaseModel):
     best_script_index: Optional[int] = Field(None, description="最佳剧本索引，当 return_best_only=True 时为0")
     total_count: int
     generation_time_seconds: float
+    early_stop: Optional[Dict[str, Any]] = Field(None, description="提前结束策略、结束原因以及节省的生成次数")
+    near_duplicates: List[Dict[str, Any]] = Field(default_factory=list, description="与其他候选近似重复而未评估、未返回的候选（index、duplicate_of、similarity）")
@@ -1,5 +1,11 @@
-from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Dict, Any, Literal, Optional, Tuple
+
+
+def _check_target_length(value: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    if value is not None and not 1 <= value[0] <= value[1]:
+        raise ValueError("target_length 必须满足 1 <= 最少字数 <= 最多字数")
+    return value
 
 
 class DimensionScore(BaseModel):
@@ -9,25 +15,68 @@ class DimensionScore(BaseModel):
     weaknesses: List[str] = Field(default_factory=list, description="不足")
 
 
+class AllDimensionScores(BaseModel):
+    conflict_intensity: DimensionScore = Field(..., description="冲突强度")
+    emotion_rendering: DimensionScore = Field(..., description="情绪渲染")
+    character_consistency: DimensionScore = Field(..., description="人物一致性")
+    dialogue_naturalness: DimensionScore = Field(..., description="对话自然度")
+    dramatic_tension: DimensionScore = Field(..., description="剧情张力")
+    overall_coherence: DimensionScore = Field(..., description="整体连贯性")
+
+
+class DimensionResult(DimensionScore):
+    failed: bool = Field(False, description="该维度评估失败或超时，score 为默认值且不计入综合评分")
+    error: Optional[str] = Field(None, description="失败原因")
+    judge_model: Optional[str] = Field(None, description="实际给出该维度分数的评审模型")
+
+
+class PrescreenReport(BaseModel):
+    heuristic_score: float = Field(..., ge=0, le=10, description="本地启发式分数")
+    rejected: bool = Field(..., description="未通过预筛，各维度分数取启发式分数且未调用 LLM 评审")
+    reasons: List[str] = Field(default_factory=list, description="未通过的检查")
+    metrics: Dict[str, float] = Field(default_factory=dict, description="长度、对白占比、人物覆盖率、重复率等原始指标")
+
+
 class QualityEvaluationRequest(BaseModel):
     script_content: str = Field(..., description="剧本内容", min_length=50)
     plot_context: Optional[str] = Field(None, description="剧情背景")
     characters: Optional[List[str]] = Field(None, description="出场人物列表")
     custom_weights: Optional[Dict[str, float]] = Field(None, description="自定义评分权重")
     reference_script: Optional[str] = Field(None, description="参考剧本")
+    evaluation_mode: Literal["fast", "thorough", "proxy"] = Field(
+        "thorough",
+        description="fast：一次调用返回全部维度，适合批量评估；thorough：每个维度单独评分；proxy：仅用本地代理模型预测，不调用 LLM"
+    )
+    enable_prescreen: Optional[bool] = Field(
+        None, description="是否先做本地启发式预筛，未通过的剧本不调用 LLM；未指定时取 ENABLE_EVALUATION_PRESCREEN（默认关闭）"
+    )
+    target_length: Optional[Tuple[int, int]] = Field(None, description="目标字数范围 [最少, 最多]，预筛据此检查长度；不提供时不检查长度")
+
+    @field_validator("target_length")
+    @classmethod
+    def validate_target_length(cls, value: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        return _check_target_length(value)
 
 
 class QualityEvaluationResponse(BaseModel):
     overall_score: float = Field(..., ge=0, le=10, description="综合评分")
-    conflict_intensity: DimensionScore = Field(..., description="冲突强度评估")
-    emotion_rendering: DimensionScore = Field(..., description="情绪渲染评估")
-    character_consistency: DimensionScore = Field(..., description="人物一致性评估")
-    dialogue_naturalness: DimensionScore = Field(..., description="对话自然度评估")
-    dramatic_tension: DimensionScore = Field(..., description="剧情张力评估")
-    overall_coherence: DimensionScore = Field(..., description="整体连贯性评估")
+    conflict_intensity: DimensionResult = Field(..., description="冲突强度评估")
+    emotion_rendering: DimensionResult = Field(..., description="情绪渲染评估")
+    character_consistency: DimensionResult = Field(..., description="人物一致性评估")
+    dialogue_naturalness: DimensionResult = Field(..., description="对话自然度评估")
+    dramatic_tension: DimensionResult = Field(..., description="剧情张力评估")
+    overall_coherence: DimensionResult = Field(..., description="整体连贯性评估")
     weights_used: Dict[str, float] = Field(default_factory=dict, description="使用的评分权重")
-    comparison_with_reference: Optional[DimensionScore] = Field(None, description="与参考剧本的比较")
+    comparison_with_reference: Optional[DimensionResult] = Field(None, description="与参考剧本的比较")
     quality_level: str = Field(..., description="质量等级", examples=["excellent", "good", "acceptable", "poor"])
+    partial: bool = Field(False, description="部分维度评估失败，综合评分仅基于成功的维度")
+    failed_dimensions: List[str] = Field(default_factory=list, description="评估失败或超时的维度")
+    evaluation_mode: str = Field("thorough", description="实际使用的评估模式")
+    prescreen: Optional[PrescreenReport] = Field(None, description="启发式预筛结果，未启用预筛时为空")
+    evaluation_key: Optional[str] = Field(None, description="已存储维度分数的键，可用于 /rerank 按新权重重新排名")
+    cached_dimensions: List[str] = Field(default_factory=list, description="直接复用已存储分数、未调用 LLM 的维度")
+    duplicate_of: Optional[str] = Field(None, description="批量评估中与该剧本近似重复的代表剧本ID，评估结果复用自该剧本")
+    duplicate_similarity: Optional[float] = Field(None, description="与代表剧本的估计 Jaccard 相似度")
 
 
 class BatchEvaluationScript(BaseModel):
@@ -35,11 +84,24 @@ class BatchEvaluationScript(BaseModel):
     content: str = Field(..., description="剧本内容")
     plot_context: Optional[str] = Field(None, description="剧情背景")
     characters: Optional[List[str]] = Field(None, description="出场人物列表")
+    target_length: Optional[Tuple[int, int]] = Field(None, description="目标字数范围 [最少, 最多]，预筛据此检查长度；不提供时不检查长度")
+
+    @field_validator("target_length")
+    @classmethod
+    def validate_target_length(cls, value: Optional[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+        return _check_target_length(value)
 
 
 class BatchEvaluationRequest(BaseModel):
     scripts: List[BatchEvaluationScript] = Field(..., description="待评估的剧本列表", min_items=1, max_items=20)
     custom_weights: Optional[Dict[str, float]] = Field(None, description="自定义评分权重")
+    evaluation_mode: Literal["fast", "thorough", "proxy"] = Field("thorough", description="评估模式，批量评估建议使用 fast")
+    proxy_top_k: Optional[int] = Field(
+        None, ge=1, description="先用代理模型为全部剧本打分，只有前 k 名调用 LLM 评审；代理模型未训练时忽略"
+    )
+    enable_prescreen: Optional[bool] = Field(
+        None, description="是否先做本地启发式预筛，未指定时取 ENABLE_EVALUATION_PRESCREEN（默认关闭）"
+    )
 
 
 class ScriptEvaluationResult(BaseModel):
@@ -47,11 +109,47 @@ class ScriptEvaluationResult(BaseModel):
     evaluation: QualityEvaluationResponse = Field(..., description="评估结果")
 
 
+class FailedScriptEvaluation(BaseModel):
+    script_id: str = Field(..., description="剧本ID")
+    detail: str = Field(..., description="失败原因")
+
+
 class BatchEvaluationResponse(BaseModel):
     total_count: int = Field(..., description="总剧本数")
-    results: List[ScriptEvaluationResult] = Field(..., description="所有评估结果")
+    results: List[ScriptEvaluationResult] = Field(..., description="评估成功的剧本结果")
     ranked_scripts: List[str] = Field(..., description="按评分排序的剧本ID列表")
     best_script: Optional[ScriptEvaluationResult] = Field(None, description="最佳剧本")
+    failed: List[FailedScriptEvaluation] = Field(default_factory=list, description="评估失败的剧本，不参与排名")
+
+
+class RerankItem(BaseModel):
+    id: Optional[str] = Field(None, description="剧本ID，为空时使用 evaluation_key")
+    evaluation_key: str = Field(..., description="评估结果中的 evaluation_key")
+
+
+class RerankRequest(BaseModel):
+    items: List[RerankItem] = Field(..., description="待重新排名的已评估剧本", min_items=1, max_items=500)
+    custom_weights: Optional[Dict[str, float]] = Field(None, description="新的评分权重")
+    evaluation_mode: Literal["fast", "thorough"] = Field("thorough", description="读取哪种评估模式下存储的分数")
+
+
+class RerankedScript(BaseModel):
+    script_id: str = Field(..., description="剧本ID")
+    evaluation_key: str = Field(..., description="已存储维度分数的键")
+    overall_score: float = Field(..., ge=0, le=10, description="按新权重计算的综合评分")
+    quality_level: str = Field(..., description="质量等级")
+    dimension_scores: Dict[str, float] = Field(..., description="已存储的各维度分数")
+
+
+class RerankResponse(BaseModel):
+    ranked_scripts: List[RerankedScript] = Field(..., description="按新权重排序的剧本")
+    missing: List[str] = Field(default_factory=list, description="没有完整存储分数、需要重新评估的剧本ID")
+    weights_used: Dict[str, float] = Field(..., description="使用的评分权重")
+    best_script: Optional[RerankedScript] = Field(None, description="最佳剧本")
+
+
+class ProxyTrainRequest(BaseModel):
+    evaluation_mode: Literal["fast", "thorough"] = Field("thorough", description="使用哪种评估模式下存储的 LLM 分数作为训练目标")
 
 
 class MetricDescription(BaseModel):
@@ -14,6 +14,21 @@ class ScenePlan(BaseModel):
     key_event: str = Field(..., description="关键事件")
 
 
+class ScenePlanList(BaseModel):
+    scenes: List[ScenePlan] = Field(default_factory=list, description="场景规划列表")
+
+
+class SceneAdjustment(BaseModel):
+    scene_description: str = Field(..., description="更新后的场景描述")
+    characters: List[str] = Field(default_factory=list, description="涉及的人物")
+    location: str = Field("", description="场景地点")
+    mood: str = Field("", description="氛围基调")
+    conflict_type: str = Field("", description="冲突类型")
+    emotion_type: str = Field("", description="情绪类型")
+    key_action: str = Field("", description="关键动作")
+    dialogue_focus: str = Field("", description="对白重点")
+
+
 class StoryPhase(BaseModel):
     name: str = Field(..., description="阶段名称")
     description: str = Field(..., description="阶段描述")
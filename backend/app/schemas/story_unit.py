@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_serializer
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from datetime import datetime
 from uuid import UUID
 
@@ -53,3 +53,40 @@ class StoryUnitSearch(BaseModel):
     vector_weight: float = Field(0.4, description="向量检索权重 (仅linear方法使用)")
     metadata_weight: float = Field(0.6, description="元数据过滤权重 (仅linear方法使用)")
     rrf_k: int = Field(60, description="RRF平滑常数 (仅rrf方法使用)")
+
+
+class StoryUnitDraft(BaseModel):
+    chapter: str = Field("", description="章节名称")
+    scene: str = Field(..., description="场景描述")
+    characters: List[str] = Field(default_factory=list, description="出场人物")
+    core_conflict: str = Field(..., description="核心冲突")
+    emotion_curve: List[str] = Field(default_factory=list, description="情绪曲线")
+    plot_function: str = Field("", description="剧情功能")
+    original_text: str = Field(..., description="原文片段")
+    confidence: float = Field(0.7, ge=0, le=1, description="置信度")
+
+
+class StoryUnitDraftList(BaseModel):
+    units: List[StoryUnitDraft] = Field(default_factory=list, description="剧情单元列表")
+
+
+class TemporalRelationAnalysis(BaseModel):
+    temporal_relation: Literal["sequential", "concurrent", "overlapping", "indeterminate"] = Field(..., description="时序关系类型")
+    temporal_distance: Literal["immediate", "short", "medium", "long", "unknown"] = Field(..., description="时序距离")
+    causality: Literal["strong", "weak", "none"] = Field(..., description="因果关系")
+    narrative_flow: Literal["smooth", "abrupt", "disjointed"] = Field(..., description="叙事流畅度")
+    character_continuity: Literal["maintained", "partial", "broken"] = Field(..., description="角色连续性")
+    emotional_progression: Literal["escalating", "stable", "decreasing", "contradictory"] = Field(..., description="情绪进展")
+    plot_function: Literal["continuation", "transition", "climax", "resolution", "revelation"] = Field(..., description="剧情功能")
+    confidence: float = Field(..., ge=0, le=1, description="置信度")
+    explanation: str = Field("", description="时序关系说明")
+    suggestions: List[str] = Field(default_factory=list, description="建议")
+
+
+class TemporalLinkAnalysis(BaseModel):
+    continuity_score: float = Field(..., ge=0, le=1, description="连续性评分")
+    key_characters: List[str] = Field(default_factory=list, description="关键人物")
+    key_events: List[str] = Field(default_factory=list, description="关键事件")
+    temporal_markers: List[str] = Field(default_factory=list, description="时间标记")
+    narrative_bridge: str = Field("", description="叙事桥梁描述")
+    context_summary: str = Field("", description="上下文摘要")
@@ -0,0 +1,122 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+import copy
+import logging
+import time
+
+from sqlalchemy import select
+
+from app.config import get_settings
+from app.models.character import Character
+
+logger = logging.getLogger(__name__)
+
+_COLUMNS = (
+    "core_personality", "background", "bottom_line", "current_emotion",
+    "goals", "relationships", "updated_at",
+)
+
+
+def _row_to_dict(character: Character) -> Dict[str, Any]:
+    data = {column: getattr(character, column) for column in _COLUMNS}
+    data["id"] = str(character.id)
+    data["name"] = character.name
+    return data
+
+
+class CharacterCache:
+    """
+    进程内的人物数据缓存，以人物的 updated_at 作为版本
+
+    一次生成需要的全部人物用一条 WHERE name IN (...) 查询加载；
+    ttl_seconds 内再次请求同一批人物直接返回缓存，不访问数据库。
+    超过 ttl_seconds 后只查询 (name, updated_at) 校验版本，仅重新加载版本变化的人物；
+    updated_at 为空的人物无法判断是否被修改，总是视为过期并重新加载。
+    本进程内修改人物的代码路径在提交后调用 invalidate，立即丢弃对应缓存。
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        self._validated_at: Dict[str, float] = {}
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+        self._queries = 0
+
+    async def get_many(self, names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            {人物名: 人物字段}，数据库中不存在的人物不在结果中；返回值是副本，可以直接修改
+        """
+        requested = [name for name in dict.fromkeys(names) if name]
+        now = time.monotonic()
+        stale = [
+            name for name in requested
+            if name in self._entries and now - self._validated_at.get(name, 0.0) >= self.ttl_seconds
+        ]
+        missing = [name for name in requested if name not in self._entries]
+        found = {name: self._entries[name] for name in requested if name in self._entries and name not in stale}
+        self._hits += len(found)
+
+        if stale or missing:
+            from app.db.database import AsyncSessionLocal
+
+            async with AsyncSessionLocal() as session:
+                if stale:
+                    self._queries += 1
+                    self._revalidations += len(stale)
+                    result = await session.execute(
+                        select(Character.name, Character.updated_at).where(Character.name.in_(stale))
+                    )
+                    versions = dict(result.all())
+                    for name in stale:
+                        cached = self._entries.get(name)
+                        if cached is not None and cached[0] is not None and versions.get(name) == cached[0]:
+                            found[name] = cached
+                            self._validated_at[name] = now
+                            self._hits += 1
+                        else:
+                            logger.debug(f"人物 {name} 已在数据库中更新，重新加载")
+                            self.invalidate([name])
+                            missing.append(name)
+
+                if missing:
+                    self._queries += 1
+                    self._misses += len(missing)
+                    result = await session.execute(select(Character).where(Character.name.in_(missing)))
+                    for character in result.scalars().all():
+                        entry = (character.updated_at, _row_to_dict(character))
+                        found[character.name] = entry
+                        self._entries[character.name] = entry
+                        self._validated_at[character.name] = now
+
+        return {name: copy.deepcopy(found[name][1]) for name in requested if name in found}
+
+    def invalidate(self, names: Optional[Iterable[str]] = None):
+        """丢弃指定人物（默认全部）的缓存，下次请求时重新从数据库加载"""
+        if names is None:
+            self._entries.clear()
+            self._validated_at.clear()
+            return
+        for name in names:
+            self._entries.pop(name, None)
+            self._validated_at.pop(name, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self._hits,
+            "misses": self._misses,
+            "revalidations": self._revalidations,
+            "queries": self._queries,
+            "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def _create_cache() -> CharacterCache:
+    return CharacterCache(ttl_seconds=get_settings().CHARACTER_CACHE_TTL_SECONDS)
+
+
+character_cache = _create_cache()
@@ -7,6 +7,7 @@ from datetime import datetime
 
 from app.models.character import Character
 from app.config import get_settings
+from app.services.character_cache import character_cache
 
 logger = logging.getLogger(__name__)
 
@@ -213,39 +214,26 @@ class CharacterSystem:
     
     async def load_character(self, name: str) -> Optional[CharacterState]:
         """从数据库加载人物"""
-        if name in self.characters:
-            return self.characters[name]
-        
-        async with self.async_session() as session:
-            stmt = select(Character).where(Character.name == name)
-            result = await session.execute(stmt)
-            character = result.scalar_one_or_none()
-            
-            if not character:
-                logger.warning(f"未找到人物: {name}")
-                return None
-            
-            state = CharacterState(
-                character_id=str(character.id),
-                name=character.name,
-                core_personality=character.core_personality,
-                background=character.background,
-                bottom_line=character.bottom_line,
-                goals=character.goals,
-                relationships=character.relationships
-            )
-            
-            self.characters[name] = state
-            return state
+        state = (await self.load_multiple_characters([name])).get(name)
+        if not state:
+            logger.warning(f"未找到人物: {name}")
+        return state
     
     async def load_multiple_characters(self, names: List[str]) -> Dict[str, CharacterState]:
-        """批量加载人物"""
-        results = {}
-        for name in names:
-            state = await self.load_character(name)
-            if state:
-                results[name] = state
-        return results
+        """批量加载人物，内存中没有的人物通过人物缓存一次查询加载"""
+        missing = [name for name in names if name not in self.characters]
+        if missing:
+            for name, character in (await character_cache.get_many(missing)).items():
+                self.characters[name] = CharacterState(
+                    character_id=character["id"],
+                    name=character["name"],
+                    core_personality=character["core_personality"],
+                    background=character["background"],
+                    bottom_line=character["bottom_line"],
+                    goals=character["goals"],
+                    relationships=character["relationships"]
+                )
+        return {name: self.characters[name] for name in names if name in self.characters}
     
     def get_character(self, name: str) -> Optional[CharacterState]:
         """获取人物状态"""
@@ -383,6 +371,7 @@ class CharacterSystem:
                 db_char.relationships = char_state.relationships
                 db_char.updated_at = datetime.now().isoformat()
                 await session.commit()
+                character_cache.invalidate([name])
                 logger.info(f"Saved character state for {name}")
             else:
                 logger.warning(f"Character {name} not found in database, skipping save")
@@ -1,4 +1,4 @@
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional
 from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
 from llama_index.core.llms.callbacks import llm_completion_callback
 from llama_index.core.bridge.pydantic import PrivateAttr
@@ -8,10 +8,57 @@ import time
 import json
 import asyncio
 import aiohttp
+from app.services.llm_metrics import record_llm_call
 
 logger = logging.getLogger(__name__)
 
 
+class _StreamAccumulator:
+    """
+    累积 DeepSeek 流式响应：分片追加到列表、结束时一次性 join，并记录首 token 时间与 usage
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.chunk_count = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.first_token_time: Optional[float] = None
+        self.last_token_time: Optional[float] = None
+
+    def feed(self, chunk: Dict[str, Any]):
+        self.chunk_count += 1
+        if chunk.get("choices"):
+            content = chunk["choices"][0].get("delta", {}).get("content")
+            if content:
+                now = time.time()
+                if self.first_token_time is None:
+                    self.first_token_time = now
+                self.last_token_time = now
+                self.parts.append(content)
+        usage = chunk.get("usage")
+        if usage:
+            self.input_tokens = usage.get("prompt_tokens", 0)
+            self.output_tokens = usage.get("completion_tokens", 0)
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def metrics(self, start_time: float, latency_ms: float) -> Dict[str, Any]:
+        ttft_ms = (self.first_token_time - start_time) * 1000 if self.first_token_time else None
+        eval_ms = (self.last_token_time - self.first_token_time) * 1000 if self.first_token_time else None
+        output_tokens = self.output_tokens or len(self.parts)
+        return {
+            "total_ms": round(latency_ms, 2),
+            "ttft_ms": round(ttft_ms, 2) if ttft_ms is not None else None,
+            "eval_ms": round(eval_ms, 2) if eval_ms is not None else None,
+            "inter_token_ms": round(eval_ms / (output_tokens - 1), 2) if eval_ms and output_tokens > 1 else None,
+            "input_tokens": self.input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_per_sec": round(output_tokens / (eval_ms / 1000), 2) if eval_ms else None,
+        }
+
+
 class RequestsDeepSeekLLM(CustomLLM):
     context_window: int = 131072
     num_output: int = 8192
@@ -22,6 +69,10 @@ class RequestsDeepSeekLLM(CustomLLM):
     top_p: float = 0.95
     max_tokens: int = 8192
     request_timeout: float = 300.0
+    stop: Optional[List[str]] = None
+    output_format: Optional[Any] = None
+    task_name: str = "default"
+    backend_key: str = "deepseek_v3_2"
     _session: Optional[requests.Session] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
@@ -45,26 +96,41 @@ class RequestsDeepSeekLLM(CustomLLM):
             model_name=self.model_name,
         )
 
+    def _build_request(self, prompt: str, output_format: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        构造 chat/completions 请求体
+
+        DeepSeek 只支持 json_object 模式（不支持传入 JSON Schema），且要求 prompt 中出现 "json" 字样；
+        传入 Schema 时同样使用 json_object，字段校验由调用方按 Pydantic 模型完成。
+        """
+        data: Dict[str, Any] = {
+            "model": self.model_name,
+            "messages": [
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "max_tokens": self.max_tokens,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+        if self.stop:
+            data["stop"] = self.stop
+        output_format = output_format if output_format is not None else self.output_format
+        if output_format is not None and "json" in prompt.lower():
+            data["response_format"] = {"type": "json_object"}
+        return data
+
     @llm_completion_callback()
     def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        start_time = time.time()
         try:
-            start_time = time.time()
-            
             url = f"{self.base_url}/chat/completions"
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.api_key}"
             }
-            data = {
-                "model": self.model_name,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": self.temperature,
-                "top_p": self.top_p,
-                "max_tokens": self.max_tokens,
-                "stream": True
-            }
+            data = self._build_request(prompt, output_format=kwargs.get("output_format"))
 
             logger.info(f"DeepSeek API request: URL={url}, model={self.model_name}, timeout={self.request_timeout}s")
 
@@ -79,44 +145,37 @@ class RequestsDeepSeekLLM(CustomLLM):
             
             logger.info(f"DeepSeek API response status: {response.status_code}")
             
-            full_content = ""
-            input_tokens = 0
-            output_tokens = 0
-            chunk_count = 0
-            
+            stream_state = _StreamAccumulator()
+
             for line in response.iter_lines():
                 if line:
-                    chunk_count += 1
-                    if chunk_count % 10 == 0:
-                        logger.info(f"Processing chunk {chunk_count}...")
                     try:
                         if line.startswith(b"data: "):
                             line = line[6:]
                         if line.strip() == b"[DONE]":
-                            logger.info(f"Received [DONE] signal after {chunk_count} chunks")
+                            logger.debug(f"Received [DONE] signal after {stream_state.chunk_count} chunks")
                             break
-                        chunk = json.loads(line)
-                        if "choices" in chunk and len(chunk["choices"]) > 0:
-                            delta = chunk["choices"][0].get("delta", {})
-                            content = delta.get("content")
-                            if content is not None:
-                                full_content += content
-                            
-                            if "usage" in chunk:
-                                usage = chunk["usage"]
-                                input_tokens = usage.get("prompt_tokens", 0)
-                                output_tokens = usage.get("completion_tokens", 0)
+                        stream_state.feed(json.loads(line))
                     except (json.JSONDecodeError, KeyError) as e:
-                        logger.warning(f"Failed to parse chunk {chunk_count}: {e}")
+                        logger.warning(f"Failed to parse chunk {stream_state.chunk_count}: {e}")
                         continue
-            
-            logger.info(f"DeepSeek API streaming completed: {chunk_count} chunks, content length: {len(full_content)}")
-            
+
+            full_content = stream_state.text()
+            input_tokens = stream_state.input_tokens
+            output_tokens = stream_state.output_tokens
             total_tokens = input_tokens + output_tokens
-            
-            logger.info(f"DeepSeek API call: input={input_tokens} tokens, output={output_tokens} tokens, total={total_tokens} tokens")
+
+            logger.info(f"DeepSeek API call: {stream_state.chunk_count} chunks, content length: {len(full_content)}, input={input_tokens} tokens, output={output_tokens} tokens, total={total_tokens} tokens")
 
             latency_ms = (time.time() - start_time) * 1000
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="deepseek",
+                backend=self.backend_key,
+                stream=True,
+                **stream_state.metrics(start_time, latency_ms)
+            )
 
             try:
                 from app.services.observability_service import log_llm_call
@@ -138,28 +197,27 @@ class RequestsDeepSeekLLM(CustomLLM):
             )
         except Exception as e:
             logger.error(f"Error in RequestsDeepSeekLLM.complete: {e}")
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="deepseek",
+                backend=self.backend_key,
+                stream=True,
+                total_ms=(time.time() - start_time) * 1000,
+                success=False
+            )
             raise
 
     @llm_completion_callback()
     async def acomplete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+        start_time = time.time()
         try:
-            start_time = time.time()
-
             url = f"{self.base_url}/chat/completions"
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.api_key}"
             }
-            data = {
-                "model": self.model_name,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": self.temperature,
-                "top_p": self.top_p,
-                "max_tokens": self.max_tokens,
-                "stream": True
-            }
+            data = self._build_request(prompt, output_format=kwargs.get("output_format"))
 
             logger.info(f"DeepSeek API async request: URL={url}, model={self.model_name}, timeout={self.request_timeout}s")
 
@@ -174,49 +232,42 @@ class RequestsDeepSeekLLM(CustomLLM):
 
                     logger.info(f"DeepSeek API async response status: {response.status}")
 
-                    full_content = ""
-                    input_tokens = 0
-                    output_tokens = 0
-                    chunk_count = 0
+                    stream_state = _StreamAccumulator()
 
                     while True:
                         line = await response.content.readline()
                         if not line:
                             break
-                        chunk_count += 1
-                        if chunk_count % 10 == 0:
-                            logger.info(f"Processing chunk {chunk_count}...")
                         try:
                             line_str = line.decode('utf-8').strip()
                             if line_str.startswith("data: "):
                                 line_str = line_str[6:]
                             if line_str == "[DONE]":
-                                logger.info(f"Received [DONE] signal after {chunk_count} chunks")
+                                logger.debug(f"Received [DONE] signal after {stream_state.chunk_count} chunks")
                                 break
                             if not line_str:
                                 continue
-                            chunk = json.loads(line_str)
-                            if "choices" in chunk and len(chunk["choices"]) > 0:
-                                delta = chunk["choices"][0].get("delta", {})
-                                content = delta.get("content")
-                                if content is not None:
-                                    full_content += content
-
-                                if "usage" in chunk:
-                                    usage = chunk["usage"]
-                                    input_tokens = usage.get("prompt_tokens", 0)
-                                    output_tokens = usage.get("completion_tokens", 0)
+                            stream_state.feed(json.loads(line_str))
                         except (json.JSONDecodeError, KeyError, UnicodeDecodeError) as e:
-                            logger.warning(f"Failed to parse chunk {chunk_count}: {e}")
+                            logger.warning(f"Failed to parse chunk {stream_state.chunk_count}: {e}")
                             continue
 
-                    logger.info(f"DeepSeek API async streaming completed: {chunk_count} chunks, content length: {len(full_content)}")
-
+                    full_content = stream_state.text()
+                    input_tokens = stream_state.input_tokens
+                    output_tokens = stream_state.output_tokens
                     total_tokens = input_tokens + output_tokens
 
-                    logger.info(f"DeepSeek API async call: input={input_tokens} tokens, output={output_tokens} tokens, total={total_tokens} tokens")
+                    logger.info(f"DeepSeek API async call: {stream_state.chunk_count} chunks, content length: {len(full_content)}, input={input_tokens} tokens, output={output_tokens} tokens, total={total_tokens} tokens")
 
                     latency_ms = (time.time() - start_time) * 1000
+                    record_llm_call(
+                        task=self.task_name,
+                        model=self.model_name,
+                        provider="deepseek",
+                        backend=self.backend_key,
+                        stream=True,
+                        **stream_state.metrics(start_time, latency_ms)
+                    )
 
                     try:
                         from app.services.observability_service import log_llm_call
@@ -238,26 +289,29 @@ class RequestsDeepSeekLLM(CustomLLM):
                     )
         except Exception as e:
             logger.error(f"Error in RequestsDeepSeekLLM.acomplete: {e}")
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="deepseek",
+                backend=self.backend_key,
+                stream=True,
+                total_ms=(time.time() - start_time) * 1000,
+                success=False
+            )
             raise
 
     @llm_completion_callback()
     def stream_complete(self, prompt: str, **kwargs: Any):
+        start_time = time.time()
+        cancellation = kwargs.get("cancellation")
+        response = None
         try:
             url = f"{self.base_url}/chat/completions"
             headers = {
                 "Content-Type": "application/json",
                 "Authorization": f"Bearer {self.api_key}"
             }
-            data = {
-                "model": self.model_name,
-                "messages": [
-                    {"role": "user", "content": prompt}
-                ],
-                "temperature": self.temperature,
-                "top_p": self.top_p,
-                "max_tokens": self.max_tokens,
-                "stream": True
-            }
+            data = self._build_request(prompt, output_format=kwargs.get("output_format"))
 
             response = self._session.post(
                 url,
@@ -266,8 +320,11 @@ class RequestsDeepSeekLLM(CustomLLM):
                 timeout=self.request_timeout,
                 headers=headers
             )
+            if cancellation is not None:
+                cancellation.register(response)
             response.raise_for_status()
 
+            stream_state = _StreamAccumulator()
             for line in response.iter_lines():
                 if line:
                     try:
@@ -275,17 +332,40 @@ class RequestsDeepSeekLLM(CustomLLM):
                             line = line[6:]
                         if line.strip() == b"[DONE]":
                             break
-                        chunk = json.loads(line)
-                        if "choices" in chunk and len(chunk["choices"]) > 0:
-                            delta = chunk["choices"][0].get("delta", {})
-                            content = delta.get("content", "")
-                            if content:
-                                yield CompletionResponse(text=content, delta=content)
+                        part_count = len(stream_state.parts)
+                        stream_state.feed(json.loads(line))
+                        if len(stream_state.parts) > part_count:
+                            content = stream_state.parts[-1]
+                            yield CompletionResponse(text=content, delta=content)
                     except (json.JSONDecodeError, KeyError):
                         continue
+
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="deepseek",
+                backend=self.backend_key,
+                stream=True,
+                **stream_state.metrics(start_time, (time.time() - start_time) * 1000)
+            )
         except Exception as e:
+            if cancellation is not None and cancellation.cancelled:
+                logger.info("RequestsDeepSeekLLM.stream_complete cancelled by caller")
+                raise
             logger.error(f"Error in RequestsDeepSeekLLM.stream_complete: {e}")
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="deepseek",
+                backend=self.backend_key,
+                stream=True,
+                total_ms=(time.time() - start_time) * 1000,
+                success=False
+            )
             raise
+        finally:
+            if response is not None:
+                response.close()
 
     def close(self):
         self.close_shared_session()
@@ -0,0 +1,142 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from concurrent.futures import Future
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Embedding 请求微批处理器
+
+    将并发的单条文本请求在 max_wait_ms 内（或攒满 max_batch_size 条时）合并为一次批量调用，
+    再把向量按顺序分发回各调用方。批量调用在独立的后台线程中执行，调用方通过 Future 等待结果。
+    """
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_size: int = 10,
+        max_wait_ms: float = 5.0,
+        name: str = "embedding",
+    ):
+        self._embed_fn = embed_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0.0, max_wait_ms)
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[str, Future, float]] = []
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+
+        self._batches = 0
+        self._items = 0
+        self._full_batches = 0
+        self._largest_batch = 0
+        self._errors = 0
+        self._queue_wait_ms_total = 0.0
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Embedding batcher is closed")
+            self._pending.append((text, future, time.monotonic()))
+            self._ensure_worker()
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._worker and self._worker.is_alive():
+            self._worker.join(timeout=5)
+        self._worker = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            batches = self._batches
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "batches": batches,
+                "items": self._items,
+                "errors": self._errors,
+                "full_batches": self._full_batches,
+                "largest_batch": self._largest_batch,
+                "avg_batch_size": round(self._items / batches, 2) if batches else 0.0,
+                "avg_fill_ratio": round(self._items / (batches * self.max_batch_size), 3) if batches else 0.0,
+                "avg_queue_wait_ms": round(self._queue_wait_ms_total / self._items, 2) if self._items else 0.0,
+                "pending": len(self._pending),
+            }
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(
+                target=self._run,
+                name=f"{self.name}-batcher",
+                daemon=True
+            )
+            self._worker.start()
+
+    def _take_batch(self) -> List[Tuple[str, Future, float]]:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return []
+
+            deadline = self._pending[0][2] + self.max_wait_ms / 1000
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+
+            texts = [text for text, _, _ in batch]
+            started = time.monotonic()
+            try:
+                embeddings = self._embed_fn(texts)
+                if len(embeddings) != len(texts):
+                    raise ValueError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+                with self._cond:
+                    self._errors += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+            with self._cond:
+                self._batches += 1
+                self._items += len(batch)
+                self._largest_batch = max(self._largest_batch, len(batch))
+                if len(batch) >= self.max_batch_size:
+                    self._full_batches += 1
+                self._queue_wait_ms_total += sum((started - enqueued) * 1000 for _, _, enqueued in batch)
+
+            logger.debug(f"Embedded batch of {len(batch)}/{self.max_batch_size} in {(time.monotonic() - started) * 1000:.0f}ms")
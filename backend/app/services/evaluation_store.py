@@ -0,0 +1,158 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pathlib import Path
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EvaluationStore:
+    """
+    持久化各维度的原始评分，以 (评估内容 sha256, 评审模型, Prompt 版本, 评估模式, 维度) 为键
+
+    custom_weights 只影响加权平均，换权重重新评估或重新排名同一批剧本时直接用已存的维度分数计算，
+    不再调用 LLM。评估失败的维度不会写入。使用本地 SQLite 文件，维度结果以 JSON 保存。
+    同时保存剧本的文本特征，作为代理评分模型的训练数据。
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dimension_scores (
+                script_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                evaluation_mode TEXT NOT NULL,
+                dimension TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (script_hash, model, prompt_version, evaluation_mode, dimension)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS script_features (
+                script_hash TEXT PRIMARY KEY,
+                features TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+
+    def get_many(
+        self,
+        script_hashes: List[str],
+        model: str,
+        prompt_version: str,
+        evaluation_mode: str
+    ) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """返回已存储的维度结果，结构为 {script_hash: {dimension: result}}"""
+        hashes = list(dict.fromkeys(script_hashes))
+        found: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                rows = self._conn.execute(
+                    f"SELECT script_hash, dimension, result FROM dimension_scores "
+                    f"WHERE model = ? AND prompt_version = ? AND evaluation_mode = ? AND script_hash IN ({placeholders})",
+                    [model, prompt_version, evaluation_mode, *chunk]
+                ).fetchall()
+                for hash_value, dimension, result in rows:
+                    found.setdefault(hash_value, {})[dimension] = json.loads(result)
+            hits = sum(1 for hash_value in hashes if hash_value in found)
+            self._hits += hits
+            self._misses += len(hashes) - hits
+        return found
+
+    def get(self, script_hash: str, model: str, prompt_version: str, evaluation_mode: str) -> Dict[str, Dict[str, Any]]:
+        return self.get_many([script_hash], model, prompt_version, evaluation_mode).get(script_hash, {})
+
+    def put(
+        self,
+        script_hash: str,
+        model: str,
+        prompt_version: str,
+        evaluation_mode: str,
+        results: Dict[str, Dict[str, Any]],
+        features: Optional[Dict[str, float]] = None
+    ):
+        now = time.time()
+        rows = [
+            (script_hash, model, prompt_version, evaluation_mode, dimension, json.dumps(result, ensure_ascii=False), now)
+            for dimension, result in results.items()
+            if not result.get("failed")
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO dimension_scores "
+                "(script_hash, model, prompt_version, evaluation_mode, dimension, result, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            if features is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO script_features (script_hash, features, created_at) VALUES (?, ?, ?)",
+                    (script_hash, json.dumps(features), now)
+                )
+            self._conn.commit()
+            self._writes += len(rows)
+
+    def training_samples(
+        self,
+        model: str,
+        prompt_version: str,
+        evaluation_mode: str,
+        dimensions: Sequence[str]
+    ) -> List[Tuple[Dict[str, float], Dict[str, float]]]:
+        """返回所有维度齐全且保存了文本特征的剧本，格式为 (特征, {维度: 分数})"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT s.script_hash, s.dimension, s.result, f.features FROM dimension_scores s "
+                "JOIN script_features f ON f.script_hash = s.script_hash "
+                "WHERE s.model = ? AND s.prompt_version = ? AND s.evaluation_mode = ?",
+                [model, prompt_version, evaluation_mode]
+            ).fetchall()
+
+        scores: Dict[str, Dict[str, float]] = {}
+        features: Dict[str, Dict[str, float]] = {}
+        for hash_value, dimension, result, feature_json in rows:
+            scores.setdefault(hash_value, {})[dimension] = float(json.loads(result)["score"])
+            features.setdefault(hash_value, json.loads(feature_json))
+        return [
+            (features[hash_value], dimension_scores)
+            for hash_value, dimension_scores in scores.items()
+            if all(dimension in dimension_scores for dimension in dimensions)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(DISTINCT script_hash) FROM dimension_scores").fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                "path": str(self.path),
+                "scripts": entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "writes": self._writes,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,263 @@
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
+import asyncio
+import logging
+import threading
+import time
+
+from app.config import get_settings
+from app.services.llm_streaming import astream_completion
+from app.services.model_router import ModelRouter, model_router
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeBudget:
+    """
+    按任务限制对冲比例：每个任务最近 window 次请求中，对冲次数（含进行中的）不超过 max_ratio * window
+
+    对冲会让一次请求占用两个后端，预算上限保证额外开销有界，后端整体变慢时也不会把负载翻倍。
+    """
+
+    def __init__(self, max_ratio: float, window: int):
+        self.max_ratio = max_ratio
+        self.window = window
+        self._lock = threading.Lock()
+        self._history: Dict[str, Deque[bool]] = {}
+        self._inflight: Dict[str, int] = {}
+
+    def try_acquire(self, task_type: str) -> bool:
+        with self._lock:
+            history = self._history.get(task_type, ())
+            used = sum(history) + self._inflight.get(task_type, 0)
+            if used >= self.max_ratio * self.window:
+                return False
+            self._inflight[task_type] = self._inflight.get(task_type, 0) + 1
+            return True
+
+    def record(self, task_type: str, hedged: bool):
+        with self._lock:
+            self._history.setdefault(task_type, deque(maxlen=self.window)).append(hedged)
+            if hedged:
+                self._inflight[task_type] = max(0, self._inflight.get(task_type, 0) - 1)
+
+    def usage(self, task_type: str) -> Dict[str, Any]:
+        with self._lock:
+            history = self._history.get(task_type, ())
+            return {
+                "window_requests": len(history),
+                "window_hedges": sum(history),
+                "inflight_hedges": self._inflight.get(task_type, 0),
+                "max_hedges": int(self.max_ratio * self.window),
+            }
+
+
+class _HedgeAttempt:
+    """一个后端上的流式生成，首个 token 到达或结束时通知所属的竞速"""
+
+    def __init__(self, backend: str, client: Any, prompt: str, kwargs: Dict[str, Any], events: asyncio.Queue):
+        self.backend = backend
+        self.started = False
+        self.ttft_ms: Optional[float] = None
+        self._started_at = time.monotonic()
+        self.task = asyncio.create_task(self._run(client, prompt, kwargs, events))
+        self.task.add_done_callback(lambda _: events.put_nowait(self))
+
+    async def _run(self, client: Any, prompt: str, kwargs: Dict[str, Any], events: asyncio.Queue) -> str:
+        parts: List[str] = []
+        async for delta in astream_completion(client, prompt, **kwargs):
+            if not self.started:
+                self.started = True
+                self.ttft_ms = (time.monotonic() - self._started_at) * 1000
+                events.put_nowait(self)
+            parts.append(delta)
+        return "".join(parts)
+
+    @property
+    def failed(self) -> bool:
+        return self.task.done() and (self.task.cancelled() or self.task.exception() is not None)
+
+    @property
+    def answered(self) -> bool:
+        return self.started or (self.task.done() and not self.failed)
+
+
+class _HedgeRace:
+    def __init__(self, prompt: str, kwargs: Dict[str, Any]):
+        self._prompt = prompt
+        self._kwargs = kwargs
+        self._events: asyncio.Queue = asyncio.Queue()
+        self.attempts: List[_HedgeAttempt] = []
+
+    def start(self, backend: str, client: Any):
+        self.attempts.append(_HedgeAttempt(backend, client, self._prompt, self._kwargs, self._events))
+
+    async def first_answer(self, timeout: Optional[float]) -> Optional[_HedgeAttempt]:
+        """等待任一后端产出首个 token；超时返回 None，全部失败时抛出最后一个错误"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            for attempt in self.attempts:
+                if attempt.answered:
+                    return attempt
+            if all(attempt.failed for attempt in self.attempts):
+                raise self.attempts[-1].task.exception()
+
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._events.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    def cancel_all(self, keep: Optional[_HedgeAttempt] = None):
+        for attempt in self.attempts:
+            if attempt is not keep and not attempt.task.done():
+                attempt.task.cancel()
+
+
+class RequestHedger:
+    """
+    对冲请求：主后端在阈值内没有产出首个 token 时，把同一请求发给备用后端，
+    采用先产出首个 token 的一方并取消另一方（关闭其 HTTP 连接，后端停止生成）
+
+    阈值取主后端最近窗口内 TTFT 的 p90（HEDGE_PERCENTILE），样本不足时使用 HEDGE_DEFAULT_DELAY_MS。
+    主后端在首个 token 前失败时直接转到备用后端，不占用对冲预算。
+    """
+
+    def __init__(
+        self,
+        router: ModelRouter,
+        percentile: float = 90.0,
+        default_delay_ms: float = 3000.0,
+        min_delay_ms: float = 500.0,
+        max_ratio: float = 0.2,
+        window: int = 50,
+    ):
+        self.router = router
+        self.percentile = percentile
+        self.default_delay_ms = default_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.budget = HedgeBudget(max_ratio, window)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def hedge_delay_ms(self, backend: str) -> float:
+        observed = self.router.latency_percentile(backend, self.percentile)
+        if observed is None:
+            return self.default_delay_ms
+        return max(self.min_delay_ms, observed)
+
+    async def complete(
+        self,
+        task_type: str,
+        attempts: List[Tuple[str, Any]],
+        prompt: str,
+        **kwargs: Any
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        以对冲方式完成一次生成
+
+        attempts 的顺序由调用方决定：第一个是接口原本使用的主后端，其余为备用后端。
+        主后端处于熔断状态（或半开且已有在途试探）时才把它移到最后，不按路由器的延迟排名改变主后端。
+
+        Returns:
+            (生成文本, 对冲信息)，对冲信息包含主后端、阈值、是否对冲以及最终采用的后端
+        """
+        if not attempts:
+            raise RuntimeError(f"No backend available for task {task_type}")
+        if get_settings().ENABLE_MODEL_ROUTER and len(attempts) > 1 and not self.router.acquire(attempts[0][0]):
+            logger.info(f"Task {task_type}: primary {attempts[0][0]} circuit is open, starting with {attempts[1][0]}")
+            attempts = list(attempts[1:]) + [attempts[0]]
+
+        (primary, primary_client), backups = attempts[0], list(attempts[1:])
+        delay_ms = self.hedge_delay_ms(primary)
+        info: Dict[str, Any] = {
+            "task": task_type,
+            "primary": primary,
+            "delay_ms": round(delay_ms, 1),
+            "hedged": False,
+            "failover": False,
+            "budget_exhausted": False,
+        }
+
+        race = _HedgeRace(prompt, kwargs)
+        race.start(primary, primary_client)
+        started = time.monotonic()
+        try:
+            timeout = delay_ms / 1000 if backups else None
+            winner = None
+            while winner is None:
+                try:
+                    winner = await race.first_answer(timeout)
+                except Exception as e:
+                    if not backups:
+                        raise
+                    backend, client = backups.pop(0)
+                    logger.warning(f"Task {task_type} failed before first token, failing over to {backend}: {e}")
+                    race.start(backend, client)
+                    info["failover"] = True
+                    timeout = None
+                    continue
+
+                if winner is None:
+                    timeout = None
+                    if self.budget.try_acquire(task_type):
+                        backend, client = backups.pop(0)
+                        logger.info(f"Task {task_type}: no first token from {primary} within {delay_ms:.0f}ms, hedging to {backend}")
+                        race.start(backend, client)
+                        info["hedged"] = True
+                    else:
+                        info["budget_exhausted"] = True
+
+            race.cancel_all(keep=winner)
+            text = await winner.task
+        finally:
+            race.cancel_all()
+            self.budget.record(task_type, info["hedged"])
+
+        info["winner"] = winner.backend
+        info["ttft_ms"] = round(winner.ttft_ms, 1) if winner.ttft_ms is not None else None
+        info["total_ms"] = round((time.monotonic() - started) * 1000, 1)
+        self._record(task_type, info)
+        return text, info
+
+    def _record(self, task_type: str, info: Dict[str, Any]):
+        with self._lock:
+            stats = self._stats.setdefault(task_type, {
+                "requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "budget_exhausted": 0
+            })
+            stats["requests"] += 1
+            stats["hedged"] += int(info["hedged"])
+            stats["hedge_wins"] += int(info["hedged"] and info["winner"] != info["primary"])
+            stats["failovers"] += int(info["failover"])
+            stats["budget_exhausted"] += int(info["budget_exhausted"])
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            tasks = {task: dict(stats) for task, stats in self._stats.items()}
+        for task, stats in tasks.items():
+            stats["hedge_rate"] = round(stats["hedged"] / stats["requests"], 3) if stats["requests"] else 0.0
+            stats["budget"] = self.budget.usage(task)
+        return {
+            "enabled": get_settings().ENABLE_HEDGING,
+            "percentile": self.percentile,
+            "default_delay_ms": self.default_delay_ms,
+            "min_delay_ms": self.min_delay_ms,
+            "tasks": tasks,
+        }
+
+
+def _create_hedger() -> RequestHedger:
+    settings = get_settings()
+    return RequestHedger(
+        model_router,
+        percentile=settings.HEDGE_PERCENTILE,
+        default_delay_ms=settings.HEDGE_DEFAULT_DELAY_MS,
+        min_delay_ms=settings.HEDGE_MIN_DELAY_MS,
+        max_ratio=settings.HEDGE_MAX_RATIO,
+        window=settings.HEDGE_WINDOW,
+    )
+
+
+request_hedger = _create_hedger()
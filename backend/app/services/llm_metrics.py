@@ -0,0 +1,106 @@
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from dataclasses import dataclass
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_MAX_SAMPLES = 500
+
+
+@dataclass
+class LLMCallMetrics:
+    task: str
+    model: str
+    provider: str
+    stream: bool
+    total_ms: float
+    ttft_ms: Optional[float] = None
+    queue_ms: Optional[float] = None
+    prompt_eval_ms: Optional[float] = None
+    eval_ms: Optional[float] = None
+    inter_token_ms: Optional[float] = None
+    input_tokens: int = 0
+    output_tokens: int = 0
+    tokens_per_sec: Optional[float] = None
+    success: bool = True
+    backend: Optional[str] = None
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return round(ordered[index], 2)
+
+
+class LLMMetricsRegistry:
+    """
+    按 (任务, 模型) 聚合 LLM 调用指标
+
+    每个分组保留最近 500 次调用的样本用于计算 p50/p95，累计计数不受窗口限制。
+    """
+
+    def __init__(self, max_samples: int = _MAX_SAMPLES):
+        self._lock = threading.Lock()
+        self._max_samples = max_samples
+        self._samples: Dict[Tuple[str, str], Deque[LLMCallMetrics]] = {}
+        self._totals: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    def record(self, metrics: LLMCallMetrics):
+        key = (metrics.task, metrics.model)
+        with self._lock:
+            samples = self._samples.setdefault(key, deque(maxlen=self._max_samples))
+            samples.append(metrics)
+            totals = self._totals.setdefault(key, {"calls": 0, "errors": 0, "input_tokens": 0, "output_tokens": 0})
+            totals["calls"] += 1
+            totals["errors"] += 0 if metrics.success else 1
+            totals["input_tokens"] += metrics.input_tokens
+            totals["output_tokens"] += metrics.output_tokens
+
+        logger.info(
+            f"LLM call [{metrics.task}/{metrics.model}] total={metrics.total_ms:.0f}ms "
+            f"ttft={_fmt(metrics.ttft_ms)}ms queue={_fmt(metrics.queue_ms)}ms "
+            f"prompt_eval={_fmt(metrics.prompt_eval_ms)}ms eval={_fmt(metrics.eval_ms)}ms "
+            f"tokens={metrics.input_tokens}/{metrics.output_tokens} tps={_fmt(metrics.tokens_per_sec)}"
+        )
+
+    def get_summary(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            groups = [(key, list(samples), dict(self._totals[key])) for key, samples in self._samples.items()]
+
+        summary = []
+        for (task, model), samples, totals in groups:
+            entry: Dict[str, Any] = {"task": task, "model": model, **totals}
+            for field in ("total_ms", "ttft_ms", "queue_ms", "prompt_eval_ms", "eval_ms", "inter_token_ms", "tokens_per_sec"):
+                values = [getattr(s, field) for s in samples if s.success and getattr(s, field) is not None]
+                entry[field] = {"p50": _percentile(values, 50), "p95": _percentile(values, 95)}
+            summary.append(entry)
+        return sorted(summary, key=lambda e: (e["task"], e["model"]))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+
+
+def _fmt(value: Optional[float]) -> str:
+    return f"{value:.0f}" if value is not None else "-"
+
+
+llm_metrics = LLMMetricsRegistry()
+
+
+def record_llm_call(**kwargs: Any):
+    """记录一次 LLM 调用；带 backend 时同时上报给模型路由器，用于延迟统计与熔断"""
+    try:
+        metrics = LLMCallMetrics(**kwargs)
+        llm_metrics.record(metrics)
+        if metrics.backend:
+            from app.services.model_router import model_router
+            latency_ms = metrics.ttft_ms if metrics.ttft_ms is not None else metrics.total_ms
+            model_router.record(metrics.backend, latency_ms, metrics.success)
+    except Exception as e:
+        logger.warning(f"Failed to record LLM metrics: {e}")
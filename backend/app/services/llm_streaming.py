@@ -0,0 +1,127 @@
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from contextlib import closing
+import asyncio
+import json
+import logging
+import socket
+import threading
+
+logger = logging.getLogger(__name__)
+
+_STREAM_END = object()
+
+
+def _abort_response(response: Any):
+    """
+    关闭流式 HTTP 响应
+
+    只调用 response.close() 不会唤醒另一个线程中阻塞的 socket 读取，
+    因此先 shutdown 底层 socket，读取线程立即出错返回，服务端随之检测到断开并停止生成。
+    """
+    try:
+        fp = getattr(getattr(response, "raw", None), "_fp", None)
+        sock = getattr(getattr(getattr(fp, "fp", None), "raw", None), "_sock", None)
+        if sock is not None:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        response.close()
+    except Exception as e:
+        logger.debug(f"Failed to close streaming response: {e}")
+
+
+class StreamCancellation:
+    """
+    流式调用的取消句柄，以 cancellation 参数传给 stream_complete
+
+    客户端发出请求后调用 register 登记 HTTP 响应；调用方 cancel 时中止已登记（以及之后登记）的响应。
+    客户端据 cancelled 区分主动取消与后端故障，取消不计入路由器的错误统计。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._responses: List[Any] = []
+        self.cancelled = False
+
+    def register(self, response: Any):
+        with self._lock:
+            if not self.cancelled:
+                self._responses.append(response)
+                return
+        _abort_response(response)
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            responses, self._responses = self._responses, []
+        for response in responses:
+            _abort_response(response)
+
+
+async def astream_completion(llm: Any, prompt: str, **kwargs: Any) -> AsyncIterator[str]:
+    """
+    在后台线程中消费同步的 stream_complete，并以异步迭代器的形式逐段产出文本增量
+
+    RequestsOllamaLLM / RequestsDeepSeekLLM 的 stream_complete 基于 requests 的阻塞流式读取，
+    直接在事件循环中迭代会阻塞其他请求。调用方在流结束前退出（客户端断开、任务被取消）时，
+    通过 StreamCancellation 立即关闭底层 HTTP 连接，后台线程随之返回，后端停止生成。
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancellation = StreamCancellation()
+    finished = False
+
+    def _produce():
+        try:
+            with closing(llm.stream_complete(prompt, cancellation=cancellation, **kwargs)) as stream:
+                for chunk in stream:
+                    if cancellation.cancelled:
+                        break
+                    delta = getattr(chunk, "delta", None)
+                    if delta:
+                        loop.call_soon_threadsafe(queue.put_nowait, delta)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+    loop.run_in_executor(None, _produce)
+
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                finished = True
+                break
+            if isinstance(item, Exception):
+                finished = True
+                raise item
+            yield item
+    finally:
+        if not finished:
+            cancellation.cancel()
+
+
+def format_sse_event(event: str, data: Dict[str, Any]) -> str:
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def sse_response(events: AsyncIterator[Tuple[str, Dict[str, Any]]]) -> Any:
+    """将 (event, data) 异步迭代器包装为 text/event-stream 响应，生成中途的异常以 error 事件返回"""
+    from fastapi.responses import StreamingResponse
+
+    async def _body():
+        try:
+            async for event, data in events:
+                yield format_sse_event(event, data)
+        except Exception as e:
+            yield format_sse_event("error", {"detail": str(e)})
+        yield format_sse_event("done", {})
+
+    return StreamingResponse(
+        _body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,306 @@
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+import logging
+import random
+import threading
+import time
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    单个后端的熔断器
+
+    closed：正常放行；连续失败达到阈值，或窗口内错误率超过阈值时转为 open，
+    open 期间直接拒绝；冷却时间过后进入 half_open，只放行一个在途试探请求，成功则恢复 closed，失败则重新 open。
+    试探结束前其余请求视为熔断；试探请求超过 open_seconds 仍未上报结果（如被取消）时视为丢失，允许发起新的试探。
+    """
+
+    def __init__(self, failure_threshold: int, error_rate_threshold: float, open_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.open_count = 0
+        self.probe_started_at: Optional[float] = None
+
+    def available(self) -> bool:
+        """是否可以放行请求，不占用试探名额"""
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.open_seconds:
+            self.state = "half_open"
+        if self.state == "half_open":
+            return self.probe_started_at is None or now - self.probe_started_at >= self.open_seconds
+        return self.state == "closed"
+
+    def allow(self) -> bool:
+        """放行一次请求；half_open 时占用唯一的试探名额"""
+        if not self.available():
+            return False
+        if self.state == "half_open":
+            self.probe_started_at = time.monotonic()
+        return True
+
+    def release_probe(self):
+        """归还未实际发出的试探名额"""
+        self.probe_started_at = None
+
+    def on_result(self, success: bool, error_rate: float, samples: int):
+        self.probe_started_at = None
+        if success:
+            self.consecutive_failures = 0
+            if self.state == "half_open":
+                self.state = "closed"
+            return
+
+        self.consecutive_failures += 1
+        tripped = (
+            self.state == "half_open"
+            or self.consecutive_failures >= self.failure_threshold
+            or (samples >= 10 and error_rate >= self.error_rate_threshold)
+        )
+        if tripped and self.state != "open":
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.open_count += 1
+
+
+class ModelRouter:
+    """
+    延迟感知的模型路由器
+
+    按后端（TASK_MODEL_MAPPING 中的 qwen30b / deepseek_v3_2）统计滚动窗口内的 p50/p95 延迟与错误率，
+    为每个任务在映射允许的候选后端中选出健康且最快的一个。样本不足时优先主模型，并以小概率探测其他后端。
+    """
+
+    def __init__(
+        self,
+        window: int = 100,
+        min_samples: int = 5,
+        switch_margin: float = 0.2,
+        explore_rate: float = 0.05,
+        failure_threshold: int = 3,
+        error_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.switch_margin = switch_margin
+        self.explore_rate = explore_rate
+        self._breaker_args = (failure_threshold, error_rate_threshold, open_seconds)
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[Tuple[float, bool]]] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._decisions: Dict[str, Dict[str, int]] = {}
+        self._reasons: Dict[str, int] = {}
+
+    def _breaker(self, backend: str) -> CircuitBreaker:
+        if backend not in self._breakers:
+            self._breakers[backend] = CircuitBreaker(*self._breaker_args)
+        return self._breakers[backend]
+
+    def record(self, backend: str, latency_ms: float, success: bool):
+        with self._lock:
+            samples = self._samples.setdefault(backend, deque(maxlen=self.window))
+            samples.append((latency_ms, success))
+            errors = sum(1 for _, ok in samples if not ok)
+            breaker = self._breaker(backend)
+            previous_state = breaker.state
+            breaker.on_result(success, errors / len(samples), len(samples))
+            if breaker.state != previous_state:
+                logger.warning(f"Circuit breaker for {backend}: {previous_state} -> {breaker.state}")
+
+    def is_available(self, backend: str) -> bool:
+        """后端当前是否可以放行请求（half_open 且已有在途试探时为 False），不占用试探名额"""
+        with self._lock:
+            return self._breaker(backend).available()
+
+    def acquire(self, backend: str) -> bool:
+        """在实际调用后端前占用放行名额，half_open 时只有一个调用方能拿到试探名额"""
+        with self._lock:
+            return self._breaker(backend).allow()
+
+    def release_probes(self, backends: Iterable[str]):
+        """归还 rank 为故障转移预留、但最终没有调用的后端的试探名额"""
+        with self._lock:
+            for backend in backends:
+                breaker = self._breaker(backend)
+                if breaker.state == "half_open":
+                    breaker.release_probe()
+
+    def _latency_percentile(self, backend: str, pct: float) -> Optional[float]:
+        latencies = sorted(latency for latency, ok in self._samples.get(backend, ()) if ok)
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))]
+
+    def latency_percentile(self, backend: str, pct: float) -> Optional[float]:
+        """后端窗口内成功调用的延迟分位数（流式调用为 TTFT），样本不足时返回 None"""
+        with self._lock:
+            return self._latency_percentile(backend, pct)
+
+    def rank(self, task_type: str, candidates: List[str]) -> List[str]:
+        """
+        返回本次调用的后端尝试顺序（首个为路由选择，其余用于故障转移），熔断中的后端被排除
+
+        返回列表中处于 half_open 的后端已为本次调用占用试探名额，未实际调用的需通过 release_probes 归还。
+        所有候选都处于熔断状态时抛出 RuntimeError，让调用方快速失败而不是等待超时。
+        """
+        with self._lock:
+            healthy = [backend for backend in candidates if self._breaker(backend).allow()]
+            if not healthy:
+                self._reasons["all_open"] = self._reasons.get("all_open", 0) + 1
+                raise RuntimeError(f"All backends for task {task_type} are unavailable (circuit open): {candidates}")
+
+            chosen, reason = self._choose(healthy, candidates[0])
+            task_decisions = self._decisions.setdefault(task_type, {})
+            task_decisions[chosen] = task_decisions.get(chosen, 0) + 1
+            self._reasons[reason] = self._reasons.get(reason, 0) + 1
+
+        return [chosen] + [backend for backend in healthy if backend != chosen]
+
+    def _choose(self, healthy: List[str], primary: str) -> Tuple[str, str]:
+        if len(healthy) == 1:
+            return healthy[0], "primary" if healthy[0] == primary else "failover"
+
+        default = primary if primary in healthy else healthy[0]
+        p50 = {backend: self._latency_percentile(backend, 50) for backend in healthy}
+        unexplored = [backend for backend in healthy if p50[backend] is None and backend != default]
+        if p50[default] is None:
+            return default, "primary" if default == primary else "failover"
+        if unexplored and random.random() < self.explore_rate:
+            return random.choice(unexplored), "explore"
+
+        fastest = min((b for b in healthy if p50[b] is not None), key=lambda b: p50[b])
+        if fastest != default and p50[fastest] < p50[default] * (1 - self.switch_margin):
+            return fastest, "faster"
+        return default, "primary" if default == primary else "failover"
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            backends = {}
+            for backend in set(self._samples) | set(self._breakers):
+                samples = self._samples.get(backend, ())
+                breaker = self._breaker(backend)
+                errors = sum(1 for _, ok in samples if not ok)
+                backends[backend] = {
+                    "state": breaker.state,
+                    "samples": len(samples),
+                    "error_rate": round(errors / len(samples), 3) if samples else 0.0,
+                    "p50_ms": self._latency_percentile(backend, 50),
+                    "p95_ms": self._latency_percentile(backend, 95),
+                    "consecutive_failures": breaker.consecutive_failures,
+                    "open_count": breaker.open_count,
+                }
+            return {
+                "backends": backends,
+                "decisions": {task: dict(counts) for task, counts in self._decisions.items()},
+                "reasons": dict(self._reasons),
+            }
+
+
+class RoutedLLM:
+    """
+    按路由器决策把调用分发到任务允许的后端客户端，调用失败时按顺序故障转移
+
+    未覆盖的属性（model_name、base_url 等）委托给主后端客户端；
+    complete / acomplete 的响应在 additional_kwargs 中记录实际处理本次调用的 backend 与 model。
+    """
+
+    def __init__(self, task_type: str, clients: Dict[str, Any], router: ModelRouter):
+        self.task_type = task_type
+        self._clients = clients
+        self._router = router
+
+    @property
+    def primary(self) -> Any:
+        return next(iter(self._clients.values()))
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.primary, name)
+
+    def candidate_models(self) -> List[str]:
+        """任务允许的各后端的模型名，顺序与 TASK_MODEL_MAPPING 一致"""
+        return [getattr(client, "model_name", backend) for backend, client in self._clients.items()]
+
+    @staticmethod
+    def _tag(response: Any, backend: str, client: Any) -> Any:
+        extra = getattr(response, "additional_kwargs", None)
+        if isinstance(extra, dict):
+            extra["backend"] = backend
+            extra["model"] = getattr(client, "model_name", backend)
+        return response
+
+    def _attempts(self) -> List[Tuple[str, Any]]:
+        return [(backend, self._clients[backend]) for backend in self._router.rank(self.task_type, list(self._clients))]
+
+    def complete(self, prompt: str, **kwargs: Any) -> Any:
+        attempts = self._attempts()
+        last_error: Optional[Exception] = None
+        try:
+            while attempts:
+                backend, client = attempts.pop(0)
+                try:
+                    return self._tag(client.complete(prompt, **kwargs), backend, client)
+                except Exception as e:
+                    logger.warning(f"Task {self.task_type} failed on {backend}, trying next backend: {e}")
+                    last_error = e
+            raise last_error
+        finally:
+            self._router.release_probes(backend for backend, _ in attempts)
+
+    async def acomplete(self, prompt: str, **kwargs: Any) -> Any:
+        attempts = self._attempts()
+        last_error: Optional[Exception] = None
+        try:
+            while attempts:
+                backend, client = attempts.pop(0)
+                try:
+                    return self._tag(await client.acomplete(prompt, **kwargs), backend, client)
+                except Exception as e:
+                    logger.warning(f"Task {self.task_type} failed on {backend}, trying next backend: {e}")
+                    last_error = e
+            raise last_error
+        finally:
+            self._router.release_probes(backend for backend, _ in attempts)
+
+    def stream_complete(self, prompt: str, **kwargs: Any) -> Iterator[Any]:
+        attempts = self._attempts()
+        last_error: Optional[Exception] = None
+        try:
+            while attempts:
+                backend, client = attempts.pop(0)
+                started = False
+                try:
+                    for chunk in client.stream_complete(prompt, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    logger.warning(f"Task {self.task_type} stream failed on {backend} before first token, trying next backend: {e}")
+                    last_error = e
+            raise last_error
+        finally:
+            self._router.release_probes(backend for backend, _ in attempts)
+
+
+def _create_router() -> ModelRouter:
+    settings = get_settings()
+    return ModelRouter(
+        window=settings.ROUTER_WINDOW,
+        failure_threshold=settings.ROUTER_FAILURE_THRESHOLD,
+        error_rate_threshold=settings.ROUTER_ERROR_RATE_THRESHOLD,
+        open_seconds=settings.ROUTER_OPEN_SECONDS,
+    )
+
+
+model_router = _create_router()
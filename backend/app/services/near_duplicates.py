@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import random
+import re
+import threading
+
+from app.config import get_settings
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def shingles(text: str, size: int) -> List[int]:
+    """去除空白后的字符 size-gram，以 64 位 hash 表示"""
+    compact = _WHITESPACE_PATTERN.sub("", text)
+    if len(compact) <= size:
+        grams = {compact} if compact else set()
+    else:
+        grams = {compact[i:i + size] for i in range(len(compact) - size + 1)}
+    return [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "big") for g in grams]
+
+
+class MinHasher:
+    """
+    MinHash 近似 Jaccard 相似度
+
+    每个剧本计算 num_perm 个最小哈希组成的签名，两个签名中相同位置取值相等的比例即为两者字符 n-gram 集合 Jaccard 相似度的估计。
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, text: str) -> Tuple[int, ...]:
+        hashes = shingles(text, self.shingle_size)
+        if not hashes:
+            return tuple([_MERSENNE_PRIME] * self.num_perm)
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._params)
+
+    @staticmethod
+    def similarity(left: Sequence[int], right: Sequence[int]) -> float:
+        return sum(1 for x, y in zip(left, right) if x == y) / len(left)
+
+
+class NearDuplicateFilter:
+    """
+    在批量候选中识别近似重复的剧本
+
+    按顺序处理候选，与已保留的代表剧本的估计 Jaccard 相似度不低于 threshold 时视为其重复，
+    调用方只评估代表剧本，重复项直接复用代表的评估结果或被跳过。
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, shingle_size: int = 5):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle_size)
+        self._lock = threading.Lock()
+        self._checked = 0
+        self._duplicates = 0
+
+    def match(
+        self,
+        signature: Sequence[int],
+        representatives: Sequence[Tuple[Any, Sequence[int]]]
+    ) -> Optional[Tuple[Any, float]]:
+        """返回与 signature 最相似且超过阈值的代表 (键, 相似度)，没有时返回 None"""
+        best: Optional[Tuple[Any, float]] = None
+        for key, other in representatives:
+            similarity = self.hasher.similarity(signature, other)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (key, similarity)
+        with self._lock:
+            self._checked += 1
+            self._duplicates += best is not None
+        return best
+
+    def group(self, texts: Sequence[str]) -> Dict[int, Tuple[int, float]]:
+        """
+        Returns:
+            {重复项下标: (代表下标, 估计相似度)}，不在结果中的下标即为代表剧本
+        """
+        representatives: List[Tuple[int, Tuple[int, ...]]] = []
+        duplicates: Dict[int, Tuple[int, float]] = {}
+        for index, text in enumerate(texts):
+            signature = self.hasher.signature(text)
+            matched = self.match(signature, representatives)
+            if matched is None:
+                representatives.append((index, signature))
+            else:
+                duplicates[index] = matched
+        return duplicates
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "num_perm": self.hasher.num_perm,
+                "shingle_size": self.hasher.shingle_size,
+                "checked": self._checked,
+                "duplicates": self._duplicates,
+                "duplicate_rate": round(self._duplicates / self._checked, 3) if self._checked else 0.0,
+            }
+
+
+def _create_filter() -> NearDuplicateFilter:
+    settings = get_settings()
+    return NearDuplicateFilter(
+        threshold=settings.NEAR_DUPLICATE_THRESHOLD,
+        num_perm=settings.NEAR_DUPLICATE_NUM_PERM,
+        shingle_size=settings.NEAR_DUPLICATE_SHINGLE_SIZE,
+    )
+
+
+near_duplicate_filter = _create_filter()
@@ -6,6 +6,8 @@ from pathlib import Path
 from typing import List, Dict, Any, Optional
 from app.config import get_settings
 from app.services.ollama_client import get_ollama_manager
+from app.services.structured_output import StructuredOutputError, complete_structured
+from app.schemas.story_unit import StoryUnitDraftList
 import json
 import logging
 
@@ -30,22 +32,9 @@ class NovelService:
 
     @property
     def llm(self):
-        if settings.ENABLE_DEEPSEEK and settings.DEEPSEEK_API_KEY:
-            from app.services.deepseek_client import RequestsDeepSeekLLM
-            if not hasattr(self, '_deepseek_llm'):
-                self._deepseek_llm = RequestsDeepSeekLLM(
-                    model_name=settings.DEEPSEEK_MODEL,
-                    api_key=settings.DEEPSEEK_API_KEY,
-                    base_url=settings.DEEPSEEK_BASE_URL,
-                    temperature=0.7,
-                    top_p=0.95,
-                    max_tokens=8192
-                )
-            return self._deepseek_llm
-        else:
-            if not self._ollama_manager._initialized:
-                raise RuntimeError("Ollama client manager not initialized. Call initialize() first.")
-            return self._ollama_manager.llm_long_timeout
+        if not self._ollama_manager._initialized:
+            raise RuntimeError("Ollama client manager not initialized. Call initialize() first.")
+        return self._ollama_manager.get_model_for_task("plot_decomposition")
 
     async def save_uploaded_file(self, file_content: bytes, filename: str) -> str:
         file_ext = Path(filename).suffix.lower()
@@ -142,18 +131,20 @@ class NovelService:
 {segment}
 
 请按照以下JSON格式输出剧情单元列表：
-[
-  {{
-    "chapter": "章节名称",
-    "scene": "场景描述（简洁，20字以内）",
-    "characters": ["人物1", "人物2"],
-    "core_conflict": "核心冲突描述（30-50字）",
-    "emotion_curve": ["情绪1", "情绪2", "情绪3"],
-    "plot_function": "剧情功能（如：铺垫、冲突、转折、高潮、收尾）",
-    "original_text": "原文片段（50-100字，必须是原文中的内容）",
-    "confidence": 0.85
-  }}
-]
+{{
+  "units": [
+    {{
+      "chapter": "章节名称",
+      "scene": "场景描述（简洁，20字以内）",
+      "characters": ["人物1", "人物2"],
+      "core_conflict": "核心冲突描述（30-50字）",
+      "emotion_curve": ["情绪1", "情绪2", "情绪3"],
+      "plot_function": "剧情功能（如：铺垫、冲突、转折、高潮、收尾）",
+      "original_text": "原文片段（50-100字，必须是原文中的内容）",
+      "confidence": 0.85
+    }}
+  ]
+}}
 
 要求：
 1. 每个剧情单元是一个相对完整的情节片段，要有明确的场景转换或情节转折
@@ -162,37 +153,21 @@ class NovelService:
 4. 确保JSON格式正确，可以直接解析
 5. 根据片段长度合理拆分，通常3-8个单元
 6. 情感曲线要反映情节的发展变化（如：平静→紧张→高潮→缓解）
-7. 只返回JSON数组，不要包含其他内容
+7. 只返回JSON对象，不要包含其他内容
 """
 
             try:
                 logger.info(f"开始调用 LLM, prompt长度: {len(prompt)}")
-                logger.info(f"当前 LLM 类型: {type(self.llm)}")
-                logger.info(f"API Key: {self.llm.api_key[:10]}...")
-                logger.info(f"Base URL: {self.llm.base_url}")
-                response = self.llm.complete(prompt)
-                logger.info(f"LLM 响应已返回")
-                response_text = response.text.strip()
-                
-                if response_text.startswith('```json'):
-                    response_text = response_text[7:]
-                elif response_text.startswith('```'):
-                    response_text = response_text[3:]
-                if response_text.endswith('```'):
-                    response_text = response_text[:-3]
-                response_text = response_text.strip()
-
+                llm = self.llm
+                logger.info(f"当前 LLM 类型: {type(llm)}, 模型: {llm.model_name}")
+                logger.info(f"Base URL: {llm.base_url}")
                 try:
-                    json_start = response_text.find('[')
-                    json_end = response_text.rfind(']') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_text = response_text[json_start:json_end]
-                        units = json.loads(json_text)
-                    else:
-                        units = []
-                except json.JSONDecodeError as e:
-                    logger.error(f"JSON解析失败: {e}, 原始输出前500字符: {response_text[:500]}")
-                    units = []
+                    parsed, _ = complete_structured(llm, prompt, StoryUnitDraftList)
+                    units = [unit.model_dump() for unit in parsed.units]
+                except StructuredOutputError as e:
+                    logger.warning(f"剧情单元未通过结构化校验，尝试宽松解析: {str(e)[:200]}")
+                    units = self._parse_units_loosely(e.response.text.strip())
+                logger.info(f"LLM 响应已返回")
 
                 for unit in units:
                     if isinstance(unit, dict):
@@ -222,6 +197,27 @@ class NovelService:
 
         return all_units
 
+    def _parse_units_loosely(self, response_text: str) -> List[Dict[str, Any]]:
+        """结构化校验失败时的宽松解析：去掉 markdown 代码块后截取 JSON 数组或 units 字段"""
+        if response_text.startswith('```json'):
+            response_text = response_text[7:]
+        elif response_text.startswith('```'):
+            response_text = response_text[3:]
+        if response_text.endswith('```'):
+            response_text = response_text[:-3]
+        response_text = response_text.strip()
+
+        try:
+            if response_text.startswith('{'):
+                return json.loads(response_text).get("units", [])
+            json_start = response_text.find('[')
+            json_end = response_text.rfind(']') + 1
+            if json_start >= 0 and json_end > json_start:
+                return json.loads(response_text[json_start:json_end])
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error(f"JSON解析失败: {e}, 原始输出前500字符: {response_text[:500]}")
+        return []
+
     async def decompose_novel(
         self,
         novel_id: str,
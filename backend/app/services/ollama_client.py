@@ -1,10 +1,15 @@
 import requests
-from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
 from app.config import get_settings
 from app.services.ollama_llm import RequestsOllamaLLM, RequestsOllamaEmbedding
 from app.services.deepseek_client import RequestsDeepSeekLLM
+from app.services.embedding_store import EmbeddingStore
+from app.services.model_router import RoutedLLM, model_router
+from app.services.ollama_pool import OllamaHostPool, parse_base_urls
 from app.services.observability_service import create_trace
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -12,20 +17,116 @@ settings = get_settings()
 
 TASK_MODEL_MAPPING = {
     "plot_decomposition": {
-        "primary": "qwen30b",
-        "fallback": None
+        "primary": "deepseek_v3_2",
+        "fallback": "qwen30b",
+        "profile": {
+            "num_predict": 8192,
+            "num_ctx": 32768,
+            "temperature": 0.5,
+            "top_p": 0.95,
+            "stop": None,
+            "timeout": 300,
+            "format": None,
+            "think": False
+        }
     },
     "semantic_validation": {
         "primary": "qwen30b",
-        "fallback": None
+        "fallback": None,
+        "profile": {
+            "num_predict": 1024,
+            "num_ctx": 8192,
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "stop": None,
+            "timeout": 120,
+            "format": "json",
+            "think": False
+        }
     },
     "script_generation": {
-        "primary": "qwen30b",
-        "fallback": "deepseek_v3_2"
+        "primary": "deepseek_v3_2",
+        "fallback": "qwen30b",
+        "profile": {
+            "num_predict": 4096,
+            "num_ctx": 16384,
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "stop": None,
+            "timeout": 300,
+            "format": None,
+            "think": False
+        }
     },
     "script_refinement": {
         "primary": "deepseek_v3_2",
-        "fallback": "qwen30b"
+        "fallback": "qwen30b",
+        "profile": {
+            "num_predict": 4096,
+            "num_ctx": 16384,
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "stop": None,
+            "timeout": 300,
+            "format": None,
+            "think": 1024
+        }
+    },
+    "quality_scoring": {
+        "primary": "deepseek_v3_2",
+        "fallback": "qwen30b",
+        "profile": {
+            "num_predict": 1024,
+            "num_ctx": 8192,
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "stop": None,
+            "timeout": 90,
+            "format": "json",
+            "think": False
+        }
+    },
+    "quality_scoring_fast": {
+        "primary": "deepseek_v3_2",
+        "fallback": "qwen30b",
+        "profile": {
+            "num_predict": 2048,
+            "num_ctx": 8192,
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "stop": None,
+            "timeout": 120,
+            "format": "json",
+            "think": False
+        }
+    },
+    "temporal_analysis": {
+        "primary": "qwen30b",
+        "fallback": None,
+        "profile": {
+            "num_predict": 1024,
+            "num_ctx": 8192,
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "stop": None,
+            "timeout": 120,
+            "format": "json",
+            "think": False
+        }
+    },
+    "planning": {
+        "primary": "deepseek_v3_2",
+        "fallback": "qwen30b",
+        "profile": {
+            "num_predict": 8192,
+            "num_ctx": 16384,
+            "temperature": 0.7,
+            "top_p": 0.95,
+            "stop": None,
+            "timeout": 300,
+            "format": None,
+            "think": 1024
+        }
     },
     "embedding": {
         "primary": "bge-m3",
@@ -40,7 +141,13 @@ class OllamaClientManager:
         self._llm_long_timeout: Optional[RequestsOllamaLLM] = None
         self._embed_model: Optional[RequestsOllamaEmbedding] = None
         self._deepseek_llm: Optional[RequestsDeepSeekLLM] = None
+        self._embedding_store: Optional[EmbeddingStore] = None
+        self._llm_pool: Optional[OllamaHostPool] = None
+        self._embed_pool: Optional[OllamaHostPool] = None
         self._session: Optional[requests.Session] = None
+        self._warmup_status: Dict[str, Dict[str, Any]] = {}
+        self._warmup_finished = False
+        self._task_clients: Dict[Tuple[str, str], Any] = {}
         self._initialized = False
 
     def initialize(self):
@@ -57,36 +164,56 @@ class OllamaClientManager:
         
         self._session = session
 
+        llm_urls = parse_base_urls(settings.OLLAMA_BASE_URLS, settings.OLLAMA_BASE_URL)
+        embed_urls = parse_base_urls(settings.OLLAMA_EMBED_BASE_URLS, ",".join(llm_urls))
+        self._llm_pool = self._create_pool("llm", llm_urls)
+        self._embed_pool = self._create_pool("embedding", embed_urls)
+
         self._llm = RequestsOllamaLLM(
             model_name=settings.LLM_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
+            base_url=llm_urls[0],
             request_timeout=120,
             context_window=8192,
             num_output=2048,
             temperature=0.7,
             top_p=0.9,
             repeat_penalty=1.1,
-            session=session
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            session=session,
+            pool=self._llm_pool
         )
 
         self._llm_long_timeout = RequestsOllamaLLM(
             model_name=settings.LLM_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
+            base_url=llm_urls[0],
             request_timeout=300,
             context_window=16384,
             num_output=4096,
             temperature=0.5,
             top_p=0.95,
             repeat_penalty=1.1,
-            session=session
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            session=session,
+            pool=self._llm_pool
         )
 
+        if settings.ENABLE_EMBEDDING_STORE:
+            try:
+                self._embedding_store = EmbeddingStore(settings.EMBEDDING_STORE_PATH)
+            except Exception as e:
+                logger.warning(f"Embedding store unavailable, embeddings will not be persisted: {e}")
+
         self._embed_model = RequestsOllamaEmbedding(
             model_name=settings.EMBEDDING_MODEL,
-            base_url=settings.OLLAMA_BASE_URL,
-            embed_batch_size=10,
+            base_url=embed_urls[0],
+            embed_batch_size=settings.EMBED_BATCH_SIZE,
+            enable_batching=settings.ENABLE_EMBED_BATCHING,
+            batch_wait_ms=settings.EMBED_BATCH_MAX_WAIT_MS,
             timeout=120,
-            session=session
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            session=session,
+            store=self._embedding_store,
+            pool=self._embed_pool
         )
 
         if settings.ENABLE_DEEPSEEK and settings.DEEPSEEK_API_KEY:
@@ -126,6 +253,16 @@ class OllamaClientManager:
         if self._deepseek_llm:
             self._deepseek_llm.close()
 
+        if self._embedding_store:
+            self._embedding_store.close()
+            self._embedding_store = None
+
+        for pool in (self._llm_pool, self._embed_pool):
+            if pool:
+                pool.close()
+        self._llm_pool = None
+        self._embed_pool = None
+
         if self._session:
             self._session.close()
             self._session = None
@@ -134,9 +271,153 @@ class OllamaClientManager:
         self._llm_long_timeout = None
         self._embed_model = None
         self._deepseek_llm = None
+        self._warmup_status = {}
+        self._warmup_finished = False
+        self._task_clients = {}
         self._initialized = False
         logger.info("Ollama client manager closed successfully")
 
+    def _create_pool(self, name: str, base_urls: List[str]) -> Optional[OllamaHostPool]:
+        """配置了多台主机时创建负载均衡池并启动后台健康检查，单台主机时直接使用 base_url"""
+        if len(base_urls) < 2:
+            return None
+        pool = OllamaHostPool(
+            name,
+            base_urls,
+            session=self._session,
+            failure_threshold=settings.OLLAMA_HOST_FAILURE_THRESHOLD,
+            drain_seconds=settings.OLLAMA_HOST_DRAIN_SECONDS,
+            health_interval=settings.OLLAMA_HEALTH_CHECK_INTERVAL,
+            affinity_slack=settings.OLLAMA_AFFINITY_SLACK,
+            prefix_chars=settings.OLLAMA_PREFIX_AFFINITY_CHARS,
+        )
+        pool.start_health_checks()
+        logger.info(f"Ollama {name} pool: {base_urls}")
+        return pool
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        if not self._initialized:
+            raise RuntimeError("Ollama client manager not initialized. Call initialize() first.")
+        return {
+            "llm": self._llm_pool.get_stats() if self._llm_pool else None,
+            "embedding": self._embed_pool.get_stats() if self._embed_pool else None,
+        }
+
+    def _model_hosts(self) -> Dict[str, Tuple[str, Any, List[str]]]:
+        """生成模型与 Embedding 模型各自所在的主机：配置了主机池时为池中全部主机，否则为 base_url"""
+        return {
+            self._llm.model_name: (
+                "llm", self._llm, self._llm_pool.base_urls if self._llm_pool else [self._llm.base_url]
+            ),
+            self._embed_model.model_name: (
+                "embedding", self._embed_model,
+                self._embed_pool.base_urls if self._embed_pool else [self._embed_model.base_url]
+            ),
+        }
+
+    def warm_up(self) -> Dict[str, Dict[str, Any]]:
+        """
+        预热 Ollama 生成模型与 Embedding 模型
+
+        首次请求需要等待模型加载（qwen3:30b 通常 20-60 秒），启动时在后台线程中主动加载，
+        并通过 keep_alive 让模型常驻，避免空闲 5 分钟后被卸载。
+        配置了多台主机时在每台主机上并行加载，hosts 记录各主机的结果；
+        所有主机加载成功为 ready，部分主机成功为 partial（仍可提供服务），全部失败为 failed。
+        """
+        if not self._initialized:
+            raise RuntimeError("Ollama client manager not initialized. Call initialize() first.")
+
+        targets = self._model_hosts()
+        for model_name, (kind, _, base_urls) in targets.items():
+            self._warmup_status[model_name] = {
+                "kind": kind,
+                "status": "pending",
+                "hosts": {base_url: {"status": "pending"} for base_url in base_urls},
+            }
+
+        for model_name, (kind, client, base_urls) in targets.items():
+            status = self._warmup_status[model_name]
+            status["status"] = "loading"
+            start_time = time.time()
+
+            def _load(base_url: str, client: Any = client, host_status: Dict[str, Dict[str, Any]] = status["hosts"]):
+                host_status[base_url]["status"] = "loading"
+                host_start = time.time()
+                try:
+                    client.load_model(timeout=settings.MODEL_WARMUP_TIMEOUT, base_url=base_url)
+                    host_status[base_url] = {"status": "ready", "load_ms": round((time.time() - host_start) * 1000, 1)}
+                except Exception as e:
+                    host_status[base_url] = {"status": "failed", "error": str(e)}
+                    logger.warning(f"Failed to warm up model {model_name} on {base_url}: {e}")
+
+            with ThreadPoolExecutor(max_workers=len(base_urls)) as executor:
+                list(executor.map(_load, base_urls))
+
+            ready_hosts = [url for url, host in status["hosts"].items() if host["status"] == "ready"]
+            status["load_ms"] = round((time.time() - start_time) * 1000, 1)
+            if len(ready_hosts) == len(base_urls):
+                status["status"] = "ready"
+                logger.info(f"Model {model_name} warmed up on {len(ready_hosts)} host(s) in {status['load_ms']:.0f}ms")
+            elif ready_hosts:
+                status["status"] = "partial"
+                logger.warning(f"Model {model_name} warmed up on {len(ready_hosts)}/{len(base_urls)} hosts")
+            else:
+                status["status"] = "failed"
+                status["error"] = "; ".join(f"{url}: {host.get('error')}" for url, host in status["hosts"].items())
+
+        self._warmup_finished = True
+        return self._warmup_status
+
+    def get_readiness(self) -> Dict[str, Any]:
+        """
+        返回各模型的预热与加载状态
+
+        ready 表示预热流程已完成且每个模型至少在一台主机上加载成功；
+        loaded_hosts 来自各主机的 Ollama /api/ps，反映模型当前是否驻留在该主机显存中（查询失败的主机为 None），
+        loaded 表示至少一台主机上驻留。
+        """
+        if not self._initialized:
+            return {"ready": False, "warmup_finished": False, "models": {}}
+
+        models: Dict[str, Dict[str, Any]] = {}
+        loaded_by_host: Dict[str, Optional[set]] = {}
+        for model_name, (_, _, base_urls) in self._model_hosts().items():
+            entry = dict(self._warmup_status.get(model_name, {"status": "skipped"}))
+            loaded_hosts: Dict[str, Optional[bool]] = {}
+            for base_url in base_urls:
+                if base_url not in loaded_by_host:
+                    loaded_by_host[base_url] = self._list_loaded_models(base_url)
+                loaded = loaded_by_host[base_url]
+                loaded_hosts[base_url] = None if loaded is None else _normalize_model_name(model_name) in loaded
+            entry["loaded_hosts"] = loaded_hosts
+            if any(value is not None for value in loaded_hosts.values()):
+                entry["loaded"] = any(loaded_hosts.values())
+            models[model_name] = entry
+
+        if settings.ENABLE_MODEL_WARMUP:
+            ready = self._warmup_finished and all(m["status"] in ("ready", "partial") for m in models.values())
+        else:
+            ready = True
+
+        return {
+            "ready": ready,
+            "warmup_finished": self._warmup_finished,
+            "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+            "models": models
+        }
+
+    def _list_loaded_models(self, base_url: str) -> Optional[set]:
+        try:
+            response = self._session.get(f"{base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            return {
+                _normalize_model_name(m.get("name") or m.get("model", ""))
+                for m in response.json().get("models", [])
+            }
+        except Exception as e:
+            logger.warning(f"Failed to list loaded Ollama models on {base_url}: {e}")
+            return None
+
     @property
     def llm(self) -> RequestsOllamaLLM:
         if not self._initialized:
@@ -171,8 +452,11 @@ class OllamaClientManager:
             task_metadata: 任务元数据，用于可观测性追踪
         
         Returns:
-            对应的模型实例
+            对应的模型实例；启用路由器时返回 RoutedLLM，每次调用按各后端的延迟与熔断状态选择
         """
+        if not self._initialized:
+            raise RuntimeError("Ollama client manager not initialized. Call initialize() first.")
+
         if task_type not in TASK_MODEL_MAPPING:
             logger.warning(f"Unknown task type: {task_type}, falling back to default LLM")
             return self.llm
@@ -189,23 +473,100 @@ class OllamaClientManager:
             **(task_metadata or {})
         })
 
-        if primary == "qwen30b":
-            return self.llm
-        elif primary == "deepseek_v3_2":
-            if self._deepseek_llm and settings.ENABLE_DEEPSEEK:
-                return self._deepseek_llm
-            elif use_fallback and fallback == "qwen30b":
-                logger.warning(f"DeepSeek not available for task {task_type}, falling back to qwen30b")
-                return self.llm
-            else:
-                logger.warning(f"DeepSeek not available for task {task_type}, using qwen30b as default")
-                return self.llm
-        elif primary == "bge-m3":
+        if primary == "bge-m3":
             return self._embed_model
-        else:
+        if primary not in ("qwen30b", "deepseek_v3_2"):
             logger.warning(f"Unknown primary model: {primary}, falling back to default LLM")
             return self.llm
 
+        candidates = self._task_candidates(task_type, use_fallback)
+
+        if not settings.ENABLE_MODEL_ROUTER:
+            return self._get_task_client(task_type, candidates[0])
+
+        return RoutedLLM(
+            task_type,
+            {candidate: self._get_task_client(task_type, candidate) for candidate in candidates},
+            model_router
+        )
+
+    def get_task_clients(self, task_type: str) -> List[Tuple[str, Any]]:
+        """按 TASK_MODEL_MAPPING 顺序（主模型在前、备用模型在后）返回任务可用的 (后端, 客户端) 列表，供对冲请求等需要直接控制后端的场景使用"""
+        if not self._initialized:
+            raise RuntimeError("Ollama client manager not initialized. Call initialize() first.")
+        if task_type not in TASK_MODEL_MAPPING:
+            return [(self.llm.backend_key, self.llm)]
+        return [(candidate, self._get_task_client(task_type, candidate)) for candidate in self._task_candidates(task_type)]
+
+    def _task_candidates(self, task_type: str, use_fallback: bool = True) -> List[str]:
+        config = TASK_MODEL_MAPPING[task_type]
+        primary = config["primary"]
+        fallback = config.get("fallback")
+
+        candidates = [primary]
+        if use_fallback and fallback and fallback != primary:
+            candidates.append(fallback)
+        deepseek_available = bool(self._deepseek_llm and settings.ENABLE_DEEPSEEK)
+        if not deepseek_available and "deepseek_v3_2" in candidates:
+            candidates.remove("deepseek_v3_2")
+            if not candidates:
+                logger.warning(f"DeepSeek not available for task {task_type}, using qwen30b as default")
+                candidates = ["qwen30b"]
+            else:
+                logger.warning(f"DeepSeek not available for task {task_type}, falling back to qwen30b")
+        return candidates
+
+    def _get_task_client(self, task_type: str, model_key: str) -> Any:
+        """
+        按任务 profile 构造（并缓存）客户端，num_predict / num_ctx / temperature / stop / timeout / format / think 均取自 profile
+
+        没有 profile 的任务直接返回共享的默认客户端。
+        """
+        profile = TASK_MODEL_MAPPING[task_type].get("profile")
+        if not profile:
+            return self.llm if model_key == "qwen30b" else self._deepseek_llm
+
+        cache_key = (task_type, model_key)
+        if cache_key in self._task_clients:
+            return self._task_clients[cache_key]
+
+        if model_key == "deepseek_v3_2":
+            client = RequestsDeepSeekLLM(
+                model_name=settings.DEEPSEEK_MODEL,
+                api_key=settings.DEEPSEEK_API_KEY,
+                base_url=settings.DEEPSEEK_BASE_URL,
+                temperature=profile["temperature"],
+                top_p=profile["top_p"],
+                max_tokens=profile["num_predict"],
+                request_timeout=profile["timeout"],
+                stop=profile.get("stop"),
+                output_format=profile.get("format"),
+                task_name=task_type,
+                session=self._session
+            )
+        else:
+            client = RequestsOllamaLLM(
+                model_name=settings.LLM_MODEL,
+                base_url=self._llm.base_url,
+                request_timeout=profile["timeout"],
+                context_window=profile["num_ctx"],
+                num_output=profile["num_predict"],
+                temperature=profile["temperature"],
+                top_p=profile["top_p"],
+                repeat_penalty=1.1,
+                stop=profile.get("stop"),
+                output_format=profile.get("format"),
+                think=profile.get("think"),
+                task_name=task_type,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+                session=self._session,
+                pool=self._llm_pool
+            )
+
+        logger.info(f"Created {model_key} client for task {task_type} with profile {profile}")
+        self._task_clients[cache_key] = client
+        return client
+
     def should_use_deepseek(self, current_score: Optional[float] = None) -> bool:
         """
         判断是否应该使用 deepseek 模型
@@ -218,11 +579,16 @@ class OllamaClientManager:
         """
         if not settings.ENABLE_DEEPSEEK or not self._deepseek_llm:
             return False
-        
+
         if current_score is not None and current_score >= 3.5:
             return False
-        
-        return True
+
+        # 返回 True 时调用方随即使用 deepseek，半开状态下需要占用唯一的试探名额
+        return model_router.acquire("deepseek_v3_2")
+
+
+def _normalize_model_name(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
 
 
 _ollama_manager = OllamaClientManager()
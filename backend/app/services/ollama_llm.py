@@ -1,14 +1,69 @@
-from typing import Any, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from contextlib import contextmanager
 from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
 from llama_index.core.llms.callbacks import llm_completion_callback
 from llama_index.core.embeddings import BaseEmbedding
 from llama_index.core.bridge.pydantic import PrivateAttr
+from app.services.embedding_batcher import EmbeddingBatcher
+from app.services.embedding_store import EmbeddingStore, text_hash
+from app.services.token_utils import estimate_tokens, select_num_ctx
+from app.services.llm_metrics import record_llm_call
+from app.services.ollama_pool import OllamaHostPool
 import requests
+import asyncio
 import logging
+import re
 import time
 
 logger = logging.getLogger(__name__)
 
+_THINKING_MODEL_PREFIXES = ("qwen3", "deepseek-r1", "gpt-oss", "magistral")
+_THINK_BLOCK_PATTERN = re.compile(r"<think>([\s\S]*?)(?:</think>|$)")
+
+
+def split_reasoning(text: str) -> Tuple[str, str]:
+    """
+    拆分模型输出中的 <think> 推理段与正式回答
+
+    兼容只输出了结尾 </think> 的情况（推理开头被模板吞掉），返回 (回答, 推理文本)。
+    """
+    if "</think>" in text and "<think>" not in text:
+        reasoning, _, answer = text.partition("</think>")
+        return answer.strip(), reasoning.strip()
+
+    reasoning_parts = _THINK_BLOCK_PATTERN.findall(text)
+    if not reasoning_parts:
+        return text, ""
+    answer = _THINK_BLOCK_PATTERN.sub("", text)
+    return answer.strip(), "\n".join(part.strip() for part in reasoning_parts)
+
+
+def _ollama_timing_metrics(result: Dict[str, Any], latency_ms: float) -> Dict[str, Any]:
+    """
+    由 Ollama 返回的 *_duration（纳秒）计算耗时指标
+
+    queue_ms 为客户端耗时与服务端 total_duration 之差（排队 + 网络）；非流式调用的 TTFT
+    近似为排队 + 模型加载 + prompt 处理耗时。
+    """
+    eval_count = result.get("eval_count", 0)
+    load_ms = result.get("load_duration", 0) / 1e6
+    prompt_eval_ms = result.get("prompt_eval_duration", 0) / 1e6
+    eval_ms = result.get("eval_duration", 0) / 1e6
+    total_duration_ms = result.get("total_duration", 0) / 1e6
+    queue_ms = max(0.0, latency_ms - total_duration_ms) if total_duration_ms else None
+
+    return {
+        "total_ms": round(latency_ms, 2),
+        "ttft_ms": round((queue_ms or 0.0) + load_ms + prompt_eval_ms, 2),
+        "queue_ms": round(queue_ms, 2) if queue_ms is not None else None,
+        "prompt_eval_ms": round(prompt_eval_ms, 2),
+        "eval_ms": round(eval_ms, 2),
+        "inter_token_ms": round(eval_ms / eval_count, 2) if eval_count else None,
+        "input_tokens": result.get("prompt_eval_count", 0),
+        "output_tokens": eval_count,
+        "tokens_per_sec": round(eval_count / (eval_ms / 1000), 2) if eval_ms else None,
+    }
+
 
 class RequestsOllamaLLM(CustomLLM):
     context_window: int = 8192
@@ -19,7 +74,15 @@ class RequestsOllamaLLM(CustomLLM):
     top_p: float = 0.9
     request_timeout: float = 120.0
     repeat_penalty: float = 1.1
+    keep_alive: Optional[str] = None
+    dynamic_num_ctx: bool = True
+    stop: Optional[List[str]] = None
+    output_format: Optional[Any] = None
+    think: Optional[Union[bool, int]] = None
+    task_name: str = "default"
+    backend_key: str = "qwen30b"
     _session: Optional[requests.Session] = PrivateAttr(default=None)
+    _pool: Optional[OllamaHostPool] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -27,6 +90,20 @@ class RequestsOllamaLLM(CustomLLM):
             self._session = kwargs["session"]
         else:
             self._session = requests.Session()
+        self._pool = kwargs.get("pool")
+
+    @contextmanager
+    def _endpoint(self, prompt: Optional[str] = None, cancellation: Optional[Any] = None) -> Iterator[str]:
+        """配置了主机池时按 Prompt 前缀、模型亲和性与在途请求数选择主机，否则使用 base_url；主动取消不计入主机失败"""
+        if self._pool is None:
+            yield self.base_url
+            return
+        with self._pool.lease(self.model_name, prompt, cancellation) as base_url:
+            yield base_url
+
+    @property
+    def supports_thinking(self) -> bool:
+        return self.model_name.lower().startswith(_THINKING_MODEL_PREFIXES)
 
     @property
     def metadata(self) -> LLMMetadata:
@@ -36,34 +113,88 @@ class RequestsOllamaLLM(CustomLLM):
             model_name=self.model_name,
         )
 
+    def _build_request(self, prompt: str, stream: bool, output_format: Optional[Any] = None) -> Dict[str, Any]:
+        """
+        构造 /api/generate 请求体
+
+        think 为 bool 时直接开关推理模式；为整数时视为推理 token 预算：开启推理，
+        并把预算加到 num_predict 上，避免推理段挤占回答的输出长度。
+        output_format 可以是 "json" 或 JSON Schema，单次调用传入时覆盖客户端默认值。
+        """
+        num_predict = self.num_output
+        think: Optional[bool] = None
+        if self.think is not None and self.supports_thinking:
+            if isinstance(self.think, bool):
+                think = self.think
+            else:
+                think = True
+                num_predict += int(self.think)
+
+        options: Dict[str, Any] = {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "num_predict": num_predict,
+            "repeat_penalty": self.repeat_penalty,
+        }
+        if self.stop:
+            options["stop"] = self.stop
+        if self.dynamic_num_ctx:
+            prompt_tokens = estimate_tokens(prompt)
+            options["num_ctx"] = select_num_ctx(prompt_tokens, num_predict, self.context_window)
+            logger.info(
+                f"Ollama request {self.model_name}: ~{prompt_tokens} prompt tokens, "
+                f"num_predict={num_predict}, num_ctx={options['num_ctx']}, think={think}"
+            )
+
+        data: Dict[str, Any] = {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "options": options
+        }
+        if think is not None:
+            data["think"] = think
+        output_format = output_format if output_format is not None else self.output_format
+        if output_format is not None:
+            data["format"] = output_format
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        return data
+
     @llm_completion_callback()
     def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
         start_time = time.time()
         try:
-            url = f"{self.base_url}/api/generate"
-            data = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": self.temperature,
-                    "top_p": self.top_p,
-                    "num_predict": self.num_output,
-                    "repeat_penalty": self.repeat_penalty,
-                }
-            }
+            data = self._build_request(prompt, stream=False, output_format=kwargs.get("output_format"))
 
-            response = self._session.post(
-                url,
-                json=data,
-                timeout=self.request_timeout,
-                headers={"Content-Type": "application/json"}
+            with self._endpoint(prompt) as base_url:
+                response = self._session.post(
+                    f"{base_url}/api/generate",
+                    json=data,
+                    timeout=self.request_timeout,
+                    headers={"Content-Type": "application/json"}
+                )
+                response.raise_for_status()
+                result = response.json()
+            response_text, inline_reasoning = split_reasoning(result.get("response", ""))
+            reasoning_text = result.get("thinking") or inline_reasoning
+            eval_count = result.get("eval_count", 0)
+            reasoning_tokens = min(estimate_tokens(reasoning_text), eval_count) if reasoning_text else 0
+            logger.info(
+                f"Ollama response {self.model_name}: prompt_eval_count={result.get('prompt_eval_count', 0)}, "
+                f"eval_count={eval_count} (reasoning~{reasoning_tokens}, answer~{eval_count - reasoning_tokens}), "
+                f"num_ctx={data['options'].get('num_ctx', 'default')}"
             )
-            response.raise_for_status()
-            result = response.json()
-            response_text = result.get("response", "")
             
             latency_ms = (time.time() - start_time) * 1000
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="ollama",
+                backend=self.backend_key,
+                stream=False,
+                **_ollama_timing_metrics(result, latency_ms)
+            )
             
             try:
                 from app.services.observability_service import log_llm_call
@@ -74,7 +205,7 @@ class RequestsOllamaLLM(CustomLLM):
                     input_tokens=result.get("prompt_eval_count", 0),
                     output_tokens=result.get("eval_count", 0),
                     latency_ms=latency_ms,
-                    metadata={"provider": "ollama", "base_url": self.base_url}
+                    metadata={"provider": "ollama", "base_url": base_url}
                 )
             except ImportError:
                 pass
@@ -82,45 +213,106 @@ class RequestsOllamaLLM(CustomLLM):
             return CompletionResponse(text=response_text)
         except Exception as e:
             logger.error(f"Error in RequestsOllamaLLM.complete: {e}")
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="ollama",
+                backend=self.backend_key,
+                stream=False,
+                total_ms=(time.time() - start_time) * 1000,
+                success=False
+            )
             raise
 
     @llm_completion_callback()
     def stream_complete(self, prompt: str, **kwargs: Any):
+        start_time = time.time()
+        first_token_time: Optional[float] = None
+        cancellation = kwargs.get("cancellation")
+        response = None
         try:
-            url = f"{self.base_url}/api/generate"
-            data = {
-                "model": self.model_name,
-                "prompt": prompt,
-                "stream": True,
-                "options": {
-                    "temperature": self.temperature,
-                    "top_p": self.top_p,
-                    "num_predict": self.num_output,
-                    "repeat_penalty": self.repeat_penalty,
-                }
-            }
+            data = self._build_request(prompt, stream=True, output_format=kwargs.get("output_format"))
 
-            response = self._session.post(
-                url,
-                json=data,
-                stream=True,
-                timeout=self.request_timeout,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-
-            for line in response.iter_lines():
-                if line:
-                    import json
-                    try:
-                        chunk = json.loads(line)
-                        if "response" in chunk:
-                            yield CompletionResponse(text=chunk["response"], delta=chunk["response"])
-                    except json.JSONDecodeError:
-                        continue
+            with self._endpoint(prompt, cancellation) as base_url:
+                response = self._session.post(
+                    f"{base_url}/api/generate",
+                    json=data,
+                    stream=True,
+                    timeout=self.request_timeout,
+                    headers={"Content-Type": "application/json"}
+                )
+                if cancellation is not None:
+                    cancellation.register(response)
+                response.raise_for_status()
+
+                in_think = False
+                for line in response.iter_lines():
+                    if line:
+                        import json
+                        try:
+                            chunk = json.loads(line)
+                            if chunk.get("done"):
+                                latency_ms = (time.time() - start_time) * 1000
+                                metrics = _ollama_timing_metrics(chunk, latency_ms)
+                                if first_token_time is not None:
+                                    metrics["ttft_ms"] = round((first_token_time - start_time) * 1000, 2)
+                                record_llm_call(
+                                    task=self.task_name,
+                                    model=self.model_name,
+                                    provider="ollama",
+                                    backend=self.backend_key,
+                                    stream=True,
+                                    **metrics
+                                )
+                            text = chunk.get("response")
+                            if not text:
+                                continue
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                            if "<think>" in text:
+                                in_think = True
+                            if in_think:
+                                if "</think>" in text:
+                                    in_think = False
+                                    text = text.split("</think>", 1)[1].lstrip()
+                                else:
+                                    continue
+                            if text:
+                                yield CompletionResponse(text=text, delta=text)
+                        except json.JSONDecodeError:
+                            continue
         except Exception as e:
+            if cancellation is not None and cancellation.cancelled:
+                logger.info("RequestsOllamaLLM.stream_complete cancelled by caller")
+                raise
             logger.error(f"Error in RequestsOllamaLLM.stream_complete: {e}")
+            record_llm_call(
+                task=self.task_name,
+                model=self.model_name,
+                provider="ollama",
+                backend=self.backend_key,
+                stream=True,
+                total_ms=(time.time() - start_time) * 1000,
+                success=False
+            )
             raise
+        finally:
+            if response is not None:
+                response.close()
+
+    def load_model(self, timeout: Optional[float] = None, base_url: Optional[str] = None) -> Dict[str, Any]:
+        """空 prompt 请求只加载模型不生成，用于启动预热；base_url 指定要加载的主机，默认为 base_url"""
+        data: Dict[str, Any] = {"model": self.model_name, "prompt": "", "stream": False}
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        response = self._session.post(
+            f"{base_url or self.base_url}/api/generate",
+            json=data,
+            timeout=timeout or self.request_timeout,
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        return response.json()
 
     def close(self):
         self.close_shared_session()
@@ -134,7 +326,13 @@ class RequestsOllamaEmbedding(BaseEmbedding):
     model_name: str = "nomic-embed-text"
     base_url: str = "http://localhost:11434"
     timeout: float = 120.0
+    enable_batching: bool = True
+    batch_wait_ms: float = 5.0
+    keep_alive: Optional[str] = None
     _session: Optional[requests.Session] = PrivateAttr(default=None)
+    _batcher: Optional[EmbeddingBatcher] = PrivateAttr(default=None)
+    _store: Optional[EmbeddingStore] = PrivateAttr(default=None)
+    _pool: Optional[OllamaHostPool] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -143,6 +341,17 @@ class RequestsOllamaEmbedding(BaseEmbedding):
         else:
             self._session = requests.Session()
 
+        self._store = kwargs.get("store")
+        self._pool = kwargs.get("pool")
+
+        if self.enable_batching:
+            self._batcher = EmbeddingBatcher(
+                self._fetch_and_store,
+                max_batch_size=self.embed_batch_size,
+                max_wait_ms=self.batch_wait_ms,
+                name=self.model_name
+            )
+
     @property
     def _get_query_embedding(self):
         return self._get_embedding
@@ -163,46 +372,60 @@ class RequestsOllamaEmbedding(BaseEmbedding):
     def _aget_text_embedding(self):
         return self._aget_embedding
 
+    @contextmanager
+    def _endpoint(self) -> Iterator[str]:
+        if self._pool is None:
+            yield self.base_url
+            return
+        with self._pool.lease(self.model_name) as base_url:
+            yield base_url
+
     def _get_embedding(self, text: str) -> List[float]:
+        return self._get_embeddings([text])[0]
+
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        stored = self._lookup_stored(texts)
+        missing = list(dict.fromkeys(text for text in texts if text_hash(text) not in stored))
+        if missing:
+            for text, embedding in zip(missing, self._fetch_and_store(missing)):
+                stored[text_hash(text)] = embedding
+        return [stored[text_hash(text)] for text in texts]
+
+    def _lookup_stored(self, texts: List[str]) -> Dict[str, List[float]]:
+        if not self._store:
+            return {}
         try:
-            url = f"{self.base_url}/api/embed"
-            data = {
-                "model": self.model_name,
-                "input": text
-            }
-            response = self._session.post(
-                url,
-                json=data,
-                timeout=self.timeout,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            result = response.json()
-            if "embedding" in result:
-                return result["embedding"]
-            elif "embeddings" in result and len(result["embeddings"]) > 0:
-                return result["embeddings"][0]
-            else:
-                raise ValueError(f"No embedding found in response: {result}")
+            return self._store.get_many(self.model_name, texts)
         except Exception as e:
-            logger.error(f"Error in RequestsOllamaEmbedding._get_embedding: {e}")
-            raise
+            logger.warning(f"Embedding store lookup failed: {e}")
+            return {}
 
-    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def _fetch_and_store(self, texts: List[str]) -> List[List[float]]:
+        embeddings = self._request_embeddings(texts)
+        if self._store:
+            try:
+                self._store.put_many(self.model_name, texts, embeddings)
+            except Exception as e:
+                logger.warning(f"Embedding store write failed: {e}")
+        return embeddings
+
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
         try:
-            url = f"{self.base_url}/api/embed"
             data = {
                 "model": self.model_name,
                 "input": texts
             }
-            response = self._session.post(
-                url,
-                json=data,
-                timeout=self.timeout,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            result = response.json()
+            if self.keep_alive is not None:
+                data["keep_alive"] = self.keep_alive
+            with self._endpoint() as base_url:
+                response = self._session.post(
+                    f"{base_url}/api/embed",
+                    json=data,
+                    timeout=self.timeout,
+                    headers={"Content-Type": "application/json"}
+                )
+                response.raise_for_status()
+                result = response.json()
             if "embeddings" in result:
                 return result["embeddings"]
             elif "embedding" in result and len(texts) == 1:
@@ -210,20 +433,54 @@ class RequestsOllamaEmbedding(BaseEmbedding):
             else:
                 raise ValueError(f"No embeddings found in response: {result}")
         except Exception as e:
-            logger.error(f"Error in RequestsOllamaEmbedding._get_embeddings: {e}")
+            logger.error(f"Error in RequestsOllamaEmbedding._request_embeddings: {e}")
             raise
 
     def get_text_embedding(self, text: str) -> List[float]:
+        stored = self._lookup_stored([text]).get(text_hash(text))
+        if stored is not None:
+            return stored
+        if self._batcher:
+            return self._batcher.embed(text)
         return self._get_embedding(text)
 
     def get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
         return self._get_embeddings(texts)
 
     async def _aget_embedding(self, text: str) -> List[float]:
-        return self._get_embedding(text)
+        stored = self._lookup_stored([text]).get(text_hash(text))
+        if stored is not None:
+            return stored
+        if self._batcher:
+            return await self._batcher.aembed(text)
+        return await asyncio.to_thread(self._get_embedding, text)
+
+    def load_model(self, timeout: Optional[float] = None, base_url: Optional[str] = None) -> Dict[str, Any]:
+        """发送一条不经过存储与批处理的 embed 请求，用于启动预热；base_url 指定要加载的主机，默认为 base_url"""
+        data: Dict[str, Any] = {"model": self.model_name, "input": "warmup"}
+        if self.keep_alive is not None:
+            data["keep_alive"] = self.keep_alive
+        response = self._session.post(
+            f"{base_url or self.base_url}/api/embed",
+            json=data,
+            timeout=timeout or self.timeout,
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def get_store_stats(self) -> Optional[Dict[str, Any]]:
+        return self._store.get_stats() if self._store else None
+
+    def get_batcher_stats(self) -> Optional[Dict[str, Any]]:
+        return self._batcher.get_stats() if self._batcher else None
 
     def close(self):
         self.close_shared_session()
 
     def close_shared_session(self):
+        if self._batcher:
+            self._batcher.close()
+            self._batcher = None
+        self._store = None
         self._session = None
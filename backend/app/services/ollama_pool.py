@@ -0,0 +1,234 @@
+from typing import Any, Dict, Iterator, List, Optional, Set
+from collections import OrderedDict
+from contextlib import contextmanager
+import hashlib
+import logging
+import threading
+import time
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+def parse_base_urls(value: str, default: str) -> List[str]:
+    """解析逗号分隔的 Ollama 地址列表，为空时使用 default"""
+    urls = [url.strip().rstrip("/") for url in (value or "").split(",") if url.strip()]
+    return list(dict.fromkeys(urls)) or [default.rstrip("/")]
+
+
+def prefix_key(prompt: str, prefix_chars: int) -> Optional[str]:
+    """取 Prompt 前 prefix_chars 个字符的 hash 作为前缀亲和键，过短的 Prompt 不参与亲和路由"""
+    if prefix_chars <= 0 or len(prompt) < prefix_chars:
+        return None
+    return hashlib.sha1(prompt[:prefix_chars].encode("utf-8")).hexdigest()
+
+
+class OllamaHost:
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.drained_at: Optional[float] = None
+        self.loaded_models: Set[str] = set()
+        self.requests = 0
+        self.failures = 0
+        self.last_check: Optional[float] = None
+
+
+class OllamaHostPool:
+    """
+    多台 Ollama 主机的负载均衡池
+
+    每次请求选择未处于摘除状态、且当前在途请求最少的主机；若某台主机已加载目标模型（来自 /api/ps 或最近一次成功请求），
+    只要其在途请求不超过最空闲主机 affinity_slack 个，就优先选择它，避免在其他主机上触发模型换入换出。
+    前缀亲和优先级更高：前 prefix_chars 个字符相同的 Prompt 发往上一次处理该前缀的主机，以复用服务端的 KV 缓存。
+    连续失败达到 failure_threshold 次的主机被摘除，后台健康检查成功或摘除超过 drain_seconds 后重新加入。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_urls: List[str],
+        session: Optional[requests.Session] = None,
+        failure_threshold: int = 3,
+        drain_seconds: float = 30.0,
+        health_interval: float = 15.0,
+        affinity_slack: int = 2,
+        prefix_chars: int = 512,
+        max_prefixes: int = 1024,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.drain_seconds = drain_seconds
+        self.health_interval = health_interval
+        self.affinity_slack = affinity_slack
+        self.prefix_chars = prefix_chars
+        self.max_prefixes = max_prefixes
+        self._prefix_hosts: "OrderedDict[str, OllamaHost]" = OrderedDict()
+        self._prefix_hits = 0
+        self._prefix_misses = 0
+        self._hosts = [OllamaHost(url) for url in base_urls]
+        self._session = session or requests.Session()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @property
+    def base_urls(self) -> List[str]:
+        return [host.base_url for host in self._hosts]
+
+    def _available(self, host: OllamaHost) -> bool:
+        if host.healthy:
+            return True
+        return host.drained_at is not None and time.monotonic() - host.drained_at >= self.drain_seconds
+
+    def _choose(self, model: str, key: Optional[str] = None) -> OllamaHost:
+        candidates = [host for host in self._hosts if self._available(host)]
+        if not candidates:
+            candidates = sorted(self._hosts, key=lambda h: h.consecutive_failures)[:1]
+
+        least_loaded = min(candidates, key=lambda h: h.outstanding)
+        if key is not None:
+            cached = self._prefix_hosts.get(key)
+            if cached in candidates and cached.outstanding <= least_loaded.outstanding + self.affinity_slack:
+                self._prefix_hits += 1
+                return cached
+            self._prefix_misses += 1
+
+        warm = [host for host in candidates if model in host.loaded_models]
+        if warm:
+            best_warm = min(warm, key=lambda h: h.outstanding)
+            if best_warm.outstanding <= least_loaded.outstanding + self.affinity_slack:
+                return best_warm
+        return least_loaded
+
+    def acquire(self, model: str, prompt: Optional[str] = None) -> str:
+        with self._lock:
+            key = prefix_key(prompt, self.prefix_chars) if prompt else None
+            host = self._choose(model, key)
+            host.outstanding += 1
+            host.requests += 1
+            if key is not None:
+                self._prefix_hosts[key] = host
+                self._prefix_hosts.move_to_end(key)
+                while len(self._prefix_hosts) > self.max_prefixes:
+                    self._prefix_hosts.popitem(last=False)
+            return host.base_url
+
+    def release(self, base_url: str, model: str, success: Optional[bool]):
+        """归还主机；success 为 None 表示结果与主机健康无关（调用方主动取消），只减少在途数"""
+        with self._lock:
+            host = next((h for h in self._hosts if h.base_url == base_url), None)
+            if host is None:
+                return
+            host.outstanding = max(0, host.outstanding - 1)
+            if success is None:
+                return
+            if success:
+                host.consecutive_failures = 0
+                host.loaded_models.add(model)
+                if not host.healthy:
+                    host.healthy = True
+                    host.drained_at = None
+                    logger.info(f"Ollama host {base_url} ({self.name}) recovered")
+                return
+
+            host.failures += 1
+            host.consecutive_failures += 1
+            if host.consecutive_failures >= self.failure_threshold and (host.healthy or self._available(host)):
+                host.healthy = False
+                host.drained_at = time.monotonic()
+                logger.warning(f"Draining Ollama host {base_url} ({self.name}) after {host.consecutive_failures} consecutive failures")
+
+    @contextmanager
+    def lease(self, model: str, prompt: Optional[str] = None, cancellation: Optional[Any] = None) -> Iterator[str]:
+        """
+        选出一台主机并在请求期间计入在途数，请求抛出异常时记为失败
+
+        调用方中途停止读取流不算失败；cancellation（StreamCancellation）已取消时，
+        关闭连接引起的异常既不计为失败也不计为成功，对冲落败、批次提前结束或客户端断开不会摘除健康的主机。
+        """
+        base_url = self.acquire(model, prompt)
+        success: Optional[bool] = False
+        try:
+            yield base_url
+            success = True
+        except GeneratorExit:
+            success = True
+            raise
+        except BaseException:
+            if cancellation is not None and cancellation.cancelled:
+                success = None
+            raise
+        finally:
+            self.release(base_url, model, success)
+
+    def check_health(self):
+        """通过 /api/ps 探测每台主机，同时刷新其已加载模型列表"""
+        for host in list(self._hosts):
+            try:
+                response = self._session.get(f"{host.base_url}/api/ps", timeout=5)
+                response.raise_for_status()
+                loaded = {m.get("name") or m.get("model", "") for m in response.json().get("models", [])}
+                loaded |= {name.split(":latest")[0] for name in loaded if name.endswith(":latest")}
+                with self._lock:
+                    host.loaded_models = loaded
+                    host.last_check = time.time()
+                    if not host.healthy:
+                        logger.info(f"Ollama host {host.base_url} ({self.name}) passed health check")
+                    host.healthy = True
+                    host.drained_at = None
+                    host.consecutive_failures = 0
+            except Exception as e:
+                with self._lock:
+                    host.last_check = time.time()
+                    if host.healthy:
+                        logger.warning(f"Ollama host {host.base_url} ({self.name}) failed health check: {e}")
+                    host.healthy = False
+                    host.drained_at = time.monotonic()
+
+    def start_health_checks(self):
+        if self._health_thread and self._health_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._health_thread = threading.Thread(target=self._run_health_checks, name=f"{self.name}-health", daemon=True)
+        self._health_thread.start()
+
+    def _run_health_checks(self):
+        while not self._stop_event.is_set():
+            self.check_health()
+            self._stop_event.wait(self.health_interval)
+
+    def close(self):
+        self._stop_event.set()
+        if self._health_thread and self._health_thread.is_alive():
+            self._health_thread.join(timeout=5)
+        self._health_thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "name": self.name,
+                "prefix_affinity": {
+                    "prefix_chars": self.prefix_chars,
+                    "tracked_prefixes": len(self._prefix_hosts),
+                    "hits": self._prefix_hits,
+                    "misses": self._prefix_misses,
+                },
+                "hosts": [
+                    {
+                        "base_url": host.base_url,
+                        "healthy": host.healthy,
+                        "available": self._available(host),
+                        "outstanding": host.outstanding,
+                        "requests": host.requests,
+                        "failures": host.failures,
+                        "consecutive_failures": host.consecutive_failures,
+                        "loaded_models": sorted(host.loaded_models),
+                        "last_check": host.last_check,
+                    }
+                    for host in self._hosts
+                ],
+            }
@@ -0,0 +1,161 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import logging
+
+from app.services.token_utils import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SectionContent = Union[str, List[str]]
+
+# 份额越高的章节在预算不足时保留得越多；目标与额外约束篇幅小但直接决定生成方向，份额与人物、参考片段相当
+DEFAULT_SECTION_SHARES = {
+    "plot": 0.2,
+    "characters": 0.3,
+    "goals": 0.25,
+    "constraints": 0.25,
+    "references": 0.3,
+    "temporal": 0.2,
+}
+
+_TRUNCATION_MARKER = "……"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本使其估算 token 数不超过 max_tokens，被截断时以省略号结尾"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= estimate_tokens(_TRUNCATION_MARKER):
+        return ""
+
+    limit = max_tokens - estimate_tokens(_TRUNCATION_MARKER)
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= limit:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + _TRUNCATION_MARKER
+
+
+def fit_items(items: List[str], max_tokens: int) -> List[str]:
+    """
+    在预算内保留列表中的每一项
+
+    按 water-filling 分配：短条目完整保留，剩余预算在较长条目间平分，每条保留开头部分，
+    保证所有参考片段 / 人物 / 前后剧情都有代表，而不是只保留前几条。
+    返回的列表与输入等长，预算不足以保留的条目为空字符串。
+    """
+    sizes = [estimate_tokens(item) for item in items]
+    if sum(sizes) <= max_tokens:
+        return list(items)
+
+    caps = [0] * len(items)
+    remaining = max_tokens
+    pending = sorted(range(len(items)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        index = pending[0]
+        if sizes[index] <= share:
+            caps[index] = sizes[index]
+            remaining -= sizes[index]
+            pending.pop(0)
+            continue
+        for index in pending:
+            caps[index] = share
+        break
+
+    return [item if sizes[i] <= caps[i] else truncate_to_tokens(item, caps[i]) for i, item in enumerate(items)]
+
+
+class PromptBudget:
+    """
+    按章节分配 Prompt 的 token 预算
+
+    total_tokens 在各章节（剧情 / 人物 / 目标 / 额外约束 / 参考片段 / 时序上下文）间按 shares 分配；
+    实际用不完预算的章节把余量让给超出预算的章节，最后对仍然超出的章节逐条截断。
+    """
+
+    def __init__(self, total_tokens: int, shares: Optional[Dict[str, float]] = None):
+        self.total_tokens = total_tokens
+        self.shares = dict(shares or DEFAULT_SECTION_SHARES)
+
+    def _allocate(self, sizes: Dict[str, int]) -> Dict[str, int]:
+        weights = {name: self.shares.get(name, 0.1) for name in sizes}
+        budgets: Dict[str, int] = {}
+        remaining = self.total_tokens
+        pending = dict(sizes)
+        while pending:
+            total_weight = sum(weights[name] for name in pending) or 1.0
+            satisfied = {
+                name: size for name, size in pending.items()
+                if size <= remaining * weights[name] / total_weight
+            }
+            if not satisfied:
+                for name in pending:
+                    budgets[name] = int(remaining * weights[name] / total_weight)
+                break
+            for name, size in satisfied.items():
+                budgets[name] = size
+                remaining -= size
+                del pending[name]
+        return budgets
+
+    def fit(self, sections: Dict[str, SectionContent]) -> Tuple[Dict[str, SectionContent], Dict[str, Any]]:
+        """
+        Returns:
+            (截断后的各章节内容, 预算报告)，报告包含每个章节的原始与最终 token 数
+        """
+        sizes = {
+            name: sum(estimate_tokens(item) for item in content) if isinstance(content, list) else estimate_tokens(content)
+            for name, content in sections.items()
+        }
+        budgets = self._allocate(sizes)
+
+        fitted: Dict[str, SectionContent] = {}
+        report: Dict[str, Any] = {"budget": self.total_tokens, "sections": {}}
+        for name, content in sections.items():
+            if sizes[name] <= budgets[name]:
+                fitted[name] = content
+            elif isinstance(content, list):
+                fitted[name] = fit_items(content, budgets[name])
+            else:
+                fitted[name] = truncate_to_tokens(content, budgets[name])
+
+            final_content = fitted[name]
+            final_tokens = (
+                sum(estimate_tokens(item) for item in final_content)
+                if isinstance(final_content, list) else estimate_tokens(final_content)
+            )
+            report["sections"][name] = {
+                "original_tokens": sizes[name],
+                "final_tokens": final_tokens,
+                "truncated": final_tokens < sizes[name],
+            }
+
+        truncated = [name for name, info in report["sections"].items() if info["truncated"]]
+        if truncated:
+            logger.info(f"Prompt 超出预算 {self.total_tokens} tokens，已截断章节: {truncated}")
+        return fitted, report
+
+
+def fit_prompt(
+    total_tokens: int,
+    sections: Dict[str, SectionContent],
+    build: Callable[[Dict[str, SectionContent]], str],
+    shares: Optional[Dict[str, float]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    在 total_tokens 内组装完整 Prompt
+
+    build 根据各章节内容渲染整个 Prompt。先以空章节渲染一次估算模板本身（生成要求、章节标题）的 token 数，
+    从总预算中扣除后再把剩余预算分配给各章节，最终 Prompt 不超过 total_tokens。
+
+    Returns:
+        (Prompt, 预算报告)，报告额外包含 template_tokens
+    """
+    empty = {name: [""] * len(content) if isinstance(content, list) else "" for name, content in sections.items()}
+    template_tokens = estimate_tokens(build(empty))
+    fitted, report = PromptBudget(max(0, total_tokens - template_tokens), shares).fit(sections)
+    report["template_tokens"] = template_tokens
+    return build(fitted), report
@@ -0,0 +1,372 @@
+"""
+由历史 LLM 评审结果训练的本地代理评分模型
+
+每个评估维度一个岭回归模型，输入为剧本的文本特征（长度、对白占比、人物覆盖率、重复率、标点与舞台提示密度等），
+训练数据来自 EvaluationStore 中已存储的维度分数。预测耗时为毫秒级，用于在调用 LLM 评审前对候选剧本排序筛选。
+
+离线训练：
+    python -m app.services.proxy_scorer --mode thorough
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+import time
+
+from app.config import get_settings
+from app.services.script_heuristics import dialogue_ratio, format_problems, repetition_ratio
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_SPEAKER_PATTERN = re.compile(r"^\s*([\w·]{1,12})\s*[：:]")
+_STAGE_DIRECTION_PATTERN = re.compile(r"^\s*[（(【\[]")
+
+FEATURE_NAMES = (
+    "log_length",
+    "log_lines",
+    "avg_line_length",
+    "dialogue_ratio",
+    "character_coverage",
+    "repetition_ratio",
+    "distinct_char_ratio",
+    "speaker_count",
+    "stage_direction_ratio",
+    "exclamation_density",
+    "question_density",
+    "ellipsis_density",
+    "format_problems",
+)
+
+_CALIBRATION_BINS = ((0.0, 4.0), (4.0, 6.0), (6.0, 8.0), (8.0, 10.01))
+
+
+def extract_features(script_content: str, characters: Optional[List[str]] = None) -> Dict[str, float]:
+    compact = _WHITESPACE_PATTERN.sub("", script_content)
+    length = len(compact)
+    lines = [line for line in script_content.splitlines() if line.strip()]
+    names = [name for name in (characters or []) if name]
+    speakers = {m.group(1) for m in (_SPEAKER_PATTERN.match(line) for line in lines) if m}
+    per_char = max(1, length)
+    return {
+        "log_length": math.log1p(length),
+        "log_lines": math.log1p(len(lines)),
+        "avg_line_length": length / max(1, len(lines)),
+        "dialogue_ratio": dialogue_ratio(script_content),
+        "character_coverage": sum(1 for name in names if name in script_content) / len(names) if names else 1.0,
+        "repetition_ratio": repetition_ratio(script_content),
+        "distinct_char_ratio": len(set(compact)) / per_char,
+        "speaker_count": float(len(speakers)),
+        "stage_direction_ratio": sum(1 for line in lines if _STAGE_DIRECTION_PATTERN.match(line)) / max(1, len(lines)),
+        "exclamation_density": (compact.count("！") + compact.count("!")) * 100 / per_char,
+        "question_density": (compact.count("？") + compact.count("?")) * 100 / per_char,
+        "ellipsis_density": (compact.count("…") + compact.count("——")) * 100 / per_char,
+        "format_problems": float(len(format_problems(script_content))),
+    }
+
+
+def _solve(matrix: List[List[float]], vector: List[float]) -> List[float]:
+    """高斯消元求解线性方程组（矩阵为正定的 XᵀX + αI，维度即特征数）"""
+    size = len(vector)
+    augmented = [row[:] + [vector[i]] for i, row in enumerate(matrix)]
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(augmented[r][col]))
+        augmented[col], augmented[pivot] = augmented[pivot], augmented[col]
+        if abs(augmented[col][col]) < 1e-12:
+            continue
+        for row in range(col + 1, size):
+            factor = augmented[row][col] / augmented[col][col]
+            for k in range(col, size + 1):
+                augmented[row][k] -= factor * augmented[col][k]
+    solution = [0.0] * size
+    for row in range(size - 1, -1, -1):
+        if abs(augmented[row][row]) < 1e-12:
+            continue
+        total = augmented[row][size] - sum(augmented[row][k] * solution[k] for k in range(row + 1, size))
+        solution[row] = total / augmented[row][row]
+    return solution
+
+
+class RidgeRegression:
+    """特征标准化后的岭回归，截距不参与正则化"""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.means: List[float] = []
+        self.stds: List[float] = []
+        self.coefficients: List[float] = []
+        self.intercept = 0.0
+
+    def fit(self, rows: Sequence[Sequence[float]], targets: Sequence[float]) -> "RidgeRegression":
+        n, d = len(rows), len(rows[0])
+        self.means = [sum(row[j] for row in rows) / n for j in range(d)]
+        self.stds = [
+            math.sqrt(sum((row[j] - self.means[j]) ** 2 for row in rows) / n) or 1.0
+            for j in range(d)
+        ]
+        standardized = [self._standardize(row) for row in rows]
+        self.intercept = sum(targets) / n
+        centered = [y - self.intercept for y in targets]
+
+        gram = [[sum(x[i] * x[j] for x in standardized) for j in range(d)] for i in range(d)]
+        for i in range(d):
+            gram[i][i] += self.alpha
+        moment = [sum(x[i] * y for x, y in zip(standardized, centered)) for i in range(d)]
+        self.coefficients = _solve(gram, moment)
+        return self
+
+    def _standardize(self, row: Sequence[float]) -> List[float]:
+        return [(value - mean) / std for value, mean, std in zip(row, self.means, self.stds)]
+
+    def predict(self, row: Sequence[float]) -> float:
+        x = self._standardize(row)
+        return self.intercept + sum(c * v for c, v in zip(self.coefficients, x))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "alpha": self.alpha,
+            "means": self.means,
+            "stds": self.stds,
+            "coefficients": self.coefficients,
+            "intercept": self.intercept,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RidgeRegression":
+        model = cls(data["alpha"])
+        model.means = data["means"]
+        model.stds = data["stds"]
+        model.coefficients = data["coefficients"]
+        model.intercept = data["intercept"]
+        return model
+
+
+def _pearson(xs: Sequence[float], ys: Sequence[float]) -> Optional[float]:
+    if len(xs) < 2:
+        return None
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    var_y = sum((y - mean_y) ** 2 for y in ys)
+    if var_x == 0 or var_y == 0:
+        return None
+    return round(cov / math.sqrt(var_x * var_y), 3)
+
+
+def _pairwise_agreement(predicted: Sequence[float], actual: Sequence[float]) -> Optional[float]:
+    """预测分与 LLM 分排序一致的样本对比例（忽略 LLM 分相同的对）"""
+    concordant = total = 0
+    for i in range(len(actual)):
+        for j in range(i + 1, len(actual)):
+            if actual[i] == actual[j]:
+                continue
+            total += 1
+            concordant += (predicted[i] - predicted[j]) * (actual[i] - actual[j]) > 0
+    return round(concordant / total, 3) if total else None
+
+
+def _dimension_report(predicted: List[float], actual: List[float]) -> Dict[str, Any]:
+    errors = [p - a for p, a in zip(predicted, actual)]
+    calibration = []
+    for low, high in _CALIBRATION_BINS:
+        members = [(p, a) for p, a in zip(predicted, actual) if low <= p < high]
+        calibration.append({
+            "predicted_range": f"{low:g}-{min(high, 10):g}",
+            "count": len(members),
+            "mean_predicted": round(sum(p for p, _ in members) / len(members), 2) if members else None,
+            "mean_actual": round(sum(a for _, a in members) / len(members), 2) if members else None,
+        })
+    return {
+        "mae": round(sum(abs(e) for e in errors) / len(errors), 3),
+        "rmse": round(math.sqrt(sum(e * e for e in errors) / len(errors)), 3),
+        "bias": round(sum(errors) / len(errors), 3),
+        "pearson": _pearson(predicted, actual),
+        "pairwise_agreement": _pairwise_agreement(predicted, actual),
+        "calibration": calibration,
+    }
+
+
+class ProxyQualityModel:
+    """每个评估维度一个岭回归模型，附带训练时在留出集上计算的校准 / 一致性报告"""
+
+    def __init__(self, dimensions: Dict[str, RidgeRegression], report: Dict[str, Any], source: Dict[str, Any]):
+        self.dimensions = dimensions
+        self.report = report
+        self.source = source
+
+    @classmethod
+    def train(
+        cls,
+        samples: List[Tuple[Dict[str, float], Dict[str, float]]],
+        dimensions: Sequence[str],
+        weights: Dict[str, float],
+        alpha: float = 1.0,
+        holdout_ratio: float = 0.2,
+        source: Optional[Dict[str, Any]] = None,
+    ) -> "ProxyQualityModel":
+        """
+        Args:
+            samples: (特征, {维度: LLM 分数}) 列表
+            weights: 计算综合评分一致性时使用的维度权重
+
+        按特征的 hash 稳定划分留出集，先在训练集上拟合并在留出集上生成报告，再用全部样本拟合最终模型。
+        """
+        rows = [[features.get(name, 0.0) for name in FEATURE_NAMES] for features, _ in samples]
+        bucket = max(2, round(1 / holdout_ratio)) if holdout_ratio > 0 else 0
+        holdout = [
+            bucket > 0 and int(hashlib.sha1(json.dumps(row).encode("utf-8")).hexdigest(), 16) % bucket == 0
+            for row in rows
+        ]
+        train_idx = [i for i, is_holdout in enumerate(holdout) if not is_holdout]
+        test_idx = [i for i, is_holdout in enumerate(holdout) if is_holdout]
+
+        report: Dict[str, Any] = {
+            "samples": len(samples),
+            "train_samples": len(train_idx),
+            "holdout_samples": len(test_idx),
+            "dimensions": {},
+        }
+        overall_predicted = [0.0] * len(test_idx)
+        overall_actual = [0.0] * len(test_idx)
+        total_weight = sum(weights.get(d, 0.0) for d in dimensions) or 1.0
+
+        models: Dict[str, RidgeRegression] = {}
+        for dimension in dimensions:
+            targets = [scores[dimension] for _, scores in samples]
+            if test_idx and len(train_idx) > len(FEATURE_NAMES):
+                model = RidgeRegression(alpha).fit([rows[i] for i in train_idx], [targets[i] for i in train_idx])
+                predicted = [min(10.0, max(0.0, model.predict(rows[i]))) for i in test_idx]
+                actual = [targets[i] for i in test_idx]
+                report["dimensions"][dimension] = _dimension_report(predicted, actual)
+                weight = weights.get(dimension, 0.0) / total_weight
+                for k in range(len(test_idx)):
+                    overall_predicted[k] += predicted[k] * weight
+                    overall_actual[k] += actual[k] * weight
+            models[dimension] = RidgeRegression(alpha).fit(rows, targets)
+
+        if report["dimensions"]:
+            report["overall"] = _dimension_report(overall_predicted, overall_actual)
+        return cls(models, report, dict(source or {}, trained_at=time.time()))
+
+    def predict(self, features: Dict[str, float]) -> Dict[str, float]:
+        row = [features.get(name, 0.0) for name in FEATURE_NAMES]
+        return {
+            dimension: round(min(10.0, max(0.0, model.predict(row))), 2)
+            for dimension, model in self.dimensions.items()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "features": list(FEATURE_NAMES),
+            "dimensions": {name: model.to_dict() for name, model in self.dimensions.items()},
+            "report": self.report,
+            "source": self.source,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ProxyQualityModel":
+        if data.get("features") != list(FEATURE_NAMES):
+            raise ValueError("Proxy model was trained with a different feature set")
+        return cls(
+            {name: RidgeRegression.from_dict(model) for name, model in data["dimensions"].items()},
+            data.get("report", {}),
+            data.get("source", {}),
+        )
+
+
+class ProxyScorer:
+    """加载 / 保存代理模型，并统计预测次数与耗时"""
+
+    def __init__(self, path: str, alpha: float = 1.0, min_samples: int = 50):
+        self.path = Path(path)
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._model: Optional[ProxyQualityModel] = None
+        self._predictions = 0
+        self._total_ms = 0.0
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            self._model = ProxyQualityModel.from_dict(json.loads(self.path.read_text(encoding="utf-8")))
+            logger.info(f"Loaded proxy quality model from {self.path}")
+        except Exception as e:
+            logger.warning(f"Failed to load proxy quality model from {self.path}: {e}")
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    def train(
+        self,
+        samples: List[Tuple[Dict[str, float], Dict[str, float]]],
+        dimensions: Sequence[str],
+        weights: Dict[str, float],
+        source: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        if len(samples) < self.min_samples:
+            raise ValueError(f"Need at least {self.min_samples} fully evaluated scripts to train, got {len(samples)}")
+        model = ProxyQualityModel.train(samples, dimensions, weights, alpha=self.alpha, source=source)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(model.to_dict(), ensure_ascii=False), encoding="utf-8")
+        with self._lock:
+            self._model = model
+        logger.info(f"Trained proxy quality model on {len(samples)} scripts, saved to {self.path}")
+        return model.report
+
+    def predict(self, script_content: str, characters: Optional[List[str]] = None) -> Dict[str, float]:
+        if self._model is None:
+            raise RuntimeError("Proxy quality model is not trained")
+        started = time.perf_counter()
+        scores = self._model.predict(extract_features(script_content, characters))
+        with self._lock:
+            self._predictions += 1
+            self._total_ms += (time.perf_counter() - started) * 1000
+        return scores
+
+    def get_report(self) -> Dict[str, Any]:
+        with self._lock:
+            model = self._model
+            return {
+                "ready": model is not None,
+                "path": str(self.path),
+                "source": model.source if model else None,
+                "report": model.report if model else None,
+                "predictions": self._predictions,
+                "avg_predict_ms": round(self._total_ms / self._predictions, 3) if self._predictions else 0.0,
+            }
+
+
+def _create_proxy_scorer() -> ProxyScorer:
+    settings = get_settings()
+    return ProxyScorer(
+        settings.PROXY_MODEL_PATH,
+        alpha=settings.PROXY_RIDGE_ALPHA,
+        min_samples=settings.PROXY_MIN_TRAINING_SAMPLES,
+    )
+
+
+proxy_scorer = _create_proxy_scorer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the proxy quality model from stored LLM evaluations")
+    parser.add_argument("--mode", choices=["fast", "thorough"], default="thorough", help="使用哪种评估模式下存储的分数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from app.services.quality_evaluator import quality_evaluator
+    report = quality_evaluator.train_proxy(args.mode)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
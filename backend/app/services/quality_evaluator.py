@@ -1,33 +1,84 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Awaitable, AsyncIterator, Tuple
 import logging
 import json
 import re
 import asyncio
-from app.services.deepseek_client import RequestsDeepSeekLLM
+import hashlib
 from app.config import get_settings
+from app.schemas.quality_evaluation import AllDimensionScores, DimensionScore
+from app.services.embedding_store import text_hash
+from app.services.evaluation_store import EvaluationStore
+from app.services.model_router import RoutedLLM
+from app.services.near_duplicates import near_duplicate_filter
+from app.services.proxy_scorer import extract_features, proxy_scorer
+from app.services.script_heuristics import heuristic_scorer
+from app.services.structured_output import StructuredOutputError, acomplete_structured, parse_structured
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+_DIMENSION_CRITERIA = {
+    "conflict_intensity": ("冲突强度", [
+        "冲突的明确性和清晰度",
+        "冲突的激烈程度",
+        "冲突对剧情的推动作用",
+        "冲突的合理性和可信度",
+    ]),
+    "emotion_rendering": ("情绪渲染效果", [
+        "情绪表达的准确性和恰当性",
+        "情绪感染力和代入感",
+        "情绪变化的层次和深度",
+        "情绪与剧情的契合度",
+    ]),
+    "character_consistency": ("人物一致性", [
+        "人物性格和行为的一致性",
+        "人物对话风格的一致性",
+        "人物动机和目标的合理性",
+        "人物关系的合理性",
+    ]),
+    "dialogue_naturalness": ("对话自然度", [
+        "对话的真实性和生活感",
+        "对话的流畅性和节奏",
+        "对话符合人物身份和性格",
+        "对话的信息传递效率",
+    ]),
+    "dramatic_tension": ("剧情张力", [
+        "剧情的吸引力和悬念设置",
+        "节奏把控和张力营造",
+        "高潮的冲击力",
+        "观众的期待感",
+    ]),
+    "overall_coherence": ("整体连贯性", [
+        "剧情逻辑的合理性",
+        "场景衔接的流畅性",
+        "因果关系的清晰度",
+        "结构的完整性",
+    ]),
+}
+
+# 修改评分 Prompt 模板时递增；维度标准变化时版本号自动改变，已存储的分数随之失效
+_PROMPT_REVISION = 1
+_PROMPT_VERSION = f"{_PROMPT_REVISION}-" + hashlib.sha1(
+    json.dumps(_DIMENSION_CRITERIA, ensure_ascii=False, sort_keys=True).encode("utf-8")
+).hexdigest()[:12]
+
 
 class QualityEvaluator:
     def __init__(self):
+        from app.services.ollama_client import get_ollama_manager
+        ollama_manager = get_ollama_manager()
+        if not ollama_manager._initialized:
+            ollama_manager.initialize()
+        self.llm = ollama_manager.get_model_for_task("quality_scoring")
+        self.fast_llm = ollama_manager.get_model_for_task("quality_scoring_fast")
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.store: Optional[EvaluationStore] = None
         settings = get_settings()
-        if settings.ENABLE_DEEPSEEK and settings.DEEPSEEK_API_KEY:
-            self.llm = RequestsDeepSeekLLM(
-                model_name=settings.DEEPSEEK_MODEL,
-                api_key=settings.DEEPSEEK_API_KEY,
-                base_url=settings.DEEPSEEK_BASE_URL,
-                temperature=0.3,
-                top_p=0.9,
-                max_tokens=4096
-            )
-        else:
-            from app.services.ollama_client import get_ollama_manager
-            ollama_manager = get_ollama_manager()
-            if not ollama_manager._initialized:
-                ollama_manager.initialize()
-            self.llm = ollama_manager.llm
+        if settings.ENABLE_EVALUATION_STORE:
+            try:
+                self.store = EvaluationStore(settings.EVALUATION_STORE_PATH)
+            except Exception as e:
+                logger.warning(f"Evaluation store unavailable, dimension scores will not be persisted: {e}")
 
     async def evaluate_script(
         self,
@@ -35,31 +86,95 @@ class QualityEvaluator:
         plot_context: Optional[str] = None,
         characters: Optional[List[str]] = None,
         custom_weights: Optional[Dict[str, float]] = None,
-        reference_script: Optional[str] = None
+        reference_script: Optional[str] = None,
+        evaluation_mode: str = "thorough",
+        enable_prescreen: Optional[bool] = None,
+        target_length: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        评估剧本质量
+
+        各维度分数按 (评估内容 hash, 评审模型, Prompt 版本) 持久化，同一剧本换 custom_weights 重新评估时
+        直接复用已存储的分数，只重新计算加权总分。
+        evaluation_mode 为 fast 时一次调用返回全部六个维度，适合批量评估；
+        thorough 时每个维度单独评分，结果更细致但调用次数是 fast 的 6 倍；
+        proxy 时只用本地代理模型预测各维度分数，不调用 LLM（需先训练代理模型）。
+        enable_prescreen 为 True 时先做本地启发式预筛，明显不合格的剧本不调用 LLM 评审；
+        未指定时取 ENABLE_EVALUATION_PRESCREEN（默认关闭）。target_length 为目标字数范围，不提供时预筛不检查长度。
+        """
+        prescreen = self._prescreen(script_content, characters, enable_prescreen, target_length)
+        return await self._evaluate_screened(
+            script_content, plot_context, characters, custom_weights, reference_script, evaluation_mode, prescreen
+        )
+
+    async def _evaluate_screened(
+        self,
+        script_content: str,
+        plot_context: Optional[str],
+        characters: Optional[List[str]],
+        custom_weights: Optional[Dict[str, float]],
+        reference_script: Optional[str],
+        evaluation_mode: str,
+        prescreen: Optional[Dict[str, Any]]
     ) -> Dict[str, Any]:
         try:
-            logger.info(f"开始评估剧本质量...")
-
             weights = self._get_evaluation_weights(custom_weights)
+            if prescreen and prescreen["rejected"]:
+                logger.info(f"剧本未通过启发式预筛，跳过 LLM 评审: {prescreen['reasons']}")
+                return self._rejected_result(prescreen, weights, evaluation_mode)
+            if evaluation_mode == "proxy":
+                return self._proxy_result(script_content, characters, weights, prescreen)
+
+            logger.info(f"开始评估剧本质量（{evaluation_mode} 模式）...")
+
+            prefix = self._build_shared_prefix(script_content, plot_context, characters)
+            evaluation_key = text_hash(prefix)
+            stored = self._load_scores([evaluation_key], evaluation_mode).get(evaluation_key, {})
+            if evaluation_mode == "fast":
+                complete = len(stored) == len(_DIMENSION_CRITERIA)
+                calls = {} if complete else {"all_dimensions": self._evaluate_all_dimensions(prefix)}
+            else:
+                calls = {
+                    dimension: self._evaluate_dimension(prefix, dimension)
+                    for dimension in _DIMENSION_CRITERIA
+                    if dimension not in stored
+                }
+            if reference_script:
+                calls["comparison_with_reference"] = self._compare_with_reference(prefix, reference_script)
+
+            scores = await asyncio.gather(*(self._run_bounded(name, call) for name, call in calls.items()))
+            evaluation_results: Dict[str, Any] = dict(zip(calls, scores))
+            if "all_dimensions" in evaluation_results:
+                all_scores = evaluation_results.pop("all_dimensions")
+                for dimension in _DIMENSION_CRITERIA:
+                    evaluation_results[dimension] = dict(all_scores) if all_scores.get("failed") else all_scores[dimension]
+            self._save_scores(
+                evaluation_key,
+                evaluation_mode,
+                {d: evaluation_results[d] for d in _DIMENSION_CRITERIA if d in evaluation_results},
+                extract_features(script_content, characters)
+            )
+            cached_dimensions = [d for d in _DIMENSION_CRITERIA if d not in evaluation_results]
+            for dimension in cached_dimensions:
+                evaluation_results[dimension] = stored[dimension]
+            if cached_dimensions:
+                logger.info(f"复用已存储的维度分数: {cached_dimensions}")
 
-            evaluation_results = {
-                "conflict_intensity": await self._evaluate_conflict_intensity(script_content, plot_context),
-                "emotion_rendering": await self._evaluate_emotion_rendering(script_content, plot_context),
-                "character_consistency": await self._evaluate_character_consistency(script_content, characters),
-                "dialogue_naturalness": await self._evaluate_dialogue_naturalness(script_content),
-                "dramatic_tension": await self._evaluate_dramatic_tension(script_content, plot_context),
-                "overall_coherence": await self._evaluate_overall_coherence(script_content, plot_context)
-            }
+            failed_dimensions = [name for name in _DIMENSION_CRITERIA if evaluation_results[name].get("failed")]
+            if len(failed_dimensions) == len(_DIMENSION_CRITERIA):
+                raise RuntimeError(f"All dimensions failed: {evaluation_results['conflict_intensity'].get('error')}")
 
             overall_score = self._calculate_overall_score(evaluation_results, weights)
 
             evaluation_results["overall_score"] = overall_score
             evaluation_results["weights_used"] = weights
             evaluation_results["quality_level"] = self._determine_quality_level(overall_score)
-
-            if reference_script:
-                comparison_score = await self._compare_with_reference(script_content, reference_script)
-                evaluation_results["comparison_with_reference"] = comparison_score
+            evaluation_results["partial"] = bool(failed_dimensions)
+            evaluation_results["failed_dimensions"] = failed_dimensions
+            evaluation_results["evaluation_mode"] = evaluation_mode
+            evaluation_results["prescreen"] = prescreen
+            evaluation_results["evaluation_key"] = evaluation_key
+            evaluation_results["cached_dimensions"] = cached_dimensions
 
             logger.info(f"剧本质量评估完成，总分: {overall_score:.2f}, 质量等级: {evaluation_results['quality_level']}")
 
@@ -72,178 +187,509 @@ class QualityEvaluator:
     async def evaluate_batch(
         self,
         scripts: List[Dict[str, Any]],
-        custom_weights: Optional[Dict[str, float]] = None
+        custom_weights: Optional[Dict[str, float]] = None,
+        evaluation_mode: str = "thorough",
+        proxy_top_k: Optional[int] = None,
+        enable_prescreen: Optional[bool] = None
     ) -> Dict[str, Any]:
+        """
+        批量评估剧本，汇总 evaluate_batch_stream 的全部事件
+
+        单个剧本评估失败不影响其他剧本，失败的剧本列入 failed（script_id、detail），不参与排名。
+        """
         try:
             logger.info(f"开始批量评估 {len(scripts)} 个剧本...")
 
-            results = []
-            for i, script_data in enumerate(scripts):
-                logger.info(f"评估剧本 {i+1}/{len(scripts)}...")
-                result = await self.evaluate_script(
-                    script_content=script_data.get("content", ""),
-                    plot_context=script_data.get("plot_context"),
-                    characters=script_data.get("characters"),
-                    custom_weights=custom_weights
-                )
-                results.append({
-                    "script_id": script_data.get("id", f"script_{i+1}"),
-                    "evaluation": result
-                })
-
-            sorted_results = sorted(
-                results,
-                key=lambda x: x["evaluation"]["overall_score"],
-                reverse=True
-            )
-
-            logger.info(f"批量评估完成，最佳剧本: {sorted_results[0]['script_id']}，分数: {sorted_results[0]['evaluation']['overall_score']:.2f}")
+            evaluations: Dict[int, Dict[str, Any]] = {}
+            failed: List[Dict[str, Any]] = []
+            ranking: Dict[str, Any] = {}
+            async for event, data in self.evaluate_batch_stream(
+                scripts, custom_weights, evaluation_mode, proxy_top_k, enable_prescreen
+            ):
+                if event == "result":
+                    evaluations[data["index"]] = data
+                elif event == "failed":
+                    failed.append({"script_id": data["script_id"], "detail": data["detail"]})
+                elif event == "ranking":
+                    ranking = data
+
+            results = [
+                {"script_id": evaluations[i]["script_id"], "evaluation": evaluations[i]["evaluation"]}
+                for i in sorted(evaluations)
+            ]
+            by_id = {r["script_id"]: r for r in results}
 
             return {
                 "total_count": len(scripts),
                 "results": results,
-                "ranked_scripts": [r["script_id"] for r in sorted_results],
-                "best_script": sorted_results[0] if sorted_results else None
+                "ranked_scripts": ranking["ranked_scripts"],
+                "best_script": by_id.get(ranking["ranked_scripts"][0]) if ranking["ranked_scripts"] else None,
+                "failed": failed
             }
 
         except Exception as e:
             logger.error(f"批量评估失败: {str(e)}")
             raise ValueError(f"Failed to evaluate batch: {str(e)}") from e
 
-    async def _evaluate_conflict_intensity(
+    async def evaluate_batch_stream(
         self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> Dict[str, Any]:
-        prompt = self._build_conflict_intensity_prompt(script_content, plot_context)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "conflict_intensity")
+        scripts: List[Dict[str, Any]],
+        custom_weights: Optional[Dict[str, float]] = None,
+        evaluation_mode: str = "thorough",
+        proxy_top_k: Optional[int] = None,
+        enable_prescreen: Optional[bool] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        并发评估多个剧本，按完成顺序逐个产出结果
+
+        同时评估的剧本数受 EVALUATION_BATCH_CONCURRENCY 限制，LLM 调用总数仍受全局的
+        EVALUATION_MAX_CONCURRENCY 限制。只保留每个剧本的分数用于最终排名。
+
+        启用预筛（enable_prescreen，未指定时取 ENABLE_EVALUATION_PRESCREEN）时所有剧本先经过启发式预筛，
+        长度按各剧本的 target_length 检查：未通过的剧本立即以预筛结果产出，不调用 LLM；
+        通过的剧本按启发式分数从高到低进入 LLM 评审，最有希望的候选最先得到结果。
+        指定 proxy_top_k 且代理模型已训练时，先用代理模型为通过预筛的剧本打分，只有前 proxy_top_k 名调用 LLM 评审，
+        其余剧本以代理模型分数产出；排名时经过 LLM 评审的剧本排在仅有本地分数的剧本之前。
+        启用 ENABLE_NEAR_DUPLICATE_FILTER 时，背景与人物相同且 MinHash 估计相似度超过 NEAR_DUPLICATE_THRESHOLD 的剧本
+        只评估其中一个，其余直接复用其评估结果（带 duplicate_of 标记）。
+
+        事件：result（单个剧本的评估结果）、failed（单个剧本评估失败）、ranking（全部完成后的排名）
+        """
+        semaphore = asyncio.Semaphore(max(1, get_settings().EVALUATION_BATCH_CONCURRENCY))
+        weights = self._get_evaluation_weights(custom_weights)
+
+        async def _evaluate(
+            index: int,
+            script_data: Dict[str, Any],
+            prescreen: Optional[Dict[str, Any]]
+        ) -> Tuple[int, Optional[Dict[str, Any]], Optional[str]]:
+            async with semaphore:
+                try:
+                    result = await self._evaluate_screened(
+                        script_data.get("content", ""),
+                        script_data.get("plot_context"),
+                        script_data.get("characters"),
+                        custom_weights,
+                        None,
+                        evaluation_mode,
+                        prescreen
+                    )
+                    return index, result, None
+                except Exception as e:
+                    return index, None, str(e)
+
+        script_ids = [script_data.get("id") or f"script_{i+1}" for i, script_data in enumerate(scripts)]
+        prescreens = [
+            self._prescreen(s.get("content", ""), s.get("characters"), enable_prescreen, s.get("target_length"))
+            for s in scripts
+        ]
+        scores: Dict[str, float] = {}
+
+        for index, prescreen in enumerate(prescreens):
+            if prescreen and prescreen["rejected"]:
+                result = self._rejected_result(prescreen, weights, evaluation_mode)
+                scores[script_ids[index]] = result["overall_score"]
+                yield "result", {"index": index, "script_id": script_ids[index], "evaluation": result}
+
+        pending = [i for i, prescreen in enumerate(prescreens) if not (prescreen and prescreen["rejected"])]
+        pending.sort(key=lambda i: prescreens[i]["heuristic_score"] if prescreens[i] else 0.0, reverse=True)
+        if len(pending) < len(scripts):
+            logger.info(f"启发式预筛淘汰 {len(scripts) - len(pending)}/{len(scripts)} 个剧本")
+
+        duplicates = self._group_near_duplicates(scripts, pending)
+        if duplicates:
+            collapsed = {member for members in duplicates.values() for member, _ in members}
+            pending = [i for i in pending if i not in collapsed]
+            logger.info(f"{len(collapsed)} 个剧本与其他剧本近似重复，复用代表剧本的评估结果")
+
+        def _results(index: int, result: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+            """代表剧本及其近似重复项的 result 事件，重复项复用代表的评估结果"""
+            events = []
+            for member, similarity in [(index, None)] + duplicates.get(index, []):
+                evaluation = result if similarity is None else {
+                    **result, "duplicate_of": script_ids[index], "duplicate_similarity": round(similarity, 3)
+                }
+                scores[script_ids[member]] = evaluation["overall_score"]
+                events.append(("result", {"index": member, "script_id": script_ids[member], "evaluation": evaluation}))
+            return events
+
+        if proxy_top_k and evaluation_mode != "proxy" and len(pending) > proxy_top_k:
+            if proxy_scorer.ready:
+                proxy_results = {
+                    i: self._proxy_result(scripts[i].get("content", ""), scripts[i].get("characters"), weights, prescreens[i])
+                    for i in pending
+                }
+                pending.sort(key=lambda i: proxy_results[i]["overall_score"], reverse=True)
+                for index in pending[proxy_top_k:]:
+                    for event in _results(index, proxy_results[index]):
+                        yield event
+                logger.info(f"代理模型筛选出前 {proxy_top_k}/{len(pending)} 个剧本进行 LLM 评审")
+                pending = pending[:proxy_top_k]
+            else:
+                logger.warning("代理评分模型尚未训练，忽略 proxy_top_k，全部剧本进行 LLM 评审")
+
+        tasks = [asyncio.create_task(_evaluate(i, scripts[i], prescreens[i])) for i in pending]
+        judged = set()
+        try:
+            for completed in asyncio.as_completed(tasks):
+                index, result, error = await completed
+                script_id = script_ids[index]
+                if error is not None:
+                    logger.warning(f"剧本 {script_id} 评估失败: {error}")
+                    for member, _ in [(index, None)] + duplicates.get(index, []):
+                        yield "failed", {"index": member, "script_id": script_ids[member], "detail": error}
+                    continue
+
+                llm_judged = result["evaluation_mode"] != "proxy" and not (result.get("prescreen") or {}).get("rejected")
+                logger.info(f"剧本 {script_id} 评估完成 ({len(scores) + 1}/{len(scripts)})，分数: {result['overall_score']:.2f}")
+                for event, data in _results(index, result):
+                    if llm_judged:
+                        judged.add(data["script_id"])
+                    yield event, data
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        ranked = sorted(scores, key=lambda script_id: (script_id in judged, scores[script_id]), reverse=True)
+        if ranked:
+            logger.info(f"批量评估完成，最佳剧本: {ranked[0]}，分数: {scores[ranked[0]]:.2f}")
+        yield "ranking", {
+            "total_count": len(scripts),
+            "evaluated_count": len(scores),
+            "ranked_scripts": ranked,
+            "scores": {script_id: scores[script_id] for script_id in ranked},
+            "best_script": ranked[0] if ranked else None,
+            "prescreen_rejected": [script_ids[i] for i, p in enumerate(prescreens) if p and p["rejected"]],
+            "near_duplicates": {
+                script_ids[member]: script_ids[index]
+                for index, members in duplicates.items()
+                for member, _ in members
+            },
+        }
 
-    async def _evaluate_emotion_rendering(
+    def _group_near_duplicates(
         self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> Dict[str, Any]:
-        prompt = self._build_emotion_rendering_prompt(script_content, plot_context)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "emotion_rendering")
-
-    async def _evaluate_character_consistency(
+        scripts: List[Dict[str, Any]],
+        indices: List[int]
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """
+        在背景与人物相同的剧本之间查找近似重复项
+
+        indices 的顺序决定代表：靠前的剧本成为代表。
+        Returns:
+            {代表下标: [(重复项下标, 估计相似度)]}
+        """
+        if not get_settings().ENABLE_NEAR_DUPLICATE_FILTER or len(indices) < 2:
+            return {}
+
+        buckets: Dict[Tuple[Any, ...], List[int]] = {}
+        for i in indices:
+            key = (scripts[i].get("plot_context"), tuple(scripts[i].get("characters") or ()))
+            buckets.setdefault(key, []).append(i)
+
+        duplicates: Dict[int, List[Tuple[int, float]]] = {}
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            groups = near_duplicate_filter.group([scripts[i].get("content", "") for i in members])
+            for position, (representative, similarity) in groups.items():
+                duplicates.setdefault(members[representative], []).append((members[position], similarity))
+        return duplicates
+
+    def rerank(
         self,
-        script_content: str,
-        characters: Optional[List[str]] = None
+        items: List[Dict[str, Any]],
+        custom_weights: Optional[Dict[str, float]] = None,
+        evaluation_mode: str = "thorough"
     ) -> Dict[str, Any]:
-        prompt = self._build_character_consistency_prompt(script_content, characters)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "character_consistency")
+        """
+        用新的权重对已评估过的剧本重新排名，只读取已存储的维度分数，不调用 LLM
+
+        items 中每项包含 evaluation_key（评估结果返回的键）和可选的 id；
+        存储中维度不全的剧本列入 missing，需要重新评估。
+        """
+        if self.store is None:
+            raise RuntimeError("Evaluation store is disabled")
+
+        weights = self._get_evaluation_weights(custom_weights)
+        stored = self._load_scores([item["evaluation_key"] for item in items], evaluation_mode)
+        ranked: List[Dict[str, Any]] = []
+        missing: List[str] = []
+        for item in items:
+            script_id = item.get("id") or item["evaluation_key"]
+            dimensions = stored.get(item["evaluation_key"], {})
+            if len(dimensions) < len(_DIMENSION_CRITERIA):
+                missing.append(script_id)
+                continue
+            overall_score = self._calculate_overall_score(dimensions, weights)
+            ranked.append({
+                "script_id": script_id,
+                "evaluation_key": item["evaluation_key"],
+                "overall_score": overall_score,
+                "quality_level": self._determine_quality_level(overall_score),
+                "dimension_scores": {d: dimensions[d]["score"] for d in _DIMENSION_CRITERIA},
+            })
+
+        ranked.sort(key=lambda r: r["overall_score"], reverse=True)
+        return {
+            "ranked_scripts": ranked,
+            "missing": missing,
+            "weights_used": weights,
+            "best_script": ranked[0] if ranked else None,
+        }
 
-    async def _evaluate_dialogue_naturalness(
-        self,
-        script_content: str
-    ) -> Dict[str, Any]:
-        prompt = self._build_dialogue_naturalness_prompt(script_content)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "dialogue_naturalness")
+    def train_proxy(self, evaluation_mode: str = "thorough") -> Dict[str, Any]:
+        """
+        用已存储的 LLM 评审结果训练代理评分模型
+
+        只使用当前 Prompt 版本下各维度齐全的剧本；任务允许多个评审模型时，使用样本最多的那个模型的结果，
+        不混合不同模型的评分。返回留出集上的校准 / 一致性报告。
+        """
+        if self.store is None:
+            raise RuntimeError("Evaluation store is disabled")
+        dimensions = list(_DIMENSION_CRITERIA)
+        model, samples = max(
+            (
+                (model, self.store.training_samples(model, _PROMPT_VERSION, evaluation_mode, dimensions))
+                for model in self._judge_models(evaluation_mode)
+            ),
+            key=lambda candidate: len(candidate[1])
+        )
+        return proxy_scorer.train(
+            samples,
+            dimensions,
+            self._get_evaluation_weights(),
+            source={"model": model, "prompt_version": _PROMPT_VERSION, "evaluation_mode": evaluation_mode}
+        )
+
+    def _judge_models(self, evaluation_mode: str) -> List[str]:
+        """可能处理该模式评审调用的模型名，路由到多个后端时按 TASK_MODEL_MAPPING 顺序返回全部候选"""
+        llm = self.fast_llm if evaluation_mode == "fast" else self.llm
+        if isinstance(llm, RoutedLLM):
+            return list(dict.fromkeys(llm.candidate_models()))
+        return [getattr(llm, "model_name", type(llm).__name__)]
+
+    def _served_model(self, llm: Any, response: Any) -> str:
+        """实际处理本次调用的模型（由 RoutedLLM 记录），没有记录时就是客户端自身的模型"""
+        extra = getattr(response, "additional_kwargs", None) or {}
+        return extra.get("model") or getattr(llm, "model_name", type(llm).__name__)
+
+    def _load_scores(self, evaluation_keys: List[str], evaluation_mode: str) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """按候选评审模型的顺序读取已存储的维度分数，靠前模型的分数优先"""
+        if self.store is None:
+            return {}
+        merged: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        try:
+            for model in self._judge_models(evaluation_mode):
+                found = self.store.get_many(evaluation_keys, model, _PROMPT_VERSION, evaluation_mode)
+                for key, dimensions in found.items():
+                    for dimension, result in dimensions.items():
+                        merged.setdefault(key, {}).setdefault(dimension, result)
+        except Exception as e:
+            logger.warning(f"读取已存储的维度分数失败: {e}")
+        return merged
 
-    async def _evaluate_dramatic_tension(
+    def _save_scores(
         self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> Dict[str, Any]:
-        prompt = self._build_dramatic_tension_prompt(script_content, plot_context)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "dramatic_tension")
+        evaluation_key: str,
+        evaluation_mode: str,
+        results: Dict[str, Dict[str, Any]],
+        features: Optional[Dict[str, float]] = None
+    ):
+        """按实际给出分数的评审模型（judge_model）分别存储"""
+        if self.store is None or not results:
+            return
+        by_model: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        for dimension, result in results.items():
+            if not result.get("failed"):
+                model = result.get("judge_model") or self._judge_models(evaluation_mode)[0]
+                by_model.setdefault(model, {})[dimension] = result
+        try:
+            for model, model_results in by_model.items():
+                self.store.put(evaluation_key, model, _PROMPT_VERSION, evaluation_mode, model_results, features)
+        except Exception as e:
+            logger.warning(f"保存维度分数失败: {e}")
+
+    async def _run_bounded(self, name: str, call: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        在并发上限内执行单个维度的评分
 
-    async def _evaluate_overall_coherence(
+        失败或超时的维度降级为带 failed 标记的默认分，不计入综合评分，也不会让整个评估失败。
+        超时（或调用方被取消）后后台线程里的 HTTP 请求仍在进行，并发名额要等它真正返回后才释放，
+        这样 EVALUATION_MAX_CONCURRENCY 始终限制实际进行中的 LLM 调用数。
+        """
+        settings = get_settings()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, settings.EVALUATION_MAX_CONCURRENCY))
+        semaphore = self._semaphore
+        await semaphore.acquire()
+        task = asyncio.ensure_future(call)
+
+        def _release(finished: asyncio.Future):
+            semaphore.release()
+            if not finished.cancelled():
+                finished.exception()  # 超时后才结束的调用已按超时处理，这里只把异常标记为已读取
+
+        task.add_done_callback(_release)
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout=settings.EVALUATION_DIMENSION_TIMEOUT)
+        except asyncio.TimeoutError:
+            error = f"timed out after {settings.EVALUATION_DIMENSION_TIMEOUT:g}s"
+        except Exception as e:
+            error = str(e)
+        logger.warning(f"{name}评估失败，使用默认分数: {error}")
+        return self._failed_score(error)
+
+    def _prescreen(
         self,
         script_content: str,
-        plot_context: Optional[str] = None
+        characters: Optional[List[str]],
+        enabled: Optional[bool] = None,
+        target_length: Optional[Tuple[int, int]] = None
+    ) -> Optional[Dict[str, Any]]:
+        if enabled is None:
+            enabled = get_settings().ENABLE_EVALUATION_PRESCREEN
+        if not enabled:
+            return None
+        return heuristic_scorer.score(script_content, characters, target_length)
+
+    def _rejected_result(
+        self,
+        prescreen: Dict[str, Any],
+        weights: Dict[str, float],
+        evaluation_mode: str
     ) -> Dict[str, Any]:
-        prompt = self._build_overall_coherence_prompt(script_content, plot_context)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "overall_coherence")
-
-    async def _compare_with_reference(
+        """预筛未通过时以启发式分数作为各维度分数，结构与 LLM 评审结果一致"""
+        score = prescreen["heuristic_score"]
+        return self._local_result(
+            {dimension: score for dimension in _DIMENSION_CRITERIA},
+            "未通过启发式预筛，未进行 LLM 评审",
+            list(prescreen["reasons"]),
+            weights,
+            evaluation_mode,
+            prescreen
+        )
+
+    def _proxy_result(
         self,
         script_content: str,
-        reference_script: str
+        characters: Optional[List[str]],
+        weights: Dict[str, float],
+        prescreen: Optional[Dict[str, Any]]
     ) -> Dict[str, Any]:
-        prompt = self._build_comparison_prompt(script_content, reference_script)
-        response = await asyncio.to_thread(self.llm.complete, prompt)
-        return self._parse_score_response(response.text, "comparison")
-
-    def _build_conflict_intensity_prompt(
+        return self._local_result(
+            proxy_scorer.predict(script_content, characters),
+            "代理模型预测，未进行 LLM 评审",
+            [],
+            weights,
+            "proxy",
+            prescreen
+        )
+
+    def _local_result(
         self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> str:
-        context = f"\n剧情背景: {plot_context}" if plot_context else ""
-        return f"""请评估以下剧本的冲突强度。
-
-{context}
-
-剧本内容:
-{script_content}
-
-请从以下维度评估:
-1. 冲突的明确性和清晰度
-2. 冲突的激烈程度
-3. 冲突对剧情的推动作用
-4. 冲突的合理性和可信度
+        scores: Dict[str, float],
+        reasoning: str,
+        weaknesses: List[str],
+        weights: Dict[str, float],
+        evaluation_mode: str,
+        prescreen: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """由本地算出的维度分数（启发式预筛或代理模型）构建评估结果"""
+        results: Dict[str, Any] = {
+            dimension: {
+                "score": scores[dimension],
+                "reasoning": reasoning,
+                "strengths": [],
+                "weaknesses": list(weaknesses)
+            }
+            for dimension in _DIMENSION_CRITERIA
+        }
+        overall_score = self._calculate_overall_score(results, weights)
+        results.update({
+            "overall_score": overall_score,
+            "weights_used": weights,
+            "quality_level": self._determine_quality_level(overall_score),
+            "partial": False,
+            "failed_dimensions": [],
+            "evaluation_mode": evaluation_mode,
+            "prescreen": prescreen,
+        })
+        return results
+
+    def _failed_score(self, error: str) -> Dict[str, Any]:
+        return {
+            "score": 5.0,
+            "reasoning": "该维度评估失败，使用默认分数",
+            "strengths": [],
+            "weaknesses": [],
+            "failed": True,
+            "error": error
+        }
 
-请以JSON格式返回评估结果:
-{{
-  "score": 0-10的分数,
-  "reasoning": "评分理由",
-  "strengths": ["优点1", "优点2"],
-  "weaknesses": ["不足1", "不足2"]
-}}"""
+    async def _evaluate_dimension(self, prefix: str, dimension: str) -> Dict[str, Any]:
+        prompt = self._build_dimension_prompt(prefix, dimension)
+        try:
+            parsed, response = await acomplete_structured(self.llm, prompt, DimensionScore)
+            result = parsed.model_dump()
+        except StructuredOutputError as e:
+            response = e.response
+            result = self._parse_score_response(response.text, dimension)
+        result["judge_model"] = self._served_model(self.llm, response)
+        return result
+
+    async def _evaluate_all_dimensions(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        prompt = self._build_all_dimensions_prompt(prefix)
+        try:
+            parsed, response = await acomplete_structured(self.fast_llm, prompt, AllDimensionScores)
+            results = parsed.model_dump()
+        except StructuredOutputError as e:
+            response = e.response
+            results = self._parse_all_scores_response(response.text)
+        judge_model = self._served_model(self.fast_llm, response)
+        for result in results.values():
+            result["judge_model"] = judge_model
+        return results
 
-    def _build_emotion_rendering_prompt(
+    async def _compare_with_reference(
         self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> str:
-        context = f"\n剧情背景: {plot_context}" if plot_context else ""
-        return f"""请评估以下剧本的情绪渲染效果。
-
-{context}
-
-剧本内容:
-{script_content}
-
-请从以下维度评估:
-1. 情绪表达的准确性和恰当性
-2. 情绪感染力和代入感
-3. 情绪变化的层次和深度
-4. 情绪与剧情的契合度
-
-请以JSON格式返回评估结果:
-{{
-  "score": 0-10的分数,
-  "reasoning": "评分理由",
-  "strengths": ["优点1", "优点2"],
-  "weaknesses": ["不足1", "不足2"]
-}}"""
+        prefix: str,
+        reference_script: str
+    ) -> Dict[str, Any]:
+        prompt = self._build_comparison_prompt(prefix, reference_script)
+        try:
+            parsed, _ = await acomplete_structured(self.llm, prompt, DimensionScore)
+            return parsed.model_dump()
+        except StructuredOutputError as e:
+            return self._parse_score_response(e.response.text, "comparison")
 
-    def _build_character_consistency_prompt(
+    def _build_shared_prefix(
         self,
         script_content: str,
+        plot_context: Optional[str] = None,
         characters: Optional[List[str]] = None
     ) -> str:
-        char_list = ", ".join(characters) if characters else ""
-        return f"""请评估以下剧本中人物的一致性。
-
-出场人物: {char_list}
-
-剧本内容:
-{script_content}
+        """
+        构建各维度共用的 Prompt 前缀
+
+        剧本和背景信息放在最前面且对同一剧本逐字一致，维度相关的指令放在末尾，
+        这样 Ollama（以及 DeepSeek 的上下文缓存）可以复用前缀的 KV 缓存，第二个及之后的维度只需处理后缀。
+        """
+        sections = ["你是一名专业的剧本评审。以下是待评估的剧本及其背景信息，之后会给出本次需要评估的维度。"]
+        if plot_context:
+            sections.append(f"剧情背景: {plot_context}")
+        if characters:
+            sections.append(f"出场人物: {', '.join(characters)}")
+        sections.append(f"剧本内容:\n{script_content}")
+        return "\n\n".join(sections) + "\n\n"
+
+    def _build_dimension_prompt(self, prefix: str, dimension: str) -> str:
+        title, criteria = _DIMENSION_CRITERIA[dimension]
+        criteria_text = "\n".join(f"{idx}. {item}" for idx, item in enumerate(criteria, 1))
+        return f"""{prefix}请评估上述剧本的{title}。
 
 请从以下维度评估:
-1. 人物性格和行为的一致性
-2. 人物对话风格的一致性
-3. 人物动机和目标的合理性
-4. 人物关系的合理性
+{criteria_text}
 
 请以JSON格式返回评估结果:
 {{
@@ -253,97 +699,32 @@ class QualityEvaluator:
   "weaknesses": ["不足1", "不足2"]
 }}"""
 
-    def _build_dialogue_naturalness_prompt(
-        self,
-        script_content: str
-    ) -> str:
-        return f"""请评估以下剧本中对话的自然度。
-
-剧本内容:
-{script_content}
-
-请从以下维度评估:
-1. 对话的真实性和生活感
-2. 对话的流畅性和节奏
-3. 对话符合人物身份和性格
-4. 对话的信息传递效率
-
-请以JSON格式返回评估结果:
+    def _build_all_dimensions_prompt(self, prefix: str) -> str:
+        sections = []
+        for idx, (dimension, (title, criteria)) in enumerate(_DIMENSION_CRITERIA.items(), 1):
+            sections.append(f"{idx}. {title}（{dimension}）：{'；'.join(criteria)}")
+        criteria_text = "\n".join(sections)
+        example = ",\n".join(
+            f'  "{dimension}": {{"score": 0-10的分数, "reasoning": "一句话评分理由", "strengths": ["优点"], "weaknesses": ["不足"]}}'
+            for dimension in _DIMENSION_CRITERIA
+        )
+        return f"""{prefix}请一次性从以下六个维度分别评估上述剧本：
+{criteria_text}
+
+每个维度的评分理由控制在一句话，优点和不足各不超过两条。请以JSON格式返回评估结果:
 {{
-  "score": 0-10的分数,
-  "reasoning": "评分理由",
-  "strengths": ["优点1", "优点2"],
-  "weaknesses": ["不足1", "不足2"]
-}}"""
-
-    def _build_dramatic_tension_prompt(
-        self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> str:
-        context = f"\n剧情背景: {plot_context}" if plot_context else ""
-        return f"""请评估以下剧本的剧情张力。
-
-{context}
-
-剧本内容:
-{script_content}
-
-请从以下维度评估:
-1. 剧情的吸引力和悬念设置
-2. 节奏把控和张力营造
-3. 高潮的冲击力
-4. 观众的期待感
-
-请以JSON格式返回评估结果:
-{{
-  "score": 0-10的分数,
-  "reasoning": "评分理由",
-  "strengths": ["优点1", "优点2"],
-  "weaknesses": ["不足1", "不足2"]
-}}"""
-
-    def _build_overall_coherence_prompt(
-        self,
-        script_content: str,
-        plot_context: Optional[str] = None
-    ) -> str:
-        context = f"\n剧情背景: {plot_context}" if plot_context else ""
-        return f"""请评估以下剧本的整体连贯性。
-
-{context}
-
-剧本内容:
-{script_content}
-
-请从以下维度评估:
-1. 剧情逻辑的合理性
-2. 场景衔接的流畅性
-3. 因果关系的清晰度
-4. 结构的完整性
-
-请以JSON格式返回评估结果:
-{{
-  "score": 0-10的分数,
-  "reasoning": "评分理由",
-  "strengths": ["优点1", "优点2"],
-  "weaknesses": ["不足1", "不足2"]
+{example}
 }}"""
 
     def _build_comparison_prompt(
         self,
-        script_content: str,
+        prefix: str,
         reference_script: str
     ) -> str:
-        return f"""请比较以下两个剧本的质量。
-
-参考剧本:
+        return f"""{prefix}参考剧本:
 {reference_script}
 
-待评估剧本:
-{script_content}
-
-请评估待评估剧本相对于参考剧本的质量:
+请比较上述待评估剧本（剧本内容）与参考剧本的质量，评估待评估剧本相对于参考剧本的质量:
 1. 0-5分: 明显更差
 2. 5-7分: 稍差或相当
 3. 7-8分: 稍好
@@ -357,11 +738,16 @@ class QualityEvaluator:
 }}"""
 
     def _parse_score_response(self, response: str, dimension: str) -> Dict[str, Any]:
+        try:
+            return parse_structured(response, DimensionScore).model_dump()
+        except ValueError as e:
+            logger.info(f"{dimension}评分未通过结构化校验，尝试宽松解析: {str(e)[:200]}")
+
         try:
             json_match = re.search(r'\{[\s\S]*\}', response)
             if json_match:
                 result = json.loads(json_match.group())
-                score = float(result.get("score", 5.0))
+                score = float(result["score"])
                 return {
                     "score": min(10.0, max(0.0, score)),
                     "reasoning": result.get("reasoning", ""),
@@ -371,12 +757,27 @@ class QualityEvaluator:
         except Exception as e:
             logger.warning(f"解析{dimension}评分失败: {str(e)}")
 
-        return {
-            "score": 5.0,
-            "reasoning": "无法解析评估结果，使用默认分数",
-            "strengths": [],
-            "weaknesses": []
-        }
+        logger.warning(f"无法解析{dimension}评分，该维度按评估失败处理")
+        return self._failed_score("unparseable evaluation response")
+
+    def _parse_all_scores_response(self, response: str) -> Dict[str, Dict[str, Any]]:
+        """宽松解析未通过结构化校验的 fast 模式全维度结果，缺失或无法解析的维度标记为失败"""
+        data: Dict[str, Any] = {}
+        try:
+            json_match = re.search(r'\{[\s\S]*\}', response)
+            if json_match:
+                data = json.loads(json_match.group())
+        except Exception as e:
+            logger.warning(f"解析全维度评分失败: {str(e)}")
+
+        results = {}
+        for dimension in _DIMENSION_CRITERIA:
+            value = data.get(dimension)
+            if isinstance(value, dict) and "score" in value:
+                results[dimension] = self._parse_score_response(json.dumps(value, ensure_ascii=False), dimension)
+            else:
+                results[dimension] = self._failed_score("dimension missing from fast evaluation response")
+        return results
 
     def _get_evaluation_weights(self, custom_weights: Optional[Dict[str, float]] = None) -> Dict[str, float]:
         default_weights = {
@@ -406,7 +807,7 @@ class QualityEvaluator:
         total_weight = 0.0
 
         for dimension, weight in weights.items():
-            if dimension in evaluation_results:
+            if dimension in evaluation_results and not evaluation_results[dimension].get("failed"):
                 score = evaluation_results[dimension].get("score", 5.0)
                 total_score += score * weight
                 total_weight += weight
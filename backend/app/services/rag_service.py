@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any, Tuple
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 import re
 import logging
 from llama_index.core import VectorStoreIndex, StorageContext
@@ -9,6 +9,11 @@ from llama_index.embeddings.ollama import OllamaEmbedding
 from llama_index.core import Settings
 from app.config import get_settings
 from app.services.ollama_client import get_ollama_manager
+from app.services.llm_streaming import astream_completion
+from app.services.prompt_budget import fit_prompt
+from app.services.token_utils import estimate_tokens
+from app.services.structured_output import StructuredOutputError, complete_structured
+from app.schemas.story_unit import TemporalRelationAnalysis, TemporalLinkAnalysis
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -88,7 +93,7 @@ class RAGService:
             from app.models.story_unit import StoryUnit
 
             _update_settings()
-            query_embedding = Settings.embed_model.get_text_embedding(query)
+            query_embedding = await Settings.embed_model.aget_text_embedding(query)
             embedding_str = f"[{','.join(str(x) for x in query_embedding)}]"
 
             engine = create_async_engine(settings.DATABASE_URL)
@@ -304,74 +309,143 @@ class RAGService:
     ) -> Dict[str, Any]:
         _update_settings()
         try:
-            referenced_units = await self.search_story_units(
-                query=plot_context,
-                conflict_type=required_conflict,
-                emotion_type=required_emotion,
-                top_k=3
+            prompt, metadata = await self._prepare_script_with_temporal(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                temporal_context=temporal_context,
             )
 
-            temporal_units = await self.search_temporal_units(
-                target_unit_id=temporal_context.get("target_unit_id") if temporal_context else None,
-                chapter_range=temporal_context.get("chapter_range") if temporal_context else None,
-                preceding_units=temporal_context.get("preceding_units", 0) if temporal_context else 0,
-                subsequent_units=temporal_context.get("subsequent_units", 0) if temporal_context else 0,
+            response = Settings.llm.complete(prompt)
+            generated_script = response.text
+
+            return {
+                "generated_script": generated_script,
+                **metadata,
+            }
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate script with temporal: {str(e)}") from e
+
+    async def generate_script_with_temporal_stream(
+        self,
+        plot_context: str,
+        required_conflict: str,
+        required_emotion: str,
+        characters: List[str],
+        scene: Optional[str] = None,
+        constraints: Optional[Dict[str, Any]] = None,
+        temporal_context: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """流式版本：检索完成后立即逐段产出 delta 事件，最后产出 metadata 事件"""
+        _update_settings()
+        try:
+            prompt, metadata = await self._prepare_script_with_temporal(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                temporal_context=temporal_context,
             )
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate script with temporal: {str(e)}") from e
+
+        async for delta in astream_completion(Settings.llm, prompt):
+            yield "delta", {"text": delta}
+
+        yield "metadata", metadata
+
+    async def _prepare_script_with_temporal(
+        self,
+        plot_context: str,
+        required_conflict: str,
+        required_emotion: str,
+        characters: List[str],
+        scene: Optional[str] = None,
+        temporal_context: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """检索参考单元、时序单元和人物约束并构建 Prompt，返回 (prompt, 元数据)"""
+        referenced_units = await self.search_story_units(
+            query=plot_context,
+            conflict_type=required_conflict,
+            emotion_type=required_emotion,
+            top_k=3
+        )
 
-            character_constraints = await self._get_character_constraints(characters)
-
-            character_context = ""
-            if character_constraints:
-                character_context = "\n人物设定：\n"
-                for name, info in character_constraints.items():
-                    character_context += f"\n{name}:\n"
-                    if info.get("core_personality"):
-                        character_context += f"  - 核心性格: {info['core_personality']}\n"
-                    if info.get("background"):
-                        character_context += f"  - 背景: {info['background']}\n"
-                    if info.get("bottom_line"):
-                        character_context += f"  - 底线: {info['bottom_line']}\n"
-                    if info.get("current_emotion"):
-                        character_context += f"  - 当前情绪: {info['current_emotion']}\n"
-                    if info.get("goals"):
-                        character_context += f"  - 目标: {info['goals']}\n"
-                    if info.get("relationships"):
-                        character_context += f"  - 关系: {info['relationships']}\n"
+        temporal_units = await self.search_temporal_units(
+            target_unit_id=temporal_context.get("target_unit_id") if temporal_context else None,
+            chapter_range=temporal_context.get("chapter_range") if temporal_context else None,
+            preceding_units=temporal_context.get("preceding_units", 0) if temporal_context else 0,
+            subsequent_units=temporal_context.get("subsequent_units", 0) if temporal_context else 0,
+        )
 
+        character_constraints = await self._get_character_constraints(characters)
+
+        character_blocks = []
+        for name, info in character_constraints.items():
+            block = f"\n{name}:\n"
+            if info.get("core_personality"):
+                block += f"  - 核心性格: {info['core_personality']}\n"
+            if info.get("background"):
+                block += f"  - 背景: {info['background']}\n"
+            if info.get("bottom_line"):
+                block += f"  - 底线: {info['bottom_line']}\n"
+            if info.get("current_emotion"):
+                block += f"  - 当前情绪: {info['current_emotion']}\n"
+            if info.get("goals"):
+                block += f"  - 目标: {info['goals']}\n"
+            if info.get("relationships"):
+                block += f"  - 关系: {info['relationships']}\n"
+            character_blocks.append(block)
+
+        preceding = temporal_units.get("preceding_units") or []
+        target = temporal_units.get("target_unit")
+        subsequent = temporal_units.get("subsequent_units") or []
+        temporal_texts = [unit["text"] for unit in preceding]
+        temporal_texts += [target["text"]] if target else []
+        temporal_texts += [unit["text"] for unit in subsequent]
+
+        def build_prompt(sections: Dict[str, Any]) -> str:
+            character_context = "\n人物设定：\n" + "".join(sections["characters"]) if character_blocks else ""
             reference_context = "\n\n".join([
-                f"参考剧情{idx+1}:\n{unit['text']}"
-                for idx, unit in enumerate(referenced_units)
+                f"参考剧情{idx+1}:\n{text}"
+                for idx, text in enumerate(sections["references"])
             ])
 
+            fitted_preceding = sections["temporal"][:len(preceding)]
+            fitted_target = sections["temporal"][len(preceding)] if target else None
+            fitted_subsequent = sections["temporal"][len(preceding) + (1 if target else 0):]
+
             temporal_context_str = ""
-            if temporal_units.get("preceding_units"):
+            if fitted_preceding:
                 temporal_context_str += "\n前置剧情：\n"
-                for idx, unit in enumerate(temporal_units["preceding_units"]):
-                    temporal_context_str += f"  {idx+1}. {unit['text']}\n"
+                for idx, text in enumerate(fitted_preceding):
+                    temporal_context_str += f"  {idx+1}. {text}\n"
 
-            if temporal_units.get("target_unit"):
+            if target:
                 temporal_context_str += "\n当前剧情节点：\n"
-                temporal_context_str += f"  {temporal_units['target_unit']['text']}\n"
+                temporal_context_str += f"  {fitted_target}\n"
 
-            if temporal_units.get("subsequent_units"):
+            if fitted_subsequent:
                 temporal_context_str += "\n后置剧情：\n"
-                for idx, unit in enumerate(temporal_units["subsequent_units"]):
-                    temporal_context_str += f"  {idx+1}. {unit['text']}\n"
+                for idx, text in enumerate(fitted_subsequent):
+                    temporal_context_str += f"  {idx+1}. {text}\n"
 
-            prompt = f"""
+            return f"""
 请根据以下信息生成一场戏的剧本：
-
-剧情上下文：
-{plot_context}
 {character_context}
+参考剧情片段：
+{reference_context}
 {temporal_context_str}
+剧情上下文：
+{sections["plot"]}
+
 需要的冲突类型：{required_conflict}
 需要的情绪类型：{required_emotion}
 场景：{scene if scene else '请根据剧情设定'}
 
-参考剧情片段：
-{reference_context}
-
 生成要求：
 1. 符合指定的冲突类型和情绪类型
 2. 严格遵循人物设定，保持人物性格、关系和情绪的一致性
@@ -383,22 +457,35 @@ class RAGService:
 请生成剧本：
 """
 
-            response = Settings.llm.complete(prompt)
-            generated_script = response.text
+        prompt, budget_report = fit_prompt(settings.GENERATION_PROMPT_TOKEN_BUDGET, {
+            "plot": plot_context,
+            "characters": character_blocks,
+            "references": [unit["text"] for unit in referenced_units],
+            "temporal": temporal_texts,
+        }, build_prompt)
+
+        return prompt, {
+            "referenced_units": [unit["id"] for unit in referenced_units],
+            "temporal_context": {
+                "preceding_count": len(temporal_units.get("preceding_units", [])),
+                "subsequent_count": len(temporal_units.get("subsequent_units", [])),
+                "has_target_unit": temporal_units.get("target_unit") is not None
+            },
+            "applied_character_constraints": list(character_constraints.keys()),
+            "confidence": 0.85,
+            "prompt_tokens": self._log_prompt_tokens(prompt, budget_report),
+            "prompt_budget": budget_report,
+        }
 
-            return {
-                "generated_script": generated_script,
-                "referenced_units": [unit["id"] for unit in referenced_units],
-                "temporal_context": {
-                    "preceding_count": len(temporal_units.get("preceding_units", [])),
-                    "subsequent_count": len(temporal_units.get("subsequent_units", [])),
-                    "has_target_unit": temporal_units.get("target_unit") is not None
-                },
-                "applied_character_constraints": list(character_constraints.keys()),
-                "confidence": 0.85,
-            }
-        except Exception as e:
-            raise RuntimeError(f"Failed to generate script with temporal: {str(e)}") from e
+    def _log_prompt_tokens(self, prompt: str, budget_report: Dict[str, Any]) -> int:
+        """记录最终 Prompt 的 token 数（本地估算）及各章节的截断情况"""
+        prompt_tokens = estimate_tokens(prompt)
+        sections = ", ".join(
+            f"{name}={info['final_tokens']}/{info['original_tokens']}"
+            for name, info in budget_report["sections"].items()
+        )
+        logger.info(f"剧本生成 Prompt: ~{prompt_tokens} tokens（章节预算 {budget_report['budget']}: {sections}）")
+        return prompt_tokens
 
     def _story_unit_to_node(self, story_unit):
         from llama_index.core import Document
@@ -506,34 +593,20 @@ class RAGService:
         return result_items
 
     async def _get_character_constraints(self, character_names: List[str]) -> Dict[str, Any]:
-        from sqlalchemy import select
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
-        from app.models.character import Character
-
-        engine = create_async_engine(settings.DATABASE_URL)
-        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-        character_constraints = {}
-
-        async with async_session() as session:
-            for name in character_names:
-                result = await session.execute(
-                    select(Character).where(Character.name == name)
-                )
-                character = result.scalar_one_or_none()
-
-                if character:
-                    character_constraints[name] = {
-                        "core_personality": character.core_personality,
-                        "background": character.background,
-                        "bottom_line": character.bottom_line,
-                        "current_emotion": character.current_emotion,
-                        "goals": character.goals,
-                        "relationships": character.relationships
-                    }
+        from app.services.character_cache import character_cache
 
-        return character_constraints
+        characters = await character_cache.get_many(character_names)
+        return {
+            name: {
+                "core_personality": character["core_personality"],
+                "background": character["background"],
+                "bottom_line": character["bottom_line"],
+                "current_emotion": character["current_emotion"],
+                "goals": character["goals"],
+                "relationships": character["relationships"]
+            }
+            for name, character in characters.items()
+        }
 
     async def update_character_emotion(
         self,
@@ -545,6 +618,7 @@ class RAGService:
         from sqlalchemy import select
         from app.models.character import Character
         from app.db.database import AsyncSessionLocal
+        from app.services.character_cache import character_cache
         from datetime import datetime
 
         async with AsyncSessionLocal() as session:
@@ -592,10 +666,11 @@ class RAGService:
             character.current_emotion = {
                 emotion_type: emotion_entry
             }
-            character.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            character.updated_at = datetime.now().isoformat()
 
             await session.commit()
             await session.refresh(character)
+            character_cache.invalidate([character_name])
 
             return {
                 "character_id": str(character.id),
@@ -627,6 +702,7 @@ class RAGService:
         from sqlalchemy import select
         from app.models.character import Character
         from app.db.database import AsyncSessionLocal
+        from app.services.character_cache import character_cache
         from datetime import datetime, timedelta
 
         async with AsyncSessionLocal() as session:
@@ -700,7 +776,7 @@ class RAGService:
                     from sqlalchemy.orm.attributes import flag_modified
                     character.current_emotion = current_emotion
                     flag_modified(character, "current_emotion")
-                    character.updated_at = current_time.strftime("%Y-%m-%d %H:%M:%S")
+                    character.updated_at = current_time.isoformat()
                     decayed_results.append({
                         "name": character.name,
                         "decayed_emotions": current_emotion,
@@ -709,6 +785,7 @@ class RAGService:
                     })
 
             await session.commit()
+            character_cache.invalidate(r["name"] for r in decayed_results)
 
             return {
                     "decayed_count": len(decayed_results),
@@ -722,25 +799,18 @@ class RAGService:
         scene_context: Optional[str] = None
     ) -> Dict[str, Any]:
         _update_settings()
-        from sqlalchemy import select
-        from app.models.character import Character
-        from app.db.database import AsyncSessionLocal
-
-        async with AsyncSessionLocal() as session:
-            character_data = {}
-            for name in characters:
-                result = await session.execute(
-                    select(Character).where(Character.name == name)
-                )
-                character = result.scalar_one_or_none()
-                if character:
-                    character_data[name] = {
-                        "core_personality": character.core_personality,
-                        "bottom_line": character.bottom_line,
-                        "current_emotion": character.current_emotion,
-                        "goals": character.goals,
-                        "relationships": character.relationships
-                    }
+        from app.services.character_cache import character_cache
+
+        character_data = {
+            name: {
+                "core_personality": character["core_personality"],
+                "bottom_line": character["bottom_line"],
+                "current_emotion": character["current_emotion"],
+                "goals": character["goals"],
+                "relationships": character["relationships"]
+            }
+            for name, character in (await character_cache.get_many(characters)).items()
+        }
 
         conflicts = []
         resolutions = []
@@ -1004,75 +1074,149 @@ class RAGService:
     ) -> Dict[str, Any]:
         _update_settings()
         try:
-            referenced_units = await self.search_story_units(
-                query=plot_context,
-                conflict_type=required_conflict,
-                emotion_type=required_emotion,
-                top_k=3
+            prompt, metadata = await self._prepare_script(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                goal_driven=goal_driven,
+            )
+
+            if settings.ENABLE_HEDGING:
+                from app.services.hedging import request_hedger
+                primary = getattr(Settings.llm, "backend_key", "qwen30b")
+                fallbacks = [
+                    (backend, client)
+                    for backend, client in get_ollama_manager().get_task_clients("script_generation")
+                    if backend != primary
+                ]
+                generated_script, hedge_info = await request_hedger.complete(
+                    "script_generation",
+                    [(primary, Settings.llm)] + fallbacks,
+                    prompt
+                )
+                logger.info(f"剧本生成对冲结果: {hedge_info}")
+            else:
+                response = Settings.llm.complete(prompt)
+                generated_script = response.text
+
+            return {
+                "generated_script": generated_script,
+                **metadata,
+            }
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate script: {str(e)}") from e
+
+    async def generate_script_stream(
+        self,
+        plot_context: str,
+        required_conflict: str,
+        required_emotion: str,
+        characters: List[str],
+        scene: Optional[str] = None,
+        constraints: Optional[Dict[str, Any]] = None,
+        goal_driven: bool = False,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """流式版本：检索完成后立即逐段产出 delta 事件，最后产出 metadata 事件"""
+        _update_settings()
+        try:
+            prompt, metadata = await self._prepare_script(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                goal_driven=goal_driven,
             )
+        except Exception as e:
+            raise RuntimeError(f"Failed to generate script: {str(e)}") from e
+
+        async for delta in astream_completion(Settings.llm, prompt):
+            yield "delta", {"text": delta}
+
+        yield "metadata", metadata
 
-            character_constraints = await self._get_character_constraints(characters)
-
-            character_context = ""
-            goal_context = ""
-            active_goals = []
-
-            if character_constraints:
-                character_context = "\n人物设定：\n"
-                for name, info in character_constraints.items():
-                    character_context += f"\n{name}:\n"
-                    if info.get("core_personality"):
-                        character_context += f"  - 核心性格: {info['core_personality']}\n"
-                    if info.get("background"):
-                        character_context += f"  - 背景: {info['background']}\n"
-                    if info.get("bottom_line"):
-                        character_context += f"  - 底线: {info['bottom_line']}\n"
-                    if info.get("current_emotion"):
-                        character_context += f"  - 当前情绪: {info['current_emotion']}\n"
-                    if info.get("relationships"):
-                        character_context += f"  - 关系: {info['relationships']}\n"
-
-                    if goal_driven and info.get("goals"):
-                        goals = info['goals']
-                        if isinstance(goals, dict):
-                            short_term_goals = goals.get("short", [])
-                            long_term_goals = goals.get("long", [])
-                            if short_term_goals or long_term_goals:
-                                active_goals.append({
-                                    "character": name,
-                                    "short_term": short_term_goals,
-                                    "long_term": long_term_goals
-                                })
-
-            if goal_driven and active_goals:
-                goal_context = "\n目标驱动设定：\n"
-                for goal_info in active_goals:
-                    goal_context += f"\n{goal_info['character']}:\n"
-                    if goal_info['short_term']:
-                        goal_context += f"  - 短期目标: {', '.join(goal_info['short_term'])}\n"
-                    if goal_info['long_term']:
-                        goal_context += f"  - 长期目标: {', '.join(goal_info['long_term'])}\n"
+    async def _prepare_script(
+        self,
+        plot_context: str,
+        required_conflict: str,
+        required_emotion: str,
+        characters: List[str],
+        scene: Optional[str] = None,
+        goal_driven: bool = False,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """检索参考单元和人物约束并构建 Prompt，返回 (prompt, 元数据)"""
+        referenced_units = await self.search_story_units(
+            query=plot_context,
+            conflict_type=required_conflict,
+            emotion_type=required_emotion,
+            top_k=3
+        )
 
+        character_constraints = await self._get_character_constraints(characters)
+
+        character_blocks = []
+        goal_blocks = []
+        active_goals = []
+
+        for name, info in character_constraints.items():
+            block = f"\n{name}:\n"
+            if info.get("core_personality"):
+                block += f"  - 核心性格: {info['core_personality']}\n"
+            if info.get("background"):
+                block += f"  - 背景: {info['background']}\n"
+            if info.get("bottom_line"):
+                block += f"  - 底线: {info['bottom_line']}\n"
+            if info.get("current_emotion"):
+                block += f"  - 当前情绪: {info['current_emotion']}\n"
+            if info.get("relationships"):
+                block += f"  - 关系: {info['relationships']}\n"
+            character_blocks.append(block)
+
+            if goal_driven and info.get("goals"):
+                goals = info['goals']
+                if isinstance(goals, dict):
+                    short_term_goals = goals.get("short", [])
+                    long_term_goals = goals.get("long", [])
+                    if short_term_goals or long_term_goals:
+                        active_goals.append({
+                            "character": name,
+                            "short_term": short_term_goals,
+                            "long_term": long_term_goals
+                        })
+
+        if goal_driven and active_goals:
+            for goal_info in active_goals:
+                block = f"\n{goal_info['character']}:\n"
+                if goal_info['short_term']:
+                    block += f"  - 短期目标: {', '.join(goal_info['short_term'])}\n"
+                if goal_info['long_term']:
+                    block += f"  - 长期目标: {', '.join(goal_info['long_term'])}\n"
+                goal_blocks.append(block)
+
+        def build_prompt(sections: Dict[str, Any]) -> str:
+            character_context = "\n人物设定：\n" + "".join(sections["characters"]) if character_blocks else ""
             reference_context = "\n\n".join([
-                f"参考剧情{idx+1}:\n{unit['text']}"
-                for idx, unit in enumerate(referenced_units)
+                f"参考剧情{idx+1}:\n{text}"
+                for idx, text in enumerate(sections["references"])
             ])
 
             if goal_driven:
-                prompt = f"""
+                goal_context = "\n目标驱动设定：\n" + "".join(sections["goals"]) if goal_blocks else ""
+                return f"""
 请根据以下信息生成一场戏的剧本：
+{character_context}
+参考剧情片段：
+{reference_context}
 
 剧情上下文：
-{plot_context}
-{character_context}
+{sections["plot"]}
 {goal_context}
 需要的冲突类型：{required_conflict}
 需要的情绪类型：{required_emotion}
 场景：{scene if scene else '请根据剧情设定'}
 
-参考剧情片段：
-{reference_context}
-
 生成要求（目标驱动模式）：
 1. 剧情必须围绕角色的目标展开，角色的行为和对话应该服务于目标实现
 2. 利用角色目标之间的冲突创造戏剧张力
@@ -1083,20 +1227,19 @@ class RAGService:
 
 请生成剧本：
 """
-            else:
-                prompt = f"""
+            return f"""
 请根据以下信息生成一场戏的剧本：
+{character_context}
+参考剧情片段：
+{reference_context}
 
 剧情上下文：
-{plot_context}
-{character_context}
+{sections["plot"]}
+
 需要的冲突类型：{required_conflict}
 需要的情绪类型：{required_emotion}
 场景：{scene if scene else '请根据剧情设定'}
 
-参考剧情片段：
-{reference_context}
-
 生成要求：
 1. 符合指定的冲突类型和情绪类型
 2. 严格遵循人物设定，保持人物性格、关系和情绪的一致性
@@ -1107,19 +1250,22 @@ class RAGService:
 请生成剧本：
 """
 
-            response = Settings.llm.complete(prompt)
-            generated_script = response.text
-
-            return {
-                "generated_script": generated_script,
-                "referenced_units": [unit["id"] for unit in referenced_units],
-                "applied_character_constraints": list(character_constraints.keys()),
-                "goal_driven": goal_driven,
-                "active_goals": active_goals,
-                "confidence": 0.85,
-            }
-        except Exception as e:
-            raise RuntimeError(f"Failed to generate script: {str(e)}") from e
+        prompt, budget_report = fit_prompt(settings.GENERATION_PROMPT_TOKEN_BUDGET, {
+            "plot": plot_context,
+            "characters": character_blocks,
+            "goals": goal_blocks,
+            "references": [unit["text"] for unit in referenced_units],
+        }, build_prompt)
+
+        return prompt, {
+            "referenced_units": [unit["id"] for unit in referenced_units],
+            "applied_character_constraints": list(character_constraints.keys()),
+            "goal_driven": goal_driven,
+            "active_goals": active_goals,
+            "confidence": 0.85,
+            "prompt_tokens": self._log_prompt_tokens(prompt, budget_report),
+            "prompt_budget": budget_report,
+        }
 
     async def evaluate_script_quality(self, script: str, constraints: Dict[str, Any]) -> Dict[str, Any]:
         _update_settings()
@@ -1262,15 +1408,19 @@ class RAGService:
 """
 
         try:
-            response = Settings.llm.complete(prompt)
+            try:
+                parsed, response = complete_structured(
+                    _get_ollama_manager().get_model_for_task("temporal_analysis"), prompt, TemporalRelationAnalysis
+                )
+                temporal_data = parsed.model_dump()
+            except StructuredOutputError as e:
+                response = e.response
+                logger.warning(f"Temporal relation output failed validation: {str(e)[:200]}")
+                temporal_data = None
             analysis_text = response.text.strip()
             logger.info(f"LLM response: {analysis_text[:200]}")
 
-            json_match = re.search(r'\{[\s\S]*\}', analysis_text)
-            if json_match:
-                import json
-                temporal_data = json.loads(json_match.group())
-
+            if temporal_data is not None:
                 confidence = temporal_data.get("confidence", 0.5)
 
                 if auto_update and confidence >= 0.7:
@@ -1445,16 +1595,13 @@ class RAGService:
 """
 
             try:
-                response = Settings.llm.complete(prompt)
-                link_text = response.text.strip()
-
-                json_match = re.search(r'\{[\s\S]*\}', link_text)
-                if json_match:
-                    import json
-                    link_data = json.loads(json_match.group())
-                    link_data["source_unit_id"] = source_unit.get("id")
-                    link_data["target_unit_id"] = target_unit.get("id")
-                    temporal_links.append(link_data)
+                parsed, _ = complete_structured(
+                    _get_ollama_manager().get_model_for_task("temporal_analysis"), prompt, TemporalLinkAnalysis
+                )
+                link_data = parsed.model_dump()
+                link_data["source_unit_id"] = source_unit.get("id")
+                link_data["target_unit_id"] = target_unit.get("id")
+                temporal_links.append(link_data)
             except Exception as e:
                 logger.warning(f"Failed to analyze temporal link: {e}")
 
@@ -0,0 +1,187 @@
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import re
+import threading
+import time
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_DIALOGUE_LINE_PATTERN = re.compile(r"^\s*[\w·（）()]{1,12}\s*[：:]")
+_QUOTED_PATTERN = re.compile(r"[“「『\"](.+?)[”」』\"]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_REFUSAL_MARKERS = ("作为一个AI", "作为AI", "我无法", "抱歉，我不能", "I'm sorry", "As an AI")
+
+
+def dialogue_ratio(text: str) -> float:
+    """对白（“人物：台词”行或引号内文字）占全部非空白字符的比例"""
+    total = len(_WHITESPACE_PATTERN.sub("", text))
+    if total == 0:
+        return 0.0
+    dialogue = 0
+    for line in text.splitlines():
+        compact = _WHITESPACE_PATTERN.sub("", line)
+        if _DIALOGUE_LINE_PATTERN.match(line):
+            dialogue += len(compact)
+        else:
+            dialogue += sum(len(_WHITESPACE_PATTERN.sub("", m)) for m in _QUOTED_PATTERN.findall(line))
+    return min(1.0, dialogue / total)
+
+
+def repetition_ratio(text: str, n: int = 8) -> float:
+    """字符 n-gram 中重复出现的比例，模型陷入循环输出时接近 1"""
+    compact = _WHITESPACE_PATTERN.sub("", text)
+    if len(compact) <= n:
+        return 0.0
+    grams = [compact[i:i + n] for i in range(len(compact) - n + 1)]
+    return 1 - len(set(grams)) / len(grams)
+
+
+def format_problems(text: str) -> List[str]:
+    problems = []
+    stripped = text.strip()
+    if stripped.startswith(("{", "[")):
+        problems.append("输出为 JSON 而不是剧本正文")
+    if "```" in stripped:
+        problems.append("包含代码块标记")
+    if any(marker in stripped[:200] for marker in _REFUSAL_MARKERS):
+        problems.append("模型拒绝或输出免责声明")
+    if len([line for line in stripped.splitlines() if line.strip()]) < 3:
+        problems.append("缺少分行的场景 / 对白结构")
+    return problems
+
+
+class HeuristicScorer:
+    """
+    剧本的本地启发式预筛
+
+    在微秒级别检查长度、对白占比、指定人物的出场覆盖率、n-gram 重复率与格式，
+    任一检查不通过即判定为明显不合格，调用方可以跳过 LLM 评审直接给出低分；
+    通过的剧本得到一个 0-10 的启发式分数，用于在调用 LLM 前对候选排序。
+    长度按调用方给出的目标字数范围检查（允许 length_tolerance 比例的偏差），没有目标范围时不检查长度。
+    """
+
+    def __init__(
+        self,
+        length_tolerance: float = 0.5,
+        min_dialogue_ratio: float = 0.1,
+        min_character_coverage: float = 0.5,
+        max_repetition: float = 0.3,
+        rejected_score_cap: float = 4.0,
+    ):
+        self.length_tolerance = length_tolerance
+        self.min_dialogue_ratio = min_dialogue_ratio
+        self.min_character_coverage = min_character_coverage
+        self.max_repetition = max_repetition
+        self.rejected_score_cap = rejected_score_cap
+        self._lock = threading.Lock()
+        self._screened = 0
+        self._rejected = 0
+        self._reasons: Dict[str, int] = {}
+        self._total_us = 0.0
+
+    def score(
+        self,
+        script_content: str,
+        characters: Optional[List[str]] = None,
+        target_length: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
+        """
+        Args:
+            target_length: 目标字数范围 (最少, 最多)，为空时不做长度检查；最少字数按至少 1、最多字数按不少于最少字数处理
+
+        Returns:
+            预筛报告：heuristic_score（0-10）、rejected、reasons（未通过的检查）以及各项检查的原始指标
+        """
+        started = time.perf_counter()
+        length = len(_WHITESPACE_PATTERN.sub("", script_content))
+        dialogue = dialogue_ratio(script_content)
+        repetition = repetition_ratio(script_content)
+        problems = format_problems(script_content)
+        names = [name for name in (characters or []) if name]
+        coverage = sum(1 for name in names if name in script_content) / len(names) if names else 1.0
+
+        reasons: Dict[str, str] = {}
+        length_score = 1.0
+        if target_length:
+            low = max(1, target_length[0])
+            high = max(low, target_length[1])
+            min_chars = max(1, int(low * (1 - self.length_tolerance)))
+            max_chars = int(high * (1 + self.length_tolerance))
+            if length < min_chars:
+                reasons["length"] = f"正文仅 {length} 字，远少于目标 {low}-{high} 字"
+            elif length > max_chars:
+                reasons["length"] = f"正文 {length} 字，远超目标 {low}-{high} 字"
+            length_score = min(1.0, length / low) if length <= high else high / length
+        if dialogue < self.min_dialogue_ratio:
+            reasons["dialogue"] = f"对白占比 {dialogue:.0%}，低于 {self.min_dialogue_ratio:.0%}"
+        if coverage < self.min_character_coverage:
+            missing = [name for name in names if name not in script_content]
+            reasons["characters"] = f"缺少指定人物: {', '.join(missing)}"
+        if repetition > self.max_repetition:
+            reasons["repetition"] = f"重复内容占 {repetition:.0%}，超过 {self.max_repetition:.0%}"
+        if problems:
+            reasons["format"] = "；".join(problems)
+
+        checks = {
+            "length": length_score,
+            "dialogue": min(1.0, dialogue / (2 * self.min_dialogue_ratio)) if self.min_dialogue_ratio > 0 else 1.0,
+            "characters": coverage,
+            "repetition": max(0.0, 1 - repetition / (2 * self.max_repetition)) if self.max_repetition > 0 else 1.0,
+            "format": 0.0 if problems else 1.0,
+        }
+        heuristic_score = round(10 * sum(checks.values()) / len(checks), 2)
+        rejected = bool(reasons)
+        if rejected:
+            heuristic_score = min(heuristic_score, self.rejected_score_cap)
+
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        with self._lock:
+            self._screened += 1
+            self._total_us += elapsed_us
+            if rejected:
+                self._rejected += 1
+                for check in reasons:
+                    self._reasons[check] = self._reasons.get(check, 0) + 1
+
+        return {
+            "heuristic_score": heuristic_score,
+            "rejected": rejected,
+            "reasons": list(reasons.values()),
+            "metrics": {
+                "length": length,
+                "dialogue_ratio": round(dialogue, 3),
+                "character_coverage": round(coverage, 3),
+                "repetition_ratio": round(repetition, 3),
+            },
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "screened": self._screened,
+                "rejected": self._rejected,
+                "hit_rate": round(self._rejected / self._screened, 3) if self._screened else 0.0,
+                "rejected_by_check": dict(self._reasons),
+                "avg_us": round(self._total_us / self._screened, 1) if self._screened else 0.0,
+                "thresholds": {
+                    "length_tolerance": self.length_tolerance,
+                    "min_dialogue_ratio": self.min_dialogue_ratio,
+                    "min_character_coverage": self.min_character_coverage,
+                    "max_repetition": self.max_repetition,
+                },
+            }
+
+
+def _create_scorer() -> HeuristicScorer:
+    settings = get_settings()
+    return HeuristicScorer(
+        length_tolerance=settings.PRESCREEN_LENGTH_TOLERANCE,
+        min_dialogue_ratio=settings.PRESCREEN_MIN_DIALOGUE_RATIO,
+        min_character_coverage=settings.PRESCREEN_MIN_CHARACTER_COVERAGE,
+        max_repetition=settings.PRESCREEN_MAX_REPETITION,
+    )
+
+
+heuristic_scorer = _create_scorer()
@@ -1,33 +1,37 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
+import asyncio
 import json
 import re
 import logging
-from app.services.deepseek_client import RequestsDeepSeekLLM
+import time
+from contextlib import aclosing
+from app.services.character_cache import character_cache
 from app.services.character_system import character_system
+from app.services.llm_streaming import astream_completion
+from app.services.near_duplicates import near_duplicate_filter
+from app.services.prompt_budget import fit_prompt
+from app.services.stop_policy import StopPolicy
+from app.services.token_utils import estimate_tokens
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# 各剧本长度档位的目标字数范围，同时用于生成 Prompt 和质量评估前的启发式预筛
+LENGTH_RANGES = {
+    "short": (300, 500),
+    "medium": (500, 800),
+    "long": (800, 1200)
+}
+
 
 class ScriptService:
     def __init__(self):
-        settings = get_settings()
-        if settings.ENABLE_DEEPSEEK and settings.DEEPSEEK_API_KEY:
-            self.llm = RequestsDeepSeekLLM(
-                model_name=settings.DEEPSEEK_MODEL,
-                api_key=settings.DEEPSEEK_API_KEY,
-                base_url=settings.DEEPSEEK_BASE_URL,
-                temperature=0.7,
-                top_p=0.95,
-                max_tokens=8192
-            )
-        else:
-            from app.services.ollama_client import get_ollama_manager
-            ollama_manager = get_ollama_manager()
-            if not ollama_manager._initialized:
-                ollama_manager.initialize()
-            self.llm = ollama_manager.llm_long_timeout
+        from app.services.ollama_client import get_ollama_manager
+        ollama_manager = get_ollama_manager()
+        if not ollama_manager._initialized:
+            ollama_manager.initialize()
+        self.llm = ollama_manager.get_model_for_task("script_generation")
         self._character_system_initialized = False
 
     async def generate_script(
@@ -66,134 +70,30 @@ class ScriptService:
         """
         try:
             logger.info(f"开始生成剧本: plot_context={plot_context[:30]}...")
-            
-            if use_character_system:
-                if not self._character_system_initialized:
-                    await character_system.initialize()
-                    self._character_system_initialized = True
-                
-                logger.info(f"加载人物状态...")
-                character_states = await character_system.load_multiple_characters(characters)
-                logger.info(f"加载了 {len(character_states)} 个人物状态")
-
-            logger.info(f"搜索剧情单元...")
-            referenced_units = await self._search_story_units(
-                query=plot_context,
-                conflict_type=required_conflict,
-                emotion_type=required_emotion,
-                top_k=3
-            )
-            logger.info(f"找到 {len(referenced_units)} 个参考剧情单元")
-
-            logger.info(f"获取人物约束...")
-            if use_character_system and character_states:
-                character_constraints = character_system.get_character_constraints_for_generation(characters)
-            else:
-                character_constraints = await self._get_character_constraints(characters)
-            logger.info(f"找到 {len(character_constraints)} 个人物约束")
-
-            character_context = ""
-            goal_context = ""
-            active_goals = []
-            temporal_context = {}
-
-            if character_constraints:
-                character_context = "\n人物设定：\n"
-                for name, info in character_constraints.items():
-                    character_context += f"\n{name}:\n"
-                    if info.get("core_personality"):
-                        character_context += f"  - 核心性格: {info['core_personality']}\n"
-                    if info.get("background"):
-                        character_context += f"  - 背景: {info['background']}\n"
-                    if info.get("bottom_line"):
-                        character_context += f"  - 底线: {info['bottom_line']}\n"
-                    if info.get("dominant_emotion"):
-                        character_context += f"  - 当前情绪: {info['dominant_emotion']}\n"
-                    if use_character_system and name in character_states:
-                        char_state = character_states[name]
-                        active_goals_list = char_state.get_active_goals()
-                        if active_goals_list.get("short_term") or active_goals_list.get("long_term"):
-                            active_goals.append({
-                                "character": name,
-                                "short_term": active_goals_list.get("short_term", []),
-                                "long_term": active_goals_list.get("long_term", [])
-                            })
-                            temporal_context[name] = {
-                                "dominant_emotion": char_state.get_dominant_emotion(),
-                                "relationships": char_state.relationships
-                            }
-                    else:
-                        if info.get("relationships"):
-                            character_context += f"  - 关系: {info['relationships']}\n"
-
-                        if goal_driven and info.get("goals"):
-                            goals = info['goals']
-                            if isinstance(goals, dict):
-                                short_term_goals = goals.get("short", [])
-                                long_term_goals = goals.get("long", [])
-                                if short_term_goals or long_term_goals:
-                                    active_goals.append({
-                                        "character": name,
-                                        "short_term": short_term_goals,
-                                        "long_term": long_term_goals
-                                    })
-
-            if goal_driven and active_goals:
-                goal_context = "\n目标驱动设定：\n"
-                for goal_info in active_goals:
-                    goal_context += f"\n{goal_info['character']}:\n"
-                    if goal_info['short_term']:
-                        goal_context += f"  - 短期目标: {', '.join(goal_info['short_term'])}\n"
-                    if goal_info['long_term']:
-                        goal_context += f"  - 长期目标: {', '.join(goal_info['long_term'])}\n"
 
-            reference_context = "\n\n".join([
-                f"参考剧情{idx+1}:\n{unit['text']}"
-                for idx, unit in enumerate(referenced_units)
-            ])
-
-            if goal_driven:
-                prompt = self._build_goal_driven_prompt(
-                    plot_context=plot_context,
-                    character_context=character_context,
-                    goal_context=goal_context,
-                    required_conflict=required_conflict,
-                    required_emotion=required_emotion,
-                    scene=scene,
-                    reference_context=reference_context,
-                    constraints=constraints
-                )
-            else:
-                prompt = self._build_standard_prompt(
-                    plot_context=plot_context,
-                    character_context=character_context,
-                    required_conflict=required_conflict,
-                    required_emotion=required_emotion,
-                    scene=scene,
-                    reference_context=reference_context,
-                    constraints=constraints
-                )
+            prompt, context = await self._prepare_generation(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                constraints=constraints,
+                goal_driven=goal_driven,
+                use_character_system=use_character_system,
+            )
 
             logger.info(f"调用 DeepSeek API 生成剧本 (prompt 长度: {len(prompt)} 字符)...")
             generated_script = await self._call_deepseek(prompt)
             logger.info(f"DeepSeek API 返回 (生成剧本长度: {len(generated_script)} 字符)")
 
-            if use_character_system and character_states:
+            if use_character_system and context["character_states"]:
                 await self._update_character_states_after_generation(
-                    character_states, required_emotion
+                    context["character_states"], required_emotion
                 )
 
             result = {
                 "generated_script": generated_script,
-                "referenced_units": [unit["id"] for unit in referenced_units],
-                "applied_character_constraints": list(character_constraints.keys()),
-                "goal_driven": goal_driven,
-                "active_goals": active_goals,
-                "temporal_context": temporal_context if temporal_context else None,
-                "confidence": 0.85,
-                "style": style,
-                "length": length,
-                "innovation_degree": innovation_degree,
+                **self._build_result_metadata(context, goal_driven, style, length, innovation_degree),
             }
 
             if enable_quality_evaluation:
@@ -201,7 +101,9 @@ class ScriptService:
                 evaluation = await quality_evaluator.evaluate_script(
                     script_content=generated_script,
                     plot_context=plot_context,
-                    characters=characters
+                    characters=characters,
+                    enable_prescreen=get_settings().ENABLE_GENERATION_PRESCREEN,
+                    target_length=LENGTH_RANGES.get(length)
                 )
                 result["quality_evaluation"] = evaluation
                 logger.info(f"质量评估完成，综合评分: {evaluation.get('overall_score', 0)}")
@@ -211,6 +113,233 @@ class ScriptService:
             logger.error(f"Failed to generate script: {str(e)}")
             raise RuntimeError(f"Failed to generate script: {str(e)}") from e
 
+    async def generate_script_stream(
+        self,
+        plot_context: str,
+        required_conflict: str,
+        required_emotion: str,
+        characters: List[str],
+        scene: Optional[str] = None,
+        constraints: Optional[Dict[str, Any]] = None,
+        goal_driven: bool = False,
+        use_character_system: bool = True,
+        style: str = "standard",
+        length: str = "medium",
+        innovation_degree: float = 0.5,
+        enable_quality_evaluation: bool = False,
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        流式生成剧本
+
+        检索与人物加载完成后立即逐段产出 ("delta", {"text": ...}) 事件，
+        生成结束后产出 ("metadata", {...})，内容与 generate_script 的返回值相同（不含剧本正文）
+        """
+        try:
+            prompt, context = await self._prepare_generation(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                constraints=constraints,
+                goal_driven=goal_driven,
+                use_character_system=use_character_system,
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate script: {str(e)}")
+            raise RuntimeError(f"Failed to generate script: {str(e)}") from e
+
+        parts = []
+        async for delta in astream_completion(self.llm, prompt):
+            parts.append(delta)
+            yield "delta", {"text": delta}
+        generated_script = "".join(parts)
+        logger.info(f"流式生成完成 (生成剧本长度: {len(generated_script)} 字符)")
+
+        if use_character_system and context["character_states"]:
+            await self._update_character_states_after_generation(
+                context["character_states"], required_emotion
+            )
+
+        metadata = self._build_result_metadata(context, goal_driven, style, length, innovation_degree)
+
+        if enable_quality_evaluation:
+            from app.services.quality_evaluator import quality_evaluator
+            metadata["quality_evaluation"] = await quality_evaluator.evaluate_script(
+                script_content=generated_script,
+                plot_context=plot_context,
+                characters=characters,
+                enable_prescreen=get_settings().ENABLE_GENERATION_PRESCREEN,
+                target_length=LENGTH_RANGES.get(length)
+            )
+
+        yield "metadata", metadata
+
+    def _build_result_metadata(
+        self,
+        context: Dict[str, Any],
+        goal_driven: bool,
+        style: str,
+        length: str,
+        innovation_degree: float,
+    ) -> Dict[str, Any]:
+        """构建生成结果中除剧本正文以外的字段"""
+        return {
+            "referenced_units": [unit["id"] for unit in context["referenced_units"]],
+            "applied_character_constraints": list(context["character_constraints"].keys()),
+            "goal_driven": goal_driven,
+            "active_goals": context["active_goals"],
+            "temporal_context": context["temporal_context"] if context["temporal_context"] else None,
+            "confidence": 0.85,
+            "style": style,
+            "length": length,
+            "innovation_degree": innovation_degree,
+            "prompt_tokens": context["prompt_tokens"],
+        }
+
+    async def _prepare_generation(
+        self,
+        plot_context: str,
+        required_conflict: str,
+        required_emotion: str,
+        characters: List[str],
+        scene: Optional[str] = None,
+        constraints: Optional[Dict[str, Any]] = None,
+        goal_driven: bool = False,
+        use_character_system: bool = True,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """加载人物状态、检索参考剧情并构建 Prompt，返回 (prompt, 生成上下文)"""
+        character_states = {}
+        if use_character_system:
+            if not self._character_system_initialized:
+                await character_system.initialize()
+                self._character_system_initialized = True
+            
+            logger.info(f"加载人物状态...")
+            character_states = await character_system.load_multiple_characters(characters)
+            logger.info(f"加载了 {len(character_states)} 个人物状态")
+
+        logger.info(f"搜索剧情单元...")
+        referenced_units = await self._search_story_units(
+            query=plot_context,
+            conflict_type=required_conflict,
+            emotion_type=required_emotion,
+            top_k=3
+        )
+        logger.info(f"找到 {len(referenced_units)} 个参考剧情单元")
+
+        logger.info(f"获取人物约束...")
+        if use_character_system and character_states:
+            character_constraints = character_system.get_character_constraints_for_generation(characters)
+        else:
+            character_constraints = await self._get_character_constraints(characters)
+        logger.info(f"找到 {len(character_constraints)} 个人物约束")
+
+        character_blocks = []
+        goal_blocks = []
+        active_goals = []
+        temporal_context = {}
+
+        for name, info in character_constraints.items():
+            block = f"\n{name}:\n"
+            if info.get("core_personality"):
+                block += f"  - 核心性格: {info['core_personality']}\n"
+            if info.get("background"):
+                block += f"  - 背景: {info['background']}\n"
+            if info.get("bottom_line"):
+                block += f"  - 底线: {info['bottom_line']}\n"
+            if info.get("dominant_emotion"):
+                block += f"  - 当前情绪: {info['dominant_emotion']}\n"
+            if use_character_system and name in character_states:
+                char_state = character_states[name]
+                active_goals_list = char_state.get_active_goals()
+                if active_goals_list.get("short_term") or active_goals_list.get("long_term"):
+                    active_goals.append({
+                        "character": name,
+                        "short_term": active_goals_list.get("short_term", []),
+                        "long_term": active_goals_list.get("long_term", [])
+                    })
+                    temporal_context[name] = {
+                        "dominant_emotion": char_state.get_dominant_emotion(),
+                        "relationships": char_state.relationships
+                    }
+            else:
+                if info.get("relationships"):
+                    block += f"  - 关系: {info['relationships']}\n"
+
+                if goal_driven and info.get("goals"):
+                    goals = info['goals']
+                    if isinstance(goals, dict):
+                        short_term_goals = goals.get("short", [])
+                        long_term_goals = goals.get("long", [])
+                        if short_term_goals or long_term_goals:
+                            active_goals.append({
+                                "character": name,
+                                "short_term": short_term_goals,
+                                "long_term": long_term_goals
+                            })
+            character_blocks.append(block)
+
+        if goal_driven and active_goals:
+            for goal_info in active_goals:
+                block = f"\n{goal_info['character']}:\n"
+                if goal_info['short_term']:
+                    block += f"  - 短期目标: {', '.join(goal_info['short_term'])}\n"
+                if goal_info['long_term']:
+                    block += f"  - 长期目标: {', '.join(goal_info['long_term'])}\n"
+                goal_blocks.append(block)
+
+        constraint_lines = [f"- {key}: {value}\n" for key, value in (constraints or {}).items()]
+
+        def build_prompt(sections: Dict[str, Any]) -> str:
+            character_context = "\n人物设定：\n" + "".join(sections["characters"]) if character_blocks else ""
+            goal_context = "\n目标驱动设定：\n" + "".join(sections["goals"]) if goal_blocks else ""
+            constraint_context = "\n额外约束：\n" + "".join(sections["constraints"]) if constraint_lines else ""
+            reference_context = "\n\n".join([
+                f"参考剧情{idx+1}:\n{text}"
+                for idx, text in enumerate(sections["references"])
+            ])
+            if goal_driven:
+                return self._build_goal_driven_prompt(
+                    plot_context=sections["plot"],
+                    character_context=character_context,
+                    goal_context=goal_context,
+                    required_conflict=required_conflict,
+                    required_emotion=required_emotion,
+                    scene=scene,
+                    reference_context=reference_context,
+                    constraint_context=constraint_context
+                )
+            return self._build_standard_prompt(
+                plot_context=sections["plot"],
+                character_context=character_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                scene=scene,
+                reference_context=reference_context,
+                constraint_context=constraint_context
+            )
+
+        prompt, budget_report = fit_prompt(get_settings().GENERATION_PROMPT_TOKEN_BUDGET, {
+            "plot": plot_context,
+            "characters": character_blocks,
+            "goals": goal_blocks,
+            "constraints": constraint_lines,
+            "references": [unit["text"] for unit in referenced_units],
+        }, build_prompt)
+
+        prompt_tokens = estimate_tokens(prompt)
+        logger.info(f"Prompt 约 {prompt_tokens} tokens，章节预算: {budget_report['sections']}")
+
+        return prompt, {
+            "referenced_units": referenced_units,
+            "character_states": character_states,
+            "character_constraints": character_constraints,
+            "active_goals": active_goals,
+            "temporal_context": temporal_context,
+            "prompt_tokens": prompt_tokens,
+        }
+
     def _build_standard_prompt(
         self,
         plot_context: str,
@@ -219,7 +348,7 @@ class ScriptService:
         required_emotion: str,
         scene: Optional[str],
         reference_context: str,
-        constraints: Optional[Dict[str, Any]],
+        constraint_context: str = "",
         style: str = "standard",
         length: str = "medium",
         innovation_degree: float = 0.5,
@@ -232,12 +361,8 @@ class ScriptService:
             "romantic": "浪漫风格，突出情感和氛围"
         }
         
-        length_ranges = {
-            "short": "300-500字",
-            "medium": "500-800字",
-            "long": "800-1200字"
-        }
-        
+        min_chars, max_chars = LENGTH_RANGES.get(length, LENGTH_RANGES["medium"])
+
         innovation_guidance = ""
         if innovation_degree < 0.3:
             innovation_guidance = "保持保守风格，贴近参考剧情的常规发展模式"
@@ -247,33 +372,29 @@ class ScriptService:
             innovation_guidance = "在参考和创新之间取得平衡"
         
         prompt = f"""请根据以下信息生成一场戏的剧本：
+{character_context}
+参考剧情片段：
+{reference_context}
 
 剧情上下文：
 {plot_context}
-{character_context}
+
 需要的冲突类型：{required_conflict}
 需要的情绪类型：{required_emotion}
 场景：{scene if scene else '请根据剧情设定'}
 
-参考剧情片段：
-{reference_context}
-
 生成要求：
 1. 符合指定的冲突类型和情绪类型
 2. 严格遵循人物设定，保持人物性格、关系和情绪的一致性
 3. 对话自然，符合人物性格和当前状态
 4. 有明确的戏剧张力
 5. 剧本风格：{style_descriptions.get(style, style)}
-6. 字数控制在{length_ranges.get(length, "500-800字")}
+6. 字数控制在{min_chars}-{max_chars}字
 7. 剧本必须原创，不能直接复制参考内容
 8. 创新指引：{innovation_guidance}
 """
 
-        if constraints:
-            prompt += f"\n额外约束：\n"
-            for key, value in constraints.items():
-                prompt += f"- {key}: {value}\n"
-
+        prompt += constraint_context
         prompt += "\n请生成剧本："
         return prompt
 
@@ -286,7 +407,7 @@ class ScriptService:
         required_emotion: str,
         scene: Optional[str],
         reference_context: str,
-        constraints: Optional[Dict[str, Any]],
+        constraint_context: str = "",
         style: str = "standard",
         length: str = "medium",
         innovation_degree: float = 0.5,
@@ -299,12 +420,8 @@ class ScriptService:
             "romantic": "浪漫风格，突出情感和氛围"
         }
         
-        length_ranges = {
-            "short": "300-500字",
-            "medium": "500-800字",
-            "long": "800-1200字"
-        }
-        
+        min_chars, max_chars = LENGTH_RANGES.get(length, LENGTH_RANGES["medium"])
+
         innovation_guidance = ""
         if innovation_degree < 0.3:
             innovation_guidance = "保持保守风格，贴近参考剧情的常规发展模式"
@@ -314,18 +431,17 @@ class ScriptService:
             innovation_guidance = "在参考和创新之间取得平衡"
         
         prompt = f"""请根据以下信息生成一场戏的剧本：
+{character_context}
+参考剧情片段：
+{reference_context}
 
 剧情上下文：
 {plot_context}
-{character_context}
 {goal_context}
 需要的冲突类型：{required_conflict}
 需要的情绪类型：{required_emotion}
 场景：{scene if scene else '请根据剧情设定'}
 
-参考剧情片段：
-{reference_context}
-
 生成要求（目标驱动模式）：
 1. 剧情必须围绕角色的目标展开，角色的行为和对话应该服务于目标实现
 2. 利用角色目标之间的冲突创造戏剧张力
@@ -333,16 +449,12 @@ class ScriptService:
 4. 严格遵循人物设定，保持人物性格、关系和情绪的一致性
 5. 让角色在追求目标的过程中做出符合性格的选择
 6. 剧本风格：{style_descriptions.get(style, style)}
-7. 字数控制在{length_ranges.get(length, "500-800字")}
+7. 字数控制在{min_chars}-{max_chars}字
 8. 剧本必须原创，不能直接复制参考内容
 9. 创新指引：{innovation_guidance}
 """
 
-        if constraints:
-            prompt += f"\n额外约束：\n"
-            for key, value in constraints.items():
-                prompt += f"- {key}: {value}\n"
-
+        prompt += constraint_context
         prompt += "\n请生成剧本："
         return prompt
 
@@ -383,12 +495,17 @@ class ScriptService:
     async def _call_deepseek(self, prompt: str) -> str:
         """调用 LLM API 生成剧本"""
         try:
-            response = self.llm.complete(prompt)
+            response = await asyncio.to_thread(self.llm.complete, prompt)
             return response.text
         except Exception as e:
             logger.error(f"LLM API call failed: {str(e)}")
             raise RuntimeError(f"LLM API call failed: {str(e)}") from e
 
+    async def _generate_candidate(self, prompt: str) -> str:
+        """流式生成单个批次候选；任务被取消时关闭流，后台线程随即停止读取，服务端不再继续生成"""
+        async with aclosing(astream_completion(self.llm, prompt)) as stream:
+            return "".join([delta async for delta in stream])
+
     async def _update_character_states_after_generation(
         self,
         character_states: Dict[str, Any],
@@ -404,34 +521,19 @@ class ScriptService:
                 logger.error(f"Failed to update character state for {name}: {str(e)}")
 
     async def _get_character_constraints(self, characters: List[str]) -> Dict[str, Any]:
-        """获取人物约束信息"""
-        from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-        from sqlalchemy.orm import sessionmaker
-        from sqlalchemy import select
-        from app.models.character import Character
-        from app.config import get_settings
-
-        settings = get_settings()
-        engine = create_async_engine(settings.DATABASE_URL)
-        async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-        character_constraints = {}
-        async with async_session() as session:
-            for character_name in characters:
-                stmt = select(Character).where(Character.name == character_name)
-                result = await session.execute(stmt)
-                character = result.scalar_one_or_none()
-                if character:
-                    character_constraints[character_name] = {
-                        "core_personality": character.core_personality,
-                        "background": character.background,
-                        "bottom_line": character.bottom_line,
-                        "current_emotion": character.current_emotion,
-                        "relationships": character.relationships,
-                        "goals": character.goals
-                    }
-
-        return character_constraints
+        """获取人物约束信息，同一批人物在缓存有效期内不访问数据库"""
+        loaded = await character_cache.get_many(characters)
+        return {
+            name: {
+                "core_personality": character["core_personality"],
+                "background": character["background"],
+                "bottom_line": character["bottom_line"],
+                "current_emotion": character["current_emotion"],
+                "relationships": character["relationships"],
+                "goals": character["goals"]
+            }
+            for name, character in loaded.items()
+        }
 
     async def evaluate_script_quality(self, script: str, constraints: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
@@ -542,6 +644,10 @@ class ScriptService:
         return_best_only: bool = False,
         enable_quality_evaluation: bool = True,
         min_score_threshold: float = 6.0,
+        stop_when: str = "none",
+        stop_k: int = 2,
+        stop_patience: int = 1,
+        time_budget_seconds: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         批次生成剧本
@@ -561,51 +667,140 @@ class ScriptService:
             batch_size: 批次生成数量（1-10）
             return_best_only: 是否仅返回最佳剧本
             enable_quality_evaluation: 是否启用质量评估
-            min_score_threshold: 最低合格分数（仅用于筛选）
+            min_score_threshold: 最低合格分数，first_above_threshold 策略以此为结束条件
+            stop_when: 提前结束策略：none、first_above_threshold、best_of_k、time_budget
+            stop_k: best_of_k 策略至少完成的候选数
+            stop_patience: best_of_k 策略中最佳分数连续未提高多少个候选后结束
+            time_budget_seconds: time_budget 策略的时间预算（秒）
 
         Returns:
-            批次生成结果
+            批次生成结果，early_stop 字段报告是否提前结束以及节省的生成次数
+
+        检索、人物加载与 Prompt 构建每批只做一次；各候选在 SCRIPT_BATCH_CONCURRENCY 限制内并发生成，
+        每个候选生成完成后立即开始评估，评估与其余候选的生成重叠进行。人物状态在整批生成后只更新一次。
+        启用 stop_when 策略时候选按需启动：同时未完成（生成或评估中）的候选不超过 SCRIPT_BATCH_STOP_CONCURRENCY，
+        上一个候选评估完成、策略尚未满足时才启动下一个；满足策略后不再启动新的候选，并取消仍在进行的候选（关闭其流式连接）。
+        启用 ENABLE_NEAR_DUPLICATE_FILTER 时，与已生成候选近似重复的候选不再评估，也不出现在结果中（见 near_duplicates）。
         """
-        import time
         start_time = time.time()
-        scripts = []
-        evaluations = []
+        policy = StopPolicy(stop_when, min_score_threshold, stop_k, stop_patience, time_budget_seconds)
 
-        for i in range(batch_size):
-            try:
-                result = await self.generate_script(
+        try:
+            prompt, context = await self._prepare_generation(
+                plot_context=plot_context,
+                required_conflict=required_conflict,
+                required_emotion=required_emotion,
+                characters=characters,
+                scene=scene,
+                constraints=constraints,
+                goal_driven=goal_driven,
+                use_character_system=use_character_system,
+            )
+        except Exception as e:
+            logger.error(f"Failed to prepare batch generation: {str(e)}")
+            raise RuntimeError(f"Failed to generate script batch: {str(e)}") from e
+
+        metadata = self._build_result_metadata(context, goal_driven, style, length, innovation_degree)
+        settings = get_settings()
+        semaphore = asyncio.Semaphore(max(1, settings.SCRIPT_BATCH_CONCURRENCY))
+        window = batch_size if policy.mode == "none" else max(1, min(settings.SCRIPT_BATCH_CONCURRENCY, settings.SCRIPT_BATCH_STOP_CONCURRENCY))
+        started: List[int] = []
+        dedupe = settings.ENABLE_NEAR_DUPLICATE_FILTER
+        representatives: List[Tuple[int, Tuple[int, ...]]] = []
+
+        async def _candidate(i: int) -> Tuple[int, Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+            async with semaphore:
+                started.append(i)
+                generated_script = await self._generate_candidate(prompt)
+
+            if dedupe:
+                signature = await asyncio.to_thread(near_duplicate_filter.hasher.signature, generated_script)
+                matched = near_duplicate_filter.match(signature, representatives)
+                if matched is not None:
+                    return i, None, None, {"index": i, "duplicate_of": matched[0], "similarity": round(matched[1], 3)}
+                representatives.append((i, signature))
+
+            result = {"generated_script": generated_script, **metadata}
+
+            if enable_quality_evaluation:
+                from app.services.quality_evaluator import quality_evaluator
+                evaluation = await quality_evaluator.evaluate_script(
+                    script_content=generated_script,
                     plot_context=plot_context,
-                    required_conflict=required_conflict,
-                    required_emotion=required_emotion,
                     characters=characters,
-                    scene=scene,
-                    constraints=constraints,
-                    goal_driven=goal_driven,
-                    use_character_system=use_character_system,
-                    style=style,
-                    length=length,
-                    innovation_degree=innovation_degree,
+                    enable_prescreen=get_settings().ENABLE_GENERATION_PRESCREEN,
+                    target_length=LENGTH_RANGES.get(length)
                 )
-                scripts.append(result)
-                
-                if enable_quality_evaluation:
-                    from app.services.quality_evaluator import quality_evaluator
-                    evaluation = await quality_evaluator.evaluate_script(
-                        script_content=result["generated_script"],
-                        plot_context=plot_context,
-                        characters=characters
-                    )
-                    evaluations.append(evaluation)
-                    logger.info(f"Generated script {i+1}/{batch_size}, overall_score: {evaluation.get('overall_score', 0)}")
-                else:
-                    evaluation = await self.evaluate_script_quality(
-                        script=result["generated_script"],
-                        constraints=constraints
-                    )
-                    evaluations.append(evaluation)
-                    logger.info(f"Generated script {i+1}/{batch_size}, overall_score: {evaluation.get('overall_score', 0)}")
-            except Exception as e:
-                logger.error(f"Failed to generate script {i+1}/{batch_size}: {str(e)}")
+            else:
+                evaluation = await self.evaluate_script_quality(
+                    script=generated_script,
+                    constraints=constraints
+                )
+            return i, result, evaluation, None
+
+        completed: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+        failed = 0
+        near_duplicates: List[Dict[str, Any]] = []
+        tasks: List[asyncio.Task] = []
+        pending: set = set()
+
+        def _launch():
+            while len(tasks) < batch_size and len(pending) < window:
+                task = asyncio.create_task(_candidate(len(tasks)))
+                tasks.append(task)
+                pending.add(task)
+
+        try:
+            _launch()
+            while pending and policy.reason is None:
+                done, pending = await asyncio.wait(
+                    pending, timeout=policy.remaining_seconds(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    policy.expire()
+                    break
+                for finished in done:
+                    try:
+                        i, result, evaluation, duplicate = finished.result()
+                    except Exception as e:
+                        failed += 1
+                        logger.error(f"Failed to generate script candidate: {str(e)}")
+                        continue
+                    if duplicate is not None:
+                        near_duplicates.append(duplicate)
+                        logger.info(f"Script {i+1}/{batch_size} is a near-duplicate of script {duplicate['duplicate_of']+1} (similarity {duplicate['similarity']}), skipping evaluation")
+                        continue
+                    completed[i] = (result, evaluation)
+                    score = evaluation.get("overall_score", 0)
+                    logger.info(f"Generated script {i+1}/{batch_size} ({len(completed)} done), overall_score: {score}")
+                    policy.observe(score)
+                if policy.reason is None:
+                    _launch()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        early_stop = {
+            "policy": policy.describe(),
+            "stopped_early": policy.reason is not None and len(completed) + failed + len(near_duplicates) < batch_size,
+            "reason": policy.reason,
+            "generations_started": len(started),
+            "generations_saved": batch_size - len(started),
+            "cancelled_in_flight": len(started) - len(completed) - failed - len(near_duplicates),
+        }
+        if early_stop["stopped_early"]:
+            logger.info(
+                f"批次生成提前结束（{policy.reason}），节省 {early_stop['generations_saved']} 次生成，"
+                f"取消 {early_stop['cancelled_in_flight']} 个进行中的候选"
+            )
+
+        scripts = [completed[i][0] for i in sorted(completed)]
+        evaluations = [completed[i][1] for i in sorted(completed)]
+
+        if scripts and use_character_system and context["character_states"]:
+            await self._update_character_states_after_generation(
+                context["character_states"], required_emotion
+            )
 
         generation_time = time.time() - start_time
 
@@ -614,7 +809,9 @@ class ScriptService:
                 "scripts": [],
                 "best_script_index": None,
                 "total_count": 0,
-                "generation_time_seconds": generation_time
+                "generation_time_seconds": generation_time,
+                "early_stop": early_stop,
+                "near_duplicates": near_duplicates
             }
 
         best_index = max(range(len(evaluations)), key=lambda i: evaluations[i].get("overall_score", 0))
@@ -625,7 +822,9 @@ class ScriptService:
                 "best_script_index": 0,
                 "total_count": 1,
                 "generation_time_seconds": generation_time,
-                "evaluation": evaluations[best_index] if evaluations else None
+                "evaluation": evaluations[best_index] if evaluations else None,
+                "early_stop": early_stop,
+                "near_duplicates": near_duplicates
             }
 
         return {
@@ -633,8 +832,9 @@ class ScriptService:
             "best_script_index": best_index,
             "total_count": len(scripts),
             "generation_time_seconds": generation_time,
-            "evaluations": evaluations if enable_quality_evaluation else None
+            "evaluations": evaluations if enable_quality_evaluation else None,
+            "early_stop": early_stop,
+            "near_duplicates": near_duplicates
         }
 
-
 script_service = ScriptService()
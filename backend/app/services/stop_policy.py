@@ -0,0 +1,71 @@
+from typing import Any, Dict, Optional
+import time
+
+STOP_MODES = ("none", "first_above_threshold", "best_of_k", "time_budget")
+
+
+class StopPolicy:
+    """
+    批次生成的提前结束策略
+
+    - none：生成全部 batch_size 个候选
+    - first_above_threshold：第一个评分不低于 threshold 的候选出现即结束
+    - best_of_k：至少完成 k 个候选后，最佳分数连续 patience 个候选没有提高即结束
+    - time_budget：从开始计时超过 time_budget_seconds 即结束，保留已完成的候选
+    """
+
+    def __init__(
+        self,
+        mode: str = "none",
+        threshold: float = 6.0,
+        k: int = 2,
+        patience: int = 1,
+        time_budget_seconds: Optional[float] = None,
+    ):
+        if mode not in STOP_MODES:
+            raise ValueError(f"Unknown stop policy: {mode}")
+        if mode == "time_budget" and not time_budget_seconds:
+            raise ValueError("time_budget policy requires time_budget_seconds")
+        self.mode = mode
+        self.threshold = threshold
+        self.k = max(1, k)
+        self.patience = max(1, patience)
+        self.time_budget_seconds = time_budget_seconds
+        self._started_at = time.monotonic()
+        self._observed = 0
+        self._best: Optional[float] = None
+        self._since_improvement = 0
+        self.reason: Optional[str] = None
+
+    def remaining_seconds(self) -> Optional[float]:
+        """time_budget 策略下剩余的时间，其他策略返回 None"""
+        if self.mode != "time_budget":
+            return None
+        return max(0.0, self.time_budget_seconds - (time.monotonic() - self._started_at))
+
+    def observe(self, score: float) -> bool:
+        """记录一个候选的评分，返回是否应当结束本批生成"""
+        self._observed += 1
+        if self._best is None or score > self._best:
+            self._best = score
+            self._since_improvement = 0
+        else:
+            self._since_improvement += 1
+
+        if self.mode == "first_above_threshold" and score >= self.threshold:
+            self.reason = f"score {score:.2f} >= threshold {self.threshold:g}"
+        elif self.mode == "best_of_k" and self._observed >= self.k and self._since_improvement >= self.patience:
+            self.reason = f"best score {self._best:.2f} did not improve for {self._since_improvement} candidates"
+        return self.reason is not None
+
+    def expire(self):
+        self.reason = f"time budget of {self.time_budget_seconds:g}s exhausted"
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "threshold": self.threshold,
+            "k": self.k,
+            "patience": self.patience,
+            "time_budget_seconds": self.time_budget_seconds,
+        }
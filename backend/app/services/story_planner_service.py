@@ -2,9 +2,9 @@ from typing import List, Dict, Any, Optional
 import logging
 import json
 import uuid
-from app.services.deepseek_client import RequestsDeepSeekLLM
 from app.services.ollama_client import get_ollama_manager
-from app.config import get_settings
+from app.services.structured_output import StructuredOutputError, acomplete_structured
+from app.schemas.story_plan import SceneAdjustment, ScenePlanList
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -119,21 +119,10 @@ class StoryPlannerService:
     }
     
     def __init__(self):
-        settings = get_settings()
-        if settings.ENABLE_DEEPSEEK and settings.DEEPSEEK_API_KEY:
-            self.llm = RequestsDeepSeekLLM(
-                model_name=settings.DEEPSEEK_MODEL,
-                api_key=settings.DEEPSEEK_API_KEY,
-                base_url=settings.DEEPSEEK_BASE_URL,
-                temperature=0.7,
-                top_p=0.95,
-                max_tokens=8192
-            )
-        else:
-            ollama_manager = get_ollama_manager()
-            if not ollama_manager._initialized:
-                ollama_manager.initialize()
-            self.llm = ollama_manager.llm_long_timeout
+        ollama_manager = get_ollama_manager()
+        if not ollama_manager._initialized:
+            ollama_manager.initialize()
+        self.llm = ollama_manager.get_model_for_task("planning")
     
     def get_available_structure_templates(self) -> List[Dict[str, Any]]:
         """获取可用的剧情结构模板"""
@@ -324,10 +313,14 @@ class StoryPlannerService:
 """
         
         logger.info(f"调用 LLM 生成剧情规划...")
-        response = await self._call_llm(prompt)
-        logger.info(f"LLM 返回响应 (长度: {len(response)} 字符)")
-        
-        scenes = self._parse_scene_plans(response)
+        try:
+            parsed, response = await acomplete_structured(self.llm, prompt, ScenePlanList)
+            scenes = [scene.model_dump() for scene in parsed.scenes]
+        except StructuredOutputError as e:
+            response = e.response
+            logger.warning(f"Scene plans failed validation, falling back to lenient parsing: {str(e)[:200]}")
+            scenes = self._parse_scene_plans(response.text)
+        logger.info(f"LLM 返回响应 (长度: {len(response.text)} 字符)")
         
         scene_plans = []
         for i, scene in enumerate(scenes, 1):
@@ -353,24 +346,10 @@ class StoryPlannerService:
             )
         return "\n".join(formatted)
     
-    async def _call_llm(self, prompt: str) -> str:
-        """调用 LLM"""
-        try:
-            if hasattr(self.llm, 'acomplete'):
-                response = await self.llm.acomplete(prompt)
-                return response.text if hasattr(response, 'text') else str(response)
-            else:
-                import asyncio
-                response = await asyncio.to_thread(self.llm.complete, prompt)
-                return response.text if hasattr(response, 'text') else str(response)
-        except Exception as e:
-            logger.error(f"LLM call failed: {str(e)}")
-            raise
-    
     def _parse_scene_plans(self, response: str) -> List[Dict[str, Any]]:
-        """解析场景规划"""
+        """宽松解析未通过结构化校验的场景规划"""
         import re
-        
+
         def remove_control_chars(text):
             """移除所有控制字符（只保留可打印字符）"""
             allowed_chars = set(' \t\n\r')
@@ -595,14 +574,11 @@ class StoryPlannerService:
                 )
 
                 try:
-                    if hasattr(self.llm, 'acomplete'):
-                        response = await self.llm.acomplete(prompt)
-                        response_text = response.text if hasattr(response, 'text') else str(response)
-                    else:
-                        import asyncio
-                        response = await asyncio.to_thread(self.llm.complete, prompt)
-                        response_text = response.text if hasattr(response, 'text') else str(response)
-                    adjusted_scene = self._parse_adjusted_scene(response_text, scene_number)
+                    try:
+                        parsed, _ = await acomplete_structured(self.llm, prompt, SceneAdjustment)
+                        adjusted_scene = {"scene_number": scene_number, **parsed.model_dump()}
+                    except StructuredOutputError as e:
+                        adjusted_scene = self._parse_adjusted_scene(e.response.text, scene_number)
                     target_scene.update(adjusted_scene)
                 except Exception as e:
                     logger.error(f"Failed to regenerate scene {scene_number}: {str(e)}")
@@ -0,0 +1,66 @@
+from typing import Any, Dict, Tuple, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+import asyncio
+import logging
+import re
+
+from app.services.ollama_llm import split_reasoning
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=BaseModel)
+
+
+def output_schema(model_cls: Type[BaseModel]) -> Dict[str, Any]:
+    """由 Pydantic 模型生成 JSON Schema，作为 Ollama format / DeepSeek response_format 的约束"""
+    return model_cls.model_json_schema()
+
+
+def parse_structured(text: str, model_cls: Type[T]) -> T:
+    """
+    按 Pydantic 模型直接校验 LLM 输出
+
+    受约束解码时输出本身就是合法 JSON；未受约束（如旧版 Ollama）时再尝试截取第一个 JSON 对象。
+    """
+    answer, _ = split_reasoning(text.strip())
+    try:
+        return model_cls.model_validate_json(answer)
+    except ValidationError as e:
+        match = re.search(r"\{[\s\S]*\}", answer)
+        if match and match.group() != answer:
+            try:
+                return model_cls.model_validate_json(match.group())
+            except ValidationError:
+                pass
+        raise ValueError(f"LLM output does not match {model_cls.__name__}: {e}") from e
+
+
+class StructuredOutputError(ValueError):
+    """重试后输出仍未通过模型校验；response 为最后一次调用的原始响应，调用方可以据此做宽松解析"""
+
+    def __init__(self, message: str, response: Any):
+        super().__init__(message)
+        self.response = response
+
+
+def complete_structured(llm: Any, prompt: str, model_cls: Type[T], retries: int = 1) -> Tuple[T, Any]:
+    """
+    以 model_cls 的 JSON Schema 约束输出并按模型校验，校验失败时重新生成，最多重试 retries 次
+
+    Returns:
+        (校验后的模型实例, 原始响应)；重试用尽时抛出 StructuredOutputError
+    """
+    schema = output_schema(model_cls)
+    for attempt in range(retries + 1):
+        response = llm.complete(prompt, output_format=schema)
+        try:
+            return parse_structured(response.text, model_cls), response
+        except ValueError as e:
+            error = e
+            logger.info(f"{model_cls.__name__} 输出未通过校验（第 {attempt + 1} 次）: {str(e)[:200]}")
+    raise StructuredOutputError(str(error), response) from error
+
+
+async def acomplete_structured(llm: Any, prompt: str, model_cls: Type[T], retries: int = 1) -> Tuple[T, Any]:
+    """complete_structured 的异步版本，阻塞的 HTTP 调用在线程中执行"""
+    return await asyncio.to_thread(complete_structured, llm, prompt, model_cls, retries)
@@ -0,0 +1,51 @@
+from typing import Iterable, Optional
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+DEFAULT_NUM_CTX_BUCKETS = (2048, 4096, 8192, 16384, 32768, 40960)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数
+
+    中文字符按每字约 1 个 token，其余字符按约 4 个字符 1 个 token 计算，略偏保守，
+    用于在请求发出前预估上下文长度。
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+
+def select_num_ctx(
+    prompt_tokens: int,
+    num_output: int,
+    max_ctx: int,
+    buckets: Iterable[int] = DEFAULT_NUM_CTX_BUCKETS,
+    margin: float = 1.1,
+) -> int:
+    """
+    根据 prompt 长度与输出预算选择 num_ctx
+
+    向上取整到固定档位，使相近长度的请求使用相同的 num_ctx，Ollama 可以复用已加载的上下文
+    而不必因 num_ctx 变化重新加载模型；结果不超过模型上限 max_ctx。
+    """
+    needed = int((prompt_tokens + num_output) * margin)
+    chosen: Optional[int] = None
+    for bucket in sorted(buckets):
+        if bucket >= needed:
+            chosen = bucket
+            break
+    if chosen is None or chosen > max_ctx:
+        chosen = max_ctx
+    if needed > max_ctx:
+        logger.warning(
+            f"Prompt ({prompt_tokens} tokens) plus output budget ({num_output}) exceeds context limit {max_ctx}"
+        )
+    return chosen
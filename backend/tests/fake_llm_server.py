@@ -0,0 +1,277 @@
+"""
+本地假 Ollama / DeepSeek 服务，用于在没有远程 Ollama 和 DeepSeek Key 的情况下做压测与性能实验
+
+实现的接口：
+- POST /api/generate        Ollama 生成（流式 / 非流式，空 prompt 视为加载模型）
+- POST /api/embed           Ollama Embedding（基于文本 hash 的确定性向量）
+- GET  /api/ps              已加载模型列表
+- POST /v1/chat/completions DeepSeek 兼容接口（SSE 流式 / 非流式）
+
+用法：
+    python tests/fake_llm_server.py --port 11434 --ttft-ms 300 --tokens-per-sec 40 --failure-rate 0.02
+
+然后将 OLLAMA_BASE_URL 设置为 http://localhost:11434，DEEPSEEK_BASE_URL 设置为 http://localhost:11434/v1。
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class FakeLLMConfig:
+    def __init__(
+        self,
+        ttft_ms: float = 300.0,
+        ttft_sigma: float = 0.3,
+        tokens_per_sec: float = 40.0,
+        output_tokens: int = 200,
+        embed_latency_ms: float = 20.0,
+        embed_dim: int = 1024,
+        failure_rate: float = 0.0,
+        slow_rate: float = 0.0,
+        slow_factor: float = 10.0,
+        seed: Optional[int] = None,
+    ):
+        self.ttft_ms = ttft_ms
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_sec = tokens_per_sec
+        self.output_tokens = output_tokens
+        self.embed_latency_ms = embed_latency_ms
+        self.embed_dim = embed_dim
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.random = random.Random(seed)
+
+    def sample_ttft(self) -> float:
+        """TTFT 服从以 ttft_ms 为中位数的对数正态分布，slow_rate 比例的请求再乘以 slow_factor 模拟长尾"""
+        ttft = self.ttft_ms * math.exp(self.random.gauss(0, self.ttft_sigma)) if self.ttft_sigma else self.ttft_ms
+        if self.slow_rate and self.random.random() < self.slow_rate:
+            ttft *= self.slow_factor
+        return ttft / 1000
+
+    def should_fail(self) -> bool:
+        return bool(self.failure_rate) and self.random.random() < self.failure_rate
+
+
+def deterministic_embedding(text: str, dim: int) -> List[float]:
+    """由文本 sha256 派生的单位向量，同一文本总是得到同一向量"""
+    values: List[float] = []
+    counter = 0
+    while len(values) < dim:
+        digest = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+        values.extend((b - 127.5) / 127.5 for b in digest)
+        counter += 1
+    values = values[:dim]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def _example_from_schema(schema: Dict[str, Any], defs: Dict[str, Any], depth: int = 0) -> Any:
+    if "$ref" in schema:
+        return _example_from_schema(defs.get(schema["$ref"].split("/")[-1], {}), defs, depth)
+    if "anyOf" in schema:
+        options = [s for s in schema["anyOf"] if s.get("type") != "null"] or schema["anyOf"]
+        return _example_from_schema(options[0], defs, depth)
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "const" in schema:
+        return schema["const"]
+
+    schema_type = schema.get("type", "object")
+    if schema_type == "object":
+        return {
+            name: _example_from_schema(prop, defs, depth + 1)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        return [] if depth > 3 else [_example_from_schema(schema.get("items", {}), defs, depth + 1)]
+    if schema_type in ("number", "integer"):
+        low = schema.get("minimum", 0)
+        high = schema.get("maximum", low + 10)
+        value = low + (high - low) * 0.75
+        return int(value) if schema_type == "integer" else round(value, 2)
+    if schema_type == "boolean":
+        return True
+    return schema.get("description", "示例")
+
+
+def build_answer(prompt: str, output_format: Any, output_tokens: int) -> str:
+    """按请求的 format 生成回答：JSON Schema 生成满足约束的示例对象，"json" 返回简单对象，否则返回确定性文本"""
+    if isinstance(output_format, dict):
+        return json.dumps(_example_from_schema(output_format, output_format.get("$defs", {})), ensure_ascii=False)
+    if output_format == "json" or "json" in prompt.lower():
+        return json.dumps(
+            {"score": 7.5, "reasoning": "fake", "strengths": ["节奏紧凑"], "weaknesses": ["对白略显生硬"]},
+            ensure_ascii=False
+        )
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return "".join(f"【{seed[i % 64]}】场景{i}。" for i in range(max(1, output_tokens // 6)))
+
+
+def split_tokens(text: str, output_tokens: int) -> List[str]:
+    size = max(1, math.ceil(len(text) / max(1, output_tokens)))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def create_app(config: FakeLLMConfig) -> FastAPI:
+    app = FastAPI(title="Fake Ollama / DeepSeek")
+    loaded_models: Dict[str, float] = {}
+
+    def _failure_response() -> JSONResponse:
+        return JSONResponse(status_code=503, content={"error": "injected failure"})
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        prompt = body.get("prompt", "")
+        loaded_models[model] = time.time()
+
+        if not prompt:
+            return {"model": model, "response": "", "done": True, "done_reason": "load"}
+        if config.should_fail():
+            return _failure_response()
+
+        num_predict = body.get("options", {}).get("num_predict") or config.output_tokens
+        tokens = split_tokens(build_answer(prompt, body.get("format"), config.output_tokens), min(num_predict, config.output_tokens))
+        ttft = config.sample_ttft()
+        token_interval = 1 / config.tokens_per_sec
+        prompt_tokens = max(1, len(prompt) // 2)
+
+        def _final(eval_seconds: float) -> Dict[str, Any]:
+            return {
+                "model": model,
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((ttft + eval_seconds) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(ttft * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(eval_seconds * 1e9),
+            }
+
+        if not body.get("stream", True):
+            eval_seconds = len(tokens) * token_interval
+            await asyncio.sleep(ttft + eval_seconds)
+            return {**_final(eval_seconds), "response": "".join(tokens)}
+
+        async def _stream():
+            await asyncio.sleep(ttft)
+            started = time.time()
+            for token in tokens:
+                yield json.dumps({"model": model, "response": token, "done": False}, ensure_ascii=False) + "\n"
+                await asyncio.sleep(token_interval)
+            yield json.dumps({**_final(time.time() - started), "response": ""}) + "\n"
+
+        return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake-embed")
+        loaded_models[model] = time.time()
+        if config.should_fail():
+            return _failure_response()
+
+        inputs = body.get("input", [])
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        await asyncio.sleep(config.embed_latency_ms / 1000 * (1 + 0.1 * len(texts)))
+        return {"model": model, "embeddings": [deterministic_embedding(t, config.embed_dim) for t in texts]}
+
+    @app.get("/api/ps")
+    async def list_loaded():
+        return {"models": [{"name": name, "model": name} for name in loaded_models]}
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        if config.should_fail():
+            return _failure_response()
+
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        response_format = body.get("response_format", {}).get("type")
+        max_tokens = body.get("max_tokens") or config.output_tokens
+        tokens = split_tokens(
+            build_answer(prompt, "json" if response_format == "json_object" else None, config.output_tokens),
+            min(max_tokens, config.output_tokens)
+        )
+        ttft = config.sample_ttft()
+        token_interval = 1 / config.tokens_per_sec
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // 2),
+            "completion_tokens": len(tokens),
+            "total_tokens": max(1, len(prompt) // 2) + len(tokens),
+        }
+        completion_id = f"chatcmpl-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + len(tokens) * token_interval)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def _stream():
+            await asyncio.sleep(ttft)
+            for token in tokens:
+                chunk = {"id": completion_id, "choices": [{"index": 0, "delta": {"content": token}}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(token_interval)
+            yield f"data: {json.dumps({'id': completion_id, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})}\n\n"
+            if body.get("stream_options", {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama / DeepSeek server for local performance testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--ttft-ms", type=float, default=300.0, help="TTFT 中位数（毫秒）")
+    parser.add_argument("--ttft-sigma", type=float, default=0.3, help="TTFT 对数正态分布的 sigma，0 表示固定延迟")
+    parser.add_argument("--tokens-per-sec", type=float, default=40.0)
+    parser.add_argument("--output-tokens", type=int, default=200)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--embed-dim", type=int, default=1024)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="返回 503 的请求比例")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="TTFT 乘以 slow-factor 的请求比例")
+    parser.add_argument("--slow-factor", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(
+        ttft_ms=args.ttft_ms,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_sec=args.tokens_per_sec,
+        output_tokens=args.output_tokens,
+        embed_latency_ms=args.embed_latency_ms,
+        embed_dim=args.embed_dim,
+        failure_rate=args.failure_rate,
+        slow_rate=args.slow_rate,
+        slow_factor=args.slow_factor,
+        seed=args.seed,
+    )
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -42,7 +42,16 @@ async def main():
     test_files = [
         'test_story_plan.py',
         'test_quality_evaluation.py',
-        'test_character_and_novel.py'
+        'test_character_and_novel.py',
+        'test_model_router.py',
+        'test_llm_streaming.py',
+        'test_prompt_budget.py',
+        'test_script_heuristics.py',
+        'test_evaluation_store.py',
+        'test_batch_generation.py',
+        'test_near_duplicates.py',
+        'test_ollama_pool.py',
+        'test_structured_output.py'
     ]
     
     results = {}
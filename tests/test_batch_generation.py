@@ -0,0 +1,186 @@
+import asyncio
+import importlib
+import inspect
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.llm_streaming import StreamCancellation
+from app.services.script_service import ScriptService
+from app.services.stop_policy import StopPolicy
+
+# app.services 包以同名属性导出 quality_evaluator 单例，需要通过 sys.modules 取得模块本身
+quality_evaluator_module = importlib.import_module("app.services.quality_evaluator")
+
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamingLLM:
+    """
+    模拟 RequestsOllamaLLM 的流式接口：登记 HTTP 响应到 cancellation，逐块产出文本，响应被关闭后停止读取
+
+    第 n 次调用（从 0 开始）的文本以 "#n#" 开头，每块之间等待 chunk_delays[n] 秒（缺省取最后一个值）。
+    """
+
+    def __init__(self, chunk_delays, chunks: int = 5):
+        self.chunk_delays = chunk_delays
+        self.chunks = chunks
+        self.responses = []
+        self.chunks_read = []
+        self._lock = threading.Lock()
+
+    def stream_complete(self, prompt, cancellation: StreamCancellation = None, **kwargs):
+        response = FakeResponse()
+        with self._lock:
+            index = len(self.responses)
+            self.responses.append(response)
+            self.chunks_read.append(0)
+        if cancellation is not None:
+            cancellation.register(response)
+        delay = self.chunk_delays[min(index, len(self.chunk_delays) - 1)]
+        body = "".join(chr(0x4E00 + (index * 997 + j * 31) % 20000) for j in range(200))
+        for j in range(self.chunks):
+            time.sleep(delay)
+            if response.closed:
+                return
+            self.chunks_read[index] += 1
+            text = f"#{index}#" if j == 0 else body[(j - 1) * 50:j * 50]
+            yield SimpleNamespace(delta=text)
+
+
+class FakeEvaluator:
+    def __init__(self, scores):
+        self.scores = scores
+
+    async def evaluate_script(self, script_content: str, **kwargs):
+        index = int(script_content.split("#")[1])
+        return {"overall_score": self.scores.get(index, 3.0)}
+
+
+def _make_service(llm) -> ScriptService:
+    service = ScriptService.__new__(ScriptService)
+    service.llm = llm
+    service._character_system_initialized = True
+
+    async def _prepare_generation(**kwargs):
+        return "prompt", {
+            "referenced_units": [],
+            "character_states": {},
+            "character_constraints": {},
+            "active_goals": [],
+            "temporal_context": {},
+            "prompt_tokens": 1,
+        }
+
+    service._prepare_generation = _prepare_generation
+    return service
+
+
+def test_batch_without_policy_generates_every_candidate(monkeypatch):
+    """测试 stop_when=none 时生成并评估全部候选，选出评分最高的剧本"""
+    llm = FakeStreamingLLM([0.0], chunks=3)
+    service = _make_service(llm)
+    monkeypatch.setattr(quality_evaluator_module, "quality_evaluator", FakeEvaluator({2: 9.0}))
+
+    result = asyncio.run(service.generate_script_batch(
+        "剧情", "冲突", "情绪", ["李明"], batch_size=4, use_character_system=False
+    ))
+
+    assert result["total_count"] == 4
+    assert len(llm.responses) == 4
+    assert result["early_stop"]["generations_saved"] == 0
+    assert result["scripts"][result["best_script_index"]]["generated_script"].startswith("#2#")
+
+
+def test_stop_policy_first_above_threshold():
+    """测试 first_above_threshold 在第一个达到阈值的评分出现时结束"""
+    policy = StopPolicy("first_above_threshold", threshold=7.0)
+    assert not policy.observe(6.9)
+    assert policy.reason is None
+    assert policy.observe(7.0)
+    assert "threshold" in policy.reason
+
+
+def test_stop_policy_best_of_k():
+    """测试 best_of_k 至少完成 k 个候选，最佳分数连续 patience 个候选未提高才结束"""
+    policy = StopPolicy("best_of_k", k=3, patience=2)
+    assert not policy.observe(5.0)
+    assert not policy.observe(6.0)
+    assert not policy.observe(5.5)
+    assert policy.observe(4.0)
+    assert "did not improve for 2" in policy.reason
+
+
+def test_stop_policy_time_budget_and_validation():
+    """测试 time_budget 的剩余时间与过期原因，以及非法参数"""
+    policy = StopPolicy("time_budget", time_budget_seconds=10)
+    assert 9 < policy.remaining_seconds() <= 10
+    assert not policy.observe(9.9)
+    policy.expire()
+    assert "time budget" in policy.reason
+    assert StopPolicy("none").remaining_seconds() is None
+
+    for kwargs in ({"mode": "unknown"}, {"mode": "time_budget"}):
+        with pytest.raises(ValueError):
+            StopPolicy(**kwargs)
+
+
+def test_batch_stop_policy_cancels_in_flight_candidates(monkeypatch):
+    """测试批次生成满足提前结束策略后不再启动新候选，并关闭进行中候选的流式连接"""
+    llm = FakeStreamingLLM([0.2, 0.01], chunks=5)
+    service = _make_service(llm)
+    monkeypatch.setattr(quality_evaluator_module, "quality_evaluator", FakeEvaluator({0: 5.0, 1: 8.0}))
+
+    async def run():
+        result = await service.generate_script_batch(
+            "剧情", "冲突", "情绪", ["李明"],
+            batch_size=6,
+            use_character_system=False,
+            stop_when="first_above_threshold",
+            min_score_threshold=7.0,
+        )
+        await asyncio.sleep(0.3)
+        return result
+
+    result = asyncio.run(run())
+
+    early_stop = result["early_stop"]
+    assert early_stop["stopped_early"]
+    assert early_stop["generations_started"] == len(llm.responses) == 2
+    assert early_stop["generations_saved"] == 4
+    assert early_stop["cancelled_in_flight"] == 1
+    assert result["total_count"] == 1
+    assert result["scripts"][0]["generated_script"].startswith("#1#")
+    assert llm.responses[0].closed
+    assert llm.chunks_read[0] < 5
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        if "monkeypatch" not in inspect.signature(test).parameters:
+            test()
+        else:
+            monkeypatch = pytest.MonkeyPatch()
+            try:
+                test(monkeypatch)
+            finally:
+                monkeypatch.undo()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
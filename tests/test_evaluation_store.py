@@ -0,0 +1,55 @@
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.evaluation_store import EvaluationStore
+
+
+def test_evaluation_store_round_trip():
+    """测试评分存储：写入后按键读回，失败维度不写入，维度齐全的剧本作为训练样本"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = EvaluationStore(str(Path(directory) / "store.sqlite3"))
+        try:
+            store.put(
+                "hash-a", "qwen3:30b", "v1", "multi_dimensional",
+                {
+                    "plot": {"score": 7.5, "comment": "情节紧凑"},
+                    "dialogue": {"score": 5.0, "failed": True},
+                },
+                features={"length": 320.0},
+            )
+            store.put(
+                "hash-b", "qwen3:30b", "v1", "multi_dimensional",
+                {"plot": {"score": 6.0}, "dialogue": {"score": 8.0}},
+                features={"length": 500.0},
+            )
+
+            found = store.get_many(["hash-a", "hash-b", "hash-c"], "qwen3:30b", "v1", "multi_dimensional")
+            assert found["hash-a"] == {"plot": {"score": 7.5, "comment": "情节紧凑"}}
+            assert set(found["hash-b"]) == {"plot", "dialogue"}
+            assert "hash-c" not in found
+            assert store.get("hash-a", "deepseek-chat", "v1", "multi_dimensional") == {}
+            assert store.get("hash-a", "qwen3:30b", "v2", "multi_dimensional") == {}
+
+            samples = store.training_samples("qwen3:30b", "v1", "multi_dimensional", ["plot", "dialogue"])
+            assert samples == [({"length": 500.0}, {"plot": 6.0, "dialogue": 8.0})]
+
+            stats = store.get_stats()
+            assert stats["scripts"] == 2
+            assert stats["writes"] == 3
+        finally:
+            store.close()
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import asyncio
+import sys
+import threading
+import time
+from contextlib import aclosing
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.llm_streaming import StreamCancellation, astream_completion
+
+
+class FakeResponse:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeStreamingLLM:
+    """模拟 RequestsOllamaLLM 的流式接口：登记 HTTP 响应到 cancellation，逐块产出文本，响应被关闭后停止读取"""
+
+    def __init__(self, delay: float, chunks: int):
+        self.delay = delay
+        self.chunks = chunks
+        self.responses = []
+        self.chunks_read = []
+        self._lock = threading.Lock()
+
+    def stream_complete(self, prompt, cancellation: StreamCancellation = None, **kwargs):
+        response = FakeResponse()
+        with self._lock:
+            index = len(self.responses)
+            self.responses.append(response)
+            self.chunks_read.append(0)
+        if cancellation is not None:
+            cancellation.register(response)
+        for j in range(self.chunks):
+            time.sleep(self.delay)
+            if response.closed:
+                return
+            self.chunks_read[index] += 1
+            yield SimpleNamespace(delta=f"片段{j}")
+
+
+def test_astream_completion_closes_response_when_consumer_stops():
+    """测试调用方提前退出时关闭流式响应，后台线程停止读取"""
+    llm = FakeStreamingLLM(0.02, chunks=20)
+
+    async def run():
+        deltas = []
+        async with aclosing(astream_completion(llm, "prompt")) as stream:
+            async for delta in stream:
+                deltas.append(delta)
+                if len(deltas) == 2:
+                    break
+        await asyncio.sleep(0.1)
+        return deltas
+
+    deltas = asyncio.run(run())
+    assert deltas == ["片段0", "片段1"]
+    assert llm.responses[0].closed
+    assert llm.chunks_read[0] < 20
+
+
+def test_astream_completion_reads_full_stream():
+    """测试完整读取时不触发取消"""
+    llm = FakeStreamingLLM(0.0, chunks=5)
+
+    async def run():
+        return [delta async for delta in astream_completion(llm, "prompt")]
+
+    assert len(asyncio.run(run())) == 5
+    assert llm.chunks_read == [5]
+    assert not llm.responses[0].closed
+
+
+def test_cancellation_aborts_responses_registered_later():
+    """测试取消之后才登记的响应立即被关闭"""
+    cancellation = StreamCancellation()
+    early = FakeResponse()
+    cancellation.register(early)
+    cancellation.cancel()
+    late = FakeResponse()
+    cancellation.register(late)
+    assert cancellation.cancelled
+    assert early.closed and late.closed
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
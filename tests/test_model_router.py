@@ -0,0 +1,197 @@
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.model_router import CircuitBreaker, ModelRouter, RoutedLLM
+
+
+def test_breaker_opens_after_consecutive_failures():
+    """测试连续失败达到阈值后熔断，冷却期内拒绝请求"""
+    breaker = CircuitBreaker(failure_threshold=3, error_rate_threshold=1.0, open_seconds=60)
+    breaker.on_result(False, 0.5, 2)
+    breaker.on_result(False, 0.6, 3)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+    breaker.on_result(False, 0.7, 4)
+    assert breaker.state == "open"
+    assert breaker.open_count == 1
+    assert not breaker.allow()
+
+
+def test_breaker_success_resets_consecutive_failures():
+    """测试成功调用清零连续失败计数"""
+    breaker = CircuitBreaker(failure_threshold=2, error_rate_threshold=1.0, open_seconds=60)
+    breaker.on_result(False, 0.5, 2)
+    breaker.on_result(True, 0.3, 3)
+    breaker.on_result(False, 0.5, 4)
+    assert breaker.state == "closed"
+
+
+def test_breaker_opens_on_error_rate():
+    """测试窗口内样本足够且错误率超过阈值时熔断"""
+    breaker = CircuitBreaker(failure_threshold=100, error_rate_threshold=0.5, open_seconds=60)
+    breaker.on_result(False, 0.6, 9)
+    assert breaker.state == "closed"
+    breaker.on_result(False, 0.6, 10)
+    assert breaker.state == "open"
+
+
+def test_breaker_half_open_recovers_or_reopens():
+    """测试冷却后进入 half_open，试探成功恢复 closed，失败重新 open"""
+    breaker = CircuitBreaker(failure_threshold=1, error_rate_threshold=1.0, open_seconds=0.05)
+    breaker.on_result(False, 1.0, 1)
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    breaker.on_result(False, 1.0, 2)
+    assert breaker.state == "open"
+    assert breaker.open_count == 2
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.on_result(True, 0.5, 3)
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_admits_single_probe():
+    """测试 half_open 只放行一个在途试探，试探结束或丢失前其余请求被拒绝"""
+    breaker = CircuitBreaker(failure_threshold=1, error_rate_threshold=1.0, open_seconds=0.05)
+    breaker.on_result(False, 1.0, 1)
+    time.sleep(0.06)
+
+    assert breaker.available()
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.available()
+    assert not any(breaker.allow() for _ in range(5))
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.on_result(True, 0.5, 2)
+    assert breaker.state == "closed"
+    assert all(breaker.allow() for _ in range(5))
+
+
+def test_routed_llm_sends_one_probe_to_half_open_backend():
+    """测试并发调用时只有一个请求试探 half_open 后端，其余故障转移，未调用的后端归还试探名额"""
+    router = ModelRouter(failure_threshold=1, open_seconds=0.05, explore_rate=0.0)
+    router.record("qwen30b", 100, False)
+    time.sleep(0.06)
+
+    calls = []
+
+    class Client:
+        def __init__(self, name):
+            self.model_name = name
+
+        def complete(self, prompt, **kwargs):
+            calls.append(self.model_name)
+            return SimpleNamespace(text="ok", additional_kwargs={})
+
+    clients = {"qwen30b": Client("qwen3:30b"), "deepseek_v3_2": Client("deepseek-chat")}
+    first = router.rank("script_generation", list(clients))
+    assert first == ["qwen30b", "deepseek_v3_2"]
+    for _ in range(3):
+        assert router.rank("script_generation", list(clients)) == ["deepseek_v3_2"]
+    assert not router.is_available("qwen30b")
+
+    router.release_probes(["qwen30b"])
+    llm = RoutedLLM("script_generation", clients, router)
+    llm.complete("prompt")
+    llm.complete("prompt")
+    assert calls == ["qwen3:30b", "deepseek-chat"]
+
+    router.record("qwen30b", 100, True)
+    assert router.get_stats()["backends"]["qwen30b"]["state"] == "closed"
+
+
+def test_routed_llm_releases_unused_failover_probe():
+    """测试主后端成功时，为故障转移预留的 half_open 试探名额被归还"""
+    router = ModelRouter(failure_threshold=1, open_seconds=0.05, explore_rate=0.0)
+    router.record("deepseek_v3_2", 100, False)
+    time.sleep(0.06)
+
+    class WorkingClient:
+        model_name = "qwen3:30b"
+
+        def complete(self, prompt, **kwargs):
+            return SimpleNamespace(text="ok", additional_kwargs={})
+
+    llm = RoutedLLM("script_generation", {"qwen30b": WorkingClient(), "deepseek_v3_2": WorkingClient()}, router)
+    llm.complete("prompt")
+    assert router.is_available("deepseek_v3_2")
+
+
+def test_router_excludes_open_backends_and_fails_fast():
+    """测试路由排除熔断中的后端，全部熔断时抛出 RuntimeError"""
+    router = ModelRouter(failure_threshold=2, open_seconds=60, explore_rate=0.0)
+    for _ in range(2):
+        router.record("qwen30b", 100, False)
+    assert not router.is_available("qwen30b")
+    assert router.rank("script_generation", ["qwen30b", "deepseek_v3_2"]) == ["deepseek_v3_2"]
+
+    for _ in range(2):
+        router.record("deepseek_v3_2", 100, False)
+    try:
+        router.rank("script_generation", ["qwen30b", "deepseek_v3_2"])
+    except RuntimeError as e:
+        assert "circuit open" in str(e)
+    else:
+        raise AssertionError("rank should fail fast when every backend is open")
+    assert router.get_stats()["reasons"]["all_open"] == 1
+
+
+def test_router_prefers_faster_backend():
+    """测试样本充足时选择明显更快的后端，差距在 switch_margin 内时保留主模型"""
+    router = ModelRouter(min_samples=5, switch_margin=0.2, explore_rate=0.0)
+    for _ in range(5):
+        router.record("qwen30b", 1000, True)
+        router.record("deepseek_v3_2", 300, True)
+    assert router.rank("script_generation", ["qwen30b", "deepseek_v3_2"]) == ["deepseek_v3_2", "qwen30b"]
+
+    close_router = ModelRouter(min_samples=5, switch_margin=0.2, explore_rate=0.0)
+    for _ in range(5):
+        close_router.record("qwen30b", 1000, True)
+        close_router.record("deepseek_v3_2", 900, True)
+    assert close_router.rank("script_generation", ["qwen30b", "deepseek_v3_2"])[0] == "qwen30b"
+
+
+def test_routed_llm_fails_over_and_tags_serving_backend():
+    """测试主后端失败时故障转移，响应记录实际处理调用的后端与模型"""
+
+    class FailingClient:
+        model_name = "qwen3:30b"
+
+        def complete(self, prompt, **kwargs):
+            raise ConnectionError("backend down")
+
+    class WorkingClient:
+        model_name = "deepseek-chat"
+
+        def complete(self, prompt, **kwargs):
+            return SimpleNamespace(text="ok", additional_kwargs={})
+
+    router = ModelRouter(explore_rate=0.0)
+    llm = RoutedLLM("script_generation", {"qwen30b": FailingClient(), "deepseek_v3_2": WorkingClient()}, router)
+    response = llm.complete("prompt")
+    assert response.text == "ok"
+    assert response.additional_kwargs == {"backend": "deepseek_v3_2", "model": "deepseek-chat"}
+    assert llm.candidate_models() == ["qwen3:30b", "deepseek-chat"]
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.near_duplicates import MinHasher, NearDuplicateFilter
+
+SAMPLE_SCRIPT = """场景：深夜的办公室
+
+李明：（把文件摔在桌上）你早就知道投资方要撤资，为什么不告诉我？
+张伟：告诉你又能怎样？你只会像现在这样发火。
+李明：我们说好什么事都一起扛的！
+张伟：（沉默片刻）我只是想先找到解决办法，再跟你说。
+李明：可你找到的办法，就是背着我跟竞争对手谈合作？
+张伟：那是唯一能让公司活下去的路。
+"""
+
+
+def test_near_duplicate_filter_groups_similar_scripts():
+    """测试近似重复检测：改动个别字的剧本归为重复，内容不同的剧本保留为代表"""
+    variant = SAMPLE_SCRIPT.replace("深夜", "凌晨")
+    different = "场景：清晨的咖啡馆\n\n王芳：你来得正好，我有个消息要告诉你。\n赵强：什么消息这么急？\n王芳：我们的新产品拿到了第一笔订单。\n"
+    duplicates = NearDuplicateFilter(threshold=0.7).group([SAMPLE_SCRIPT, variant, different])
+    assert list(duplicates) == [1]
+    assert duplicates[1][0] == 0
+    assert duplicates[1][1] >= 0.7
+
+
+def test_minhash_similarity_is_deterministic():
+    """测试相同文本的签名一致，相似度为 1"""
+    hasher = MinHasher(num_perm=32, shingle_size=3)
+    signature = hasher.signature(SAMPLE_SCRIPT)
+    assert signature == MinHasher(num_perm=32, shingle_size=3).signature(SAMPLE_SCRIPT)
+    assert MinHasher.similarity(signature, signature) == 1.0
+    assert len(hasher.signature("")) == 32
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.llm_streaming import StreamCancellation
+from app.services.ollama_pool import OllamaHostPool
+
+
+class SlowStreamHandler(BaseHTTPRequestHandler):
+    """与 Ollama 一样以 chunked 编码逐行缓慢输出的流式接口，模拟生成中的 /api/generate"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        line = b'{"response": "' + b"x" * 600 + b'"}\n'
+        try:
+            for _ in range(100):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+                time.sleep(0.05)
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _stream_and_cancel(pool: OllamaHostPool, session: requests.Session) -> bool:
+    """读取两行后从另一个线程取消，返回读取是否因连接被关闭而抛出异常"""
+    cancellation = StreamCancellation()
+    try:
+        with pool.lease("qwen3:30b", "prompt", cancellation) as base_url:
+            response = session.post(f"{base_url}/api/generate", json={}, stream=True, timeout=5)
+            cancellation.register(response)
+            for index, _ in enumerate(response.iter_lines()):
+                if index == 1:
+                    threading.Thread(target=cancellation.cancel).start()
+    except Exception:
+        assert cancellation.cancelled
+        return True
+    return False
+
+
+def test_cancelled_streams_do_not_drain_hosts():
+    """测试调用方反复主动取消流式请求后主机仍保持健康，在途数归零"""
+    servers = [ThreadingHTTPServer(("127.0.0.1", 0), SlowStreamHandler) for _ in range(2)]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_address[1]}" for server in servers]
+    session = requests.Session()
+    pool = OllamaHostPool("test", urls, session=session, failure_threshold=3)
+    try:
+        aborted = [_stream_and_cancel(pool, session) for _ in range(5)]
+        assert all(aborted)
+        hosts = pool.get_stats()["hosts"]
+        assert all(host["healthy"] for host in hosts)
+        assert all(host["failures"] == 0 and host["consecutive_failures"] == 0 for host in hosts)
+        assert all(host["outstanding"] == 0 for host in hosts)
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def test_real_failures_still_drain_host():
+    """测试未取消的请求异常仍计为失败，连续失败达到阈值后摘除主机"""
+    pool = OllamaHostPool("test", ["http://host-a"], failure_threshold=3)
+    not_cancelled = SimpleNamespace(cancelled=False)
+    for _ in range(3):
+        try:
+            with pool.lease("qwen3:30b", cancellation=not_cancelled):
+                raise ConnectionError("connection refused")
+        except ConnectionError:
+            pass
+    host = pool.get_stats()["hosts"][0]
+    assert not host["healthy"]
+    assert host["consecutive_failures"] == 3
+
+
+def test_cancelled_lease_is_neutral():
+    """测试取消既不计为失败，也不清零之前的连续失败"""
+    pool = OllamaHostPool("test", ["http://host-a"], failure_threshold=3)
+    try:
+        with pool.lease("qwen3:30b"):
+            raise ConnectionError("connection refused")
+    except ConnectionError:
+        pass
+    for _ in range(3):
+        try:
+            with pool.lease("qwen3:30b", cancellation=SimpleNamespace(cancelled=True)):
+                raise ConnectionError("connection aborted")
+        except ConnectionError:
+            pass
+    host = pool.get_stats()["hosts"][0]
+    assert host["healthy"]
+    assert host["consecutive_failures"] == 1
+    assert "qwen3:30b" not in host["loaded_models"]
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.prompt_budget import PromptBudget, fit_items, fit_prompt, truncate_to_tokens
+from app.services.token_utils import estimate_tokens
+
+
+def test_prompt_budget_keeps_small_sections_and_truncates_large_ones():
+    """测试章节预算：用不完份额的章节完整保留，超出的章节截断到预算内，列表章节每项都有保留"""
+    sections = {
+        "plot": "剧情" * 2000,
+        "goals": ["\n李明:\n  - 短期目标: 保住公司\n"],
+        "constraints": ["- 地点: 办公室\n"],
+        "references": ["参考" * 1000, "片段" * 1000, "短参考"],
+    }
+    fitted, report = PromptBudget(600).fit(sections)
+    assert fitted["goals"] == sections["goals"]
+    assert fitted["constraints"] == sections["constraints"]
+    assert report["sections"]["plot"]["truncated"]
+    assert all(fitted["references"])
+    assert fitted["references"][2] == "短参考"
+    total = sum(info["final_tokens"] for info in report["sections"].values())
+    assert total <= 600
+
+
+def test_truncate_and_fit_items_respect_budget():
+    """测试截断函数不超过给定 token 数"""
+    text = "人物设定" * 500
+    truncated = truncate_to_tokens(text, 50)
+    assert estimate_tokens(truncated) <= 50
+    assert truncated.endswith("……")
+    assert truncate_to_tokens("短文本", 50) == "短文本"
+    items = fit_items(["a" * 400, "b" * 400, "c"], 60)
+    assert len(items) == 3 and items[2] == "c"
+    assert sum(estimate_tokens(item) for item in items) <= 60
+
+
+def test_fit_prompt_keeps_assembled_prompt_within_budget():
+    """测试 fit_prompt 先扣除模板的 token 数，组装后的完整 Prompt 不超过总预算"""
+    template = "请根据以下信息生成一场戏的剧本：\n" + "生成要求：保持人物性格一致。\n" * 40
+
+    def build(sections):
+        return template + sections["plot"] + "".join(sections["goals"]) + "".join(sections["references"])
+
+    prompt, report = fit_prompt(800, {
+        "plot": "剧情" * 2000,
+        "goals": ["\n李明:\n  - 短期目标: 保住公司\n"],
+        "references": ["参考" * 1000, "片段" * 1000],
+    }, build)
+    assert estimate_tokens(prompt) <= 800
+    assert report["template_tokens"] == estimate_tokens(build({"plot": "", "goals": [""], "references": ["", ""]}))
+    assert report["budget"] == 800 - report["template_tokens"]
+    assert "短期目标: 保住公司" in prompt
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.services.script_heuristics import HeuristicScorer
+
+SAMPLE_SCRIPT = """场景：深夜的办公室
+
+李明：（把文件摔在桌上）你早就知道投资方要撤资，为什么不告诉我？
+张伟：告诉你又能怎样？你只会像现在这样发火。
+李明：我们说好什么事都一起扛的！
+张伟：（沉默片刻）我只是想先找到解决办法，再跟你说。
+李明：可你找到的办法，就是背着我跟竞争对手谈合作？
+张伟：那是唯一能让公司活下去的路。
+"""
+
+
+def test_heuristic_scorer_checks_length_only_with_target():
+    """测试启发式预筛：没有目标长度时不检查长度，给出目标范围时按范围判定"""
+    scorer = HeuristicScorer()
+    report = scorer.score(SAMPLE_SCRIPT, ["李明", "张伟"])
+    assert not report["rejected"], report["reasons"]
+    assert report["metrics"]["character_coverage"] == 1.0
+
+    report = scorer.score(SAMPLE_SCRIPT, ["李明", "张伟"], target_length=(500, 800))
+    assert report["rejected"]
+    assert any("字" in reason for reason in report["reasons"])
+    assert report["heuristic_score"] <= scorer.rejected_score_cap
+
+
+def test_heuristic_scorer_rejects_bad_output():
+    """测试启发式预筛识别缺少人物、重复输出与 JSON 格式"""
+    scorer = HeuristicScorer()
+    assert scorer.score(SAMPLE_SCRIPT, ["王芳", "赵强"])["rejected"]
+    assert scorer.score("李明：好的。\n" * 50, ["李明"])["rejected"]
+    assert scorer.score('{"script": "李明：你好"}', ["李明"])["rejected"]
+    stats = scorer.get_stats()
+    assert stats["screened"] == 3
+
+
+def test_heuristic_scorer_handles_degenerate_target_length():
+    """测试目标最少字数为 0 或最少大于最多时不抛异常"""
+    scorer = HeuristicScorer()
+    report = scorer.score(SAMPLE_SCRIPT, ["李明", "张伟"], target_length=(0, 800))
+    assert not report["rejected"], report["reasons"]
+    report = scorer.score(SAMPLE_SCRIPT, ["李明", "张伟"], target_length=(800, 100))
+    assert report["rejected"]
+    assert 0 <= report["heuristic_score"] <= 10
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from app.schemas.quality_evaluation import DimensionScore
+from app.services.structured_output import StructuredOutputError, acomplete_structured, complete_structured
+
+
+class ScriptedLLM:
+    """按顺序返回预设文本的 LLM，并记录每次调用的 output_format"""
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.formats = []
+
+    def complete(self, prompt, output_format=None, **kwargs):
+        self.formats.append(output_format)
+        return SimpleNamespace(text=self.texts[len(self.formats) - 1])
+
+
+def test_complete_structured_retries_after_invalid_output():
+    """测试输出未通过校验时重新生成，第二次合法输出被返回"""
+    llm = ScriptedLLM('{"score": "高"}', '<think>推理</think>{"score": 8, "reasoning": "冲突鲜明"}')
+    parsed, response = complete_structured(llm, "prompt", DimensionScore)
+    assert parsed.score == 8
+    assert parsed.reasoning == "冲突鲜明"
+    assert response.text.endswith("}")
+    assert len(llm.formats) == 2
+    assert llm.formats[0] == DimensionScore.model_json_schema()
+
+
+def test_complete_structured_raises_with_last_response():
+    """测试重试用尽后抛出 StructuredOutputError，并携带最后一次原始响应供宽松解析"""
+    llm = ScriptedLLM("不是 JSON", '{"score": 11}')
+    try:
+        asyncio.run(acomplete_structured(llm, "prompt", DimensionScore))
+    except StructuredOutputError as e:
+        assert isinstance(e, ValueError)
+        assert e.response.text == '{"score": 11}'
+    else:
+        raise AssertionError("invalid output should raise after retries")
+    assert len(llm.formats) == 2
+
+
+def main():
+    """主测试函数"""
+    tests = [value for name, value in sorted(globals().items()) if name.startswith("test_")]
+    for test in tests:
+        test()
+        print(f"{test.__name__}: 通过")
+
+
+if __name__ == "__main__":
+    main()